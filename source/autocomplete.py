@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Autocomplete of the command parameters. All prefixes of the names and of their words
+are indexed when the bot starts, so an autocomplete request is one dictionary lookup.
+"""
+import discord
+from discord import app_commands
+from source.game_settings import difficulty_profiles, stream_challenge_config
+from source.constants import AUTOCOMPLETE_LIMIT
+
+
+class PrefixIndex:  # pylint: disable=too-few-public-methods
+    """
+    Index of the autocomplete choices by every lowercase prefix
+    """
+
+    def __init__(self, names, limit: int = AUTOCOMPLETE_LIMIT):
+        index = {}
+        for name in names:
+            texts = [name.lower()] + name.lower().replace("–", " ").split()
+            prefixes = {
+                text[:length] for text in texts for length in range(len(text) + 1)
+            }
+            for prefix in prefixes:
+                choices = index.setdefault(prefix, [])
+                if len(choices) < limit:
+                    choices.append(app_commands.Choice(name=name, value=name))
+        self.index = {prefix: tuple(choices) for prefix, choices in index.items()}
+
+    def lookup(self, text: str) -> list:
+        """
+        Get the choices which start with the text or have a word starting with it
+        :param text: Current input of the user
+        :return: List of choices
+        """
+        return list(self.index.get(text.strip().lower(), ()))
+
+
+location_index = PrefixIndex(stream_challenge_config["StartingArea"])
+DIFFICULTY_CHOICES = []
+
+
+def update_difficulty_choices() -> None:
+    """
+    Build the choices of the difficulty parameters from the difficulty profiles. The
+    list is changed in place, because the commands hold it.
+    :return: None
+    """
+    DIFFICULTY_CHOICES[:] = [
+        app_commands.Choice(name=profile.description, value=name)
+        for name, profile in difficulty_profiles.items()
+    ]
+
+
+def difficulty_options() -> list:
+    """
+    Create the options of the difficulty dropdown from the difficulty profiles
+    :return: List of select options
+    """
+    return [
+        discord.SelectOption(
+            label=profile.name,
+            description=profile.description,
+            emoji=profile.emoji,
+        )
+        for profile in difficulty_profiles.values()
+    ]
+
+
+async def location_autocomplete(
+    _interaction: discord.Interaction, current: str
+) -> list:
+    """
+    Autocomplete of the start location of a stream challenge
+    :param current: Current input of the user
+    :return: List of matching locations
+    """
+    return location_index.lookup(current)
+
+
+update_difficulty_choices()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the render path, run from the source directory. The memory benchmark
+renders challenge pictures concurrently through the render budget and fails, if the
+measured peak memory of one render exceeds the limit, so a memory regression is
+found before it reaches the bot. The text benchmark draws the texts of challenge
+cards with the cached masks of the font chain and with ImageDraw.text, and fails if
+the pictures are not identical.
+
+Usage: python benchmark.py render [--renders N] [--concurrency N] [--max-peak-mb N]
+       python benchmark.py text [--cards N] [--repeats N]
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from PIL import Image, ImageDraw
+from source.game_settings import User, create_challenge_code, DIFFICULTY_LEVELS
+from source.custom_challenge import get_custom_challenge
+from source.picture import (
+    draw_challenge_picture,
+    get_background_image,
+    sort_text_for_print,
+)
+from source.render import RenderBudget
+from source.fonts import FontChain, get_font_chain
+
+BENCHMARK_USER = User(user_id=0, user_name="benchmark", user_display_name="Benchmark")
+
+
+async def generate_challenges(count: int) -> list:
+    """
+    Generate custom challenges of all difficulty levels, challenges which could not
+    be generated are skipped
+    :param count: Number of generated challenges
+    :return: List of game settings
+    """
+    challenges = []
+    for index in range(count):
+        code = create_challenge_code(DIFFICULTY_LEVELS[index % len(DIFFICULTY_LEVELS)])
+        game_settings = await get_custom_challenge(code)
+        if game_settings["successful_generated"]:
+            challenges.append(game_settings)
+    return challenges
+
+
+async def render_memory(renders: int, concurrency: int) -> dict:
+    """
+    Render custom challenges concurrently through a render budget with traced memory
+    :param renders: Number of generated challenges
+    :param concurrency: Number of renders started at the same time
+    :return: Metrics of the render budget
+    """
+    budget = RenderBudget(trace_memory=True)
+    tracemalloc.start()
+    challenges = await generate_challenges(renders)
+    background_image = await get_background_image(random.Random(0))
+    for first in range(0, renders, concurrency):
+        await asyncio.gather(
+            *(
+                budget.render(
+                    draw_challenge_picture,
+                    background_image,
+                    game_settings,
+                    BENCHMARK_USER,
+                )
+                for game_settings in challenges[first : first + concurrency]
+            )
+        )
+    tracemalloc.stop()
+    return budget.statistics()
+
+
+def card_texts(game_settings: dict) -> list:
+    """
+    Get the texts of a challenge card with their positions
+    :param game_settings: Game settings of the challenge
+    :return: List of position and text
+    """
+    texts = [
+        f"Challenge: {game_settings['difficulty']}, Benchmark, 2024-01-01",
+        f"Code: {game_settings['code']}",
+        f"Starte in: {game_settings['location']} als {game_settings['profession']}",
+        "Mit den positiven Traits:",
+        *game_settings["positive_traits"],
+        "Mit den negativen Traits:",
+        *game_settings["negative_traits"],
+        "Deine Mission:",
+        *sort_text_for_print(game_settings["mission"]),
+        "Einstellungen:",
+        *sort_text_for_print(game_settings["settings"]),
+    ]
+    return [((10, 10 + line * 20), text) for line, text in enumerate(texts)]
+
+
+def draw_text_reference(font_chain, draw, position: tuple, text: str, fill) -> None:
+    """
+    Draw a text with ImageDraw.text, which rasterizes every run with FreeType
+    :param font_chain: Font chain of the pictures
+    :param draw: Draw object of the picture
+    :param position: Left top position of the text
+    :param text: Text to draw
+    :param fill: Color of the text
+    :return: None
+    """
+    pos_x, pos_y = position
+    baseline = pos_y + font_chain.fonts[0].getmetrics()[0]
+    for index, run in font_chain.runs(text):
+        font = font_chain.fonts[index]
+        draw.text((pos_x, baseline), run, fill=fill, font=font, anchor="ls")
+        pos_x += font.getlength(run)
+
+
+def text_drawing(cards: int, repeats: int) -> dict:  # pylint: disable=too-many-locals
+    """
+    Draw the texts of challenge cards with the cached masks and with ImageDraw.text
+    :param cards: Number of generated challenge cards
+    :param repeats: Number of times all cards are drawn
+    :return: Milliseconds per card of both paths and the number of identical cards
+    """
+    font_chain = get_font_chain()
+    challenges = asyncio.run(generate_challenges(cards))
+    results = {"cards": len(challenges) * repeats, "identical": 0}
+    durations = {"reference": 0.0, "cached": 0.0}
+    with Image.new("RGB", (1200, 900)) as background:
+        for _ in range(repeats):
+            for game_settings in challenges:
+                pictures = {}
+                for path, draw_text in [
+                    ("reference", draw_text_reference),
+                    ("cached", FontChain.draw_text),
+                ]:
+                    picture = background.copy()
+                    draw = ImageDraw.Draw(picture)
+                    start = time.perf_counter()
+                    for position, text in card_texts(game_settings):
+                        draw_text(font_chain, draw, position, text, (255, 255, 255))
+                    durations[path] += time.perf_counter() - start
+                    pictures[path] = picture.tobytes()
+                results["identical"] += pictures["reference"] == pictures["cached"]
+    for path, duration in durations.items():
+        results[f"{path}_ms_per_card"] = duration / results["cards"] * 1000
+    return results
+
+
+def main() -> None:
+    """
+    Run a benchmark and print its results
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the render path.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render = commands.add_parser("render", help="Peak memory of concurrent renders")
+    render.add_argument("--renders", type=int, default=32)
+    render.add_argument("--concurrency", type=int, default=4)
+    render.add_argument("--max-peak-mb", type=float, default=64)
+    text = commands.add_parser("text", help="Text drawing time per card")
+    text.add_argument("--cards", type=int, default=30)
+    text.add_argument("--repeats", type=int, default=2)
+    arguments = parser.parse_args()
+    if arguments.command == "text":
+        results = text_drawing(arguments.cards, arguments.repeats)
+        for name, value in results.items():
+            print(f"{name:32} {value}")
+        if results["identical"] != results["cards"]:
+            print("The cached masks do not draw identical pictures")
+            sys.exit(1)
+        return
+    metrics = asyncio.run(render_memory(arguments.renders, arguments.concurrency))
+    for name, value in metrics.items():
+        print(f"{name:32} {value}")
+    peak_mb = metrics["max_peak_bytes"] / 1024 / 1024
+    print(f"{'peak per render':32} {peak_mb:.1f} MB")
+    if peak_mb > arguments.max_peak_mb:
+        print(f"Peak memory per render exceeds {arguments.max_peak_mb} MB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Delivery of the finished challenges. The text of the challenge is sent as embed as
+soon as it is generated and the picture is attached to the same message when the
+rendering is finished.
+"""
+import os
+import io
+import contextlib
+import discord
+from source.event_log import log_failure_report
+from source.constants import CHALLENGE_PICTURE_FAILED
+
+PROGRESSIVE_DELIVERY = os.getenv("PROGRESSIVE_DELIVERY", "true").lower() == "true"
+
+
+def create_challenge_embed(summary: dict) -> discord.Embed:
+    """
+    Create the embed with the game settings of a challenge
+    :param summary: Game settings by their name in the message
+    :return: Embed of the challenge
+    """
+    embed = discord.Embed(color=discord.Color.dark_red())
+    for name, value in summary.items():
+        embed.add_field(name=name, value=value, inline=False)
+    return embed
+
+
+async def send_challenge(
+    send, content: str, summary: dict, render, filename: str
+) -> None:
+    """
+    Send a challenge with its picture. In the progressive delivery the embed is sent
+    before the rendering and the picture is attached by editing the message. If the
+    picture fails, the failure is reported and the message says so.
+    :param send: Coroutine function to send the message, must return the message
+    :param content: Text of the message
+    :param summary: Game settings by their name in the message
+    :param render: Coroutine function to render the picture as PNG data
+    :param filename: Filename of the picture
+    :return: None
+    """
+    embed = create_challenge_embed(summary)
+    if not PROGRESSIVE_DELIVERY:
+        picture = await render()
+        embed.set_image(url=f"attachment://{filename}")
+        await send(
+            content,
+            embed=embed,
+            file=discord.File(io.BytesIO(picture), filename=filename),
+        )
+        return
+    message = await send(content, embed=embed)
+    try:
+        picture = await render()
+        embed.set_image(url=f"attachment://{filename}")
+        await message.edit(
+            embed=embed,
+            attachments=[discord.File(io.BytesIO(picture), filename=filename)],
+        )
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        log_failure_report(
+            "challenge_picture_failed",
+            {
+                "content": content,
+                "summary": summary,
+                "filename": filename,
+                "error": repr(error),
+            },
+        )
+        with contextlib.suppress(discord.HTTPException):
+            await message.edit(content=f"{content}\n{CHALLENGE_PICTURE_FAILED}")
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
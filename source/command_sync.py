@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sync of the command tree. The payload of the commands of a guild is hashed and the
+hash of the last sync is stored in the configuration, so a reconnect only syncs the
+guilds whose commands changed.
+"""
+import json
+import asyncio
+import logging
+import hashlib
+import discord
+from discord import app_commands
+from source.state_backend import state_backend, INSTANCE_ID
+from source.event_log import log_event
+from source.constants import COMMAND_SYNC_CONCURRENCY, COMMAND_SYNC_LEASE
+
+SYNC_LOCK = asyncio.Lock()
+
+
+def command_signature(tree: app_commands.CommandTree, guild: discord.Object) -> str:
+    """
+    Create a stable hash of the commands of a guild with their names, descriptions
+    and parameters
+    :param tree: Command tree of the bot
+    :param guild: Guild of the commands
+    :return: Hash of the command payload
+    """
+    payload = sorted(
+        (command.to_dict() for command in tree.get_commands(guild=guild)),
+        key=lambda command: command["name"],
+    )
+    document = json.dumps(
+        {"guild": guild.id, "commands": payload}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+async def sync_command_tree(
+    tree: app_commands.CommandTree, guild_ids: list, force: bool = False
+) -> int:
+    """
+    Sync the commands of all guilds whose command signature changed since the last
+    sync. The guilds are synced concurrently, limited by the concurrency cap.
+    :param tree: Command tree of the bot
+    :param guild_ids: Ids of the guilds
+    :param force: Sync all guilds, even if their commands did not change
+    :return: Number of synced guilds
+    """
+    semaphore = asyncio.Semaphore(COMMAND_SYNC_CONCURRENCY)
+
+    async def sync_guild(guild: discord.Object, signature: str) -> str:
+        """
+        Sync the commands of one guild
+        :param guild: Guild of the commands
+        :param signature: Hash of the commands
+        :return: Hash of the synced commands
+        """
+        async with semaphore:
+            await tree.sync(guild=guild)
+        log_event("command_tree_synced", guild=guild.id)
+        return signature
+
+    async with SYNC_LOCK:
+        if not await state_backend.acquire_lease(
+            "command_sync", INSTANCE_ID, COMMAND_SYNC_LEASE
+        ):
+            log_event("command_tree_sync_skipped", guilds=len(guild_ids))
+            return 0
+        synced = dict(await state_backend.get_value("command_sync", {}))
+        pending = {}
+        for guild_id in guild_ids:
+            guild = discord.Object(id=int(guild_id))
+            signature = command_signature(tree, guild)
+            if force or synced.get(str(guild.id)) != signature:
+                pending[str(guild.id)] = sync_guild(guild, signature)
+        if not pending:
+            log_event("command_tree_unchanged", guilds=len(guild_ids))
+            return 0
+        results = await asyncio.gather(*pending.values(), return_exceptions=True)
+        for guild_id, result in zip(pending, results):
+            if isinstance(result, Exception):
+                log_event(
+                    "command_tree_sync_failed",
+                    logging.ERROR,
+                    guild=guild_id,
+                    error=repr(result),
+                )
+            else:
+                synced[guild_id] = result
+        await state_backend.set_value("command_sync", synced)
+        return sum(1 for result in results if not isinstance(result, Exception))
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -24,5 +24,71 @@ USER_INFO_MESSAGE_APPROVAL_5 = (
 )
 USER_INFO_WRONG_CHANNEL = "Falscher Channel für diesen Befehl. Bitte hier versuchen: "
 USER_INFO_NO_ROLE = "Du hast keine Berechtigung, löse dazu Kanalpunkte ein."
+USER_INFO_INVALID_CODE = "Dieser Challenge-Code ist ungültig."
 DEFAULT_SKIP_SELECTION = "Choose nothing"
 DEFAULT_SKIP_SELECTION_DESCRIPTION = "Skip this selection"
+SESSION_STORE_PATH = "../sessions/"
+CUSTOM_CHALLENGE_TIMEOUT = 180
+STREAM_CHALLENGE_TIMEOUT = 300
+MAX_LIVE_SESSIONS = 500
+SESSION_WHEEL_SLOTS = 512
+SESSION_WHEEL_TICK = 1
+METRICS_REPORT_INTERVAL = 300
+CHALLENGE_CODE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+CHALLENGE_CODE_LENGTH = 6
+CHALLENGE_CACHE_SIZE = 64
+CHALLENGE_CODE_LOG = "../created_challenges/challenge_codes.txt"
+PROFILE_PATH = "../profiles/"
+PROFILE_MAX_FILES = 20
+FAILURE_REPORT_PATH = "../failure_reports/"
+FAILURE_REPORT_MAX_FILES = 200
+WATCHDOG_INTERVAL = 0.1
+WATCHDOG_THRESHOLD_MS = 250
+WATCHDOG_REPORT_INTERVAL = 30
+STATISTICS_FILE = "../statistics/statistics.json"
+STATISTICS_BUCKET_SECONDS = 3600
+STATISTICS_FLUSH_INTERVAL = 300
+STATISTICS_TOP_COUNT = 10
+INTERACTION_DEADLINE = 3
+OUTBOUND_MAX_CONCURRENCY = 8
+OUTBOUND_ROUTE_CONCURRENCY = 2
+RENDER_MEMORY_BUDGET_MB = 256
+RENDER_INITIAL_PEAK_MB = 64
+RENDER_PEAK_WINDOW = 20
+FONT_FILE = "../files/CrotahFreeVersionItalic-z8Ev3.ttf"
+FONT_FALLBACK_FILE = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+FONT_SIZE = 25
+DAILY_CHALLENGE_ATTEMPTS = 5
+GALLERY_PATH = "../created_challenges/thumbnails/"
+GALLERY_INDEX_FILE = "../created_challenges/thumbnails/index.jsonl"
+GALLERY_THUMBNAIL_SIZE = (240, 160)
+GALLERY_COLUMNS = 4
+GALLERY_ROWS = 4
+GALLERY_SHEET_CACHE_SIZE = 16
+AUTOCOMPLETE_LIMIT = 25
+USER_INFO_INVALID_LOCATION = "Diese Start-Stadt gibt es nicht."
+OVERLAY_PAGE_FILE = "../files/overlay.html"
+OVERLAY_HISTORY_SIZE = 10
+OVERLAY_LONG_POLL_TIMEOUT = 30
+OVERLAY_KEEP_ALIVE = 15
+VOTING_ROUND_SECONDS = 60
+VOTING_UPDATE_INTERVAL = 2
+VOTING_TALLY_LINES = 10
+VOTING_STARTED_MESSAGE = "Die Abstimmung über die Stream-Challenge beginnt!"
+CHALLENGE_PICTURE_FAILED = "Das Bild der Challenge konnte nicht erstellt werden."
+GATEWAY_USAGE_INTERVAL = 3600
+COMMAND_SYNC_CONCURRENCY = 4
+INTERACTION_TRACE_PATH = "../traces/"
+INTERACTION_TRACE_FLUSH_INTERVAL = 30
+STATE_DATABASE_FILE = "../state/state.sqlite3"
+COMMAND_SYNC_LEASE = 60
+DAILY_CHALLENGE_LEASE = 600
+DAILY_CHALLENGE_RETRY_DELAY = 60
+DAILY_CHALLENGE_MAX_RETRY_DELAY = 3600
+STATE_RETRY_DELAY = 5
+FONT_MASK_CACHE_SIZE = 4096
+RANDOM_FILL_ATTEMPTS = 100
+RANDOM_FILL_LABEL = "Zufällig füllen"
+RANDOM_FILL_NO_COMBINATION = (
+    "Keine Kombination passt zu den verbleibenden Punkten. Bitte wähle selbst aus. "
+)
@@ -4,17 +4,36 @@
 All functions and classes to create a custom challenge
 """
 import random
+from collections import OrderedDict
+from datetime import datetime
 from source.game_settings import (
+    User,
     custom_config,
+    difficulty_profiles,
     LIST_OF_NEGATIVE_TRAITS,
     LIST_OF_POSITIVE_TRAITS,
+    get_location,
+    get_profession,
+    get_mission,
+    get_settings,
+    get_end_trait_value,
+    difficulty_from_code,
+    challenge_random,
 )
+from source.picture import create_challenge_picture
 
+from source.event_log import log_failure_report
 from source.constants import (
     END_THR_TRAIT_VALUE,
     TRAIT_DIFFERENCE_MIN_THR,
+    OFFSET_TRAIT_VALUE,
+    TRAIT_DIFFERENCE_THR,
+    CHALLENGE_CACHE_SIZE,
 )
 
+challenge_cache = OrderedDict()
+picture_cache = OrderedDict()
+
 
 async def check_limit_value_reached(trait_value: int, end_trait_value: int) -> bool:
     """
@@ -80,7 +99,7 @@ async def check_difference_small_enough(trait: str, game_settings: dict) -> bool
     :param game_settings: Current game settings
     :return: Trait value is small enough
     """
-    if game_settings["difficulty"] == "Impossible":
+    if difficulty_profiles[game_settings["difficulty"]].unlimited_trait_difference:
         return True
     trait_difference_thr = game_settings["trait_difference_thr"]
     if trait in custom_config["NegativePropertiesValue"]:
@@ -99,13 +118,14 @@ async def check_difference_small_enough(trait: str, game_settings: dict) -> bool
 
 
 async def create_custom_challenge_traits(  # pylint: disable=too-many-statements, too-many-branches
-    trait_value: int, end_trait_value: int, game_settings: dict
+    trait_value: int, end_trait_value: int, game_settings: dict, rng: random.Random
 ) -> None:
     """
     Function to create the traits for the custom challenge based on settings
     :param trait_value: current trait value
     :param end_trait_value: trait that must be reached at the end
     :param game_settings: Current game settings
+    :param rng: Random number generator of the challenge
     :return: None
     """
     time_out = 25
@@ -116,6 +136,17 @@ async def create_custom_challenge_traits(  # pylint: disable=too-many-statements
         #     f"Trait-Value: {trait_value} End-Trait-Value: {end_trait_value} "
         #     f"timeout: {time_out} min loop: {min_run_trait_loops}"
         # )
+        if time_out <= 0:
+            log_failure_report(
+                "challenge_generation_failed",
+                {
+                    **game_settings,
+                    "trait_value": trait_value,
+                    "end_trait_value": end_trait_value,
+                },
+            )
+            game_settings["successful_generated"] = False
+            break
         if trait_value < end_trait_value:
             # negativen trait hinzufügen
             if await check_limit_value_reached(trait_value, end_trait_value) and (
@@ -123,7 +154,7 @@ async def create_custom_challenge_traits(  # pylint: disable=too-many-statements
             ):
                 await finish_trait_value(end_trait_value - trait_value, game_settings)
                 break
-            negative_trait = random.choice(LIST_OF_NEGATIVE_TRAITS)
+            negative_trait = rng.choice(LIST_OF_NEGATIVE_TRAITS)
             # print(f"Negativer Trait: {negative_trait}")
             if negative_trait in game_settings["negative_traits"]:
                 time_out -= 1
@@ -151,7 +182,7 @@ async def create_custom_challenge_traits(  # pylint: disable=too-many-statements
             ):
                 await finish_trait_value(end_trait_value - trait_value, game_settings)
                 break
-            positive_trait = random.choice(LIST_OF_POSITIVE_TRAITS)
+            positive_trait = rng.choice(LIST_OF_POSITIVE_TRAITS)
             # print(f"Positiver Trait: {positive_trait}")
             if positive_trait in game_settings["positive_traits"]:
                 time_out -= 1
@@ -171,7 +202,7 @@ async def create_custom_challenge_traits(  # pylint: disable=too-many-statements
             ):
                 await finish_trait_value(end_trait_value - trait_value, game_settings)
                 break
-            positive_trait = random.choice(LIST_OF_POSITIVE_TRAITS)
+            positive_trait = rng.choice(LIST_OF_POSITIVE_TRAITS)
             # print(f"Positiver Trait: {positive_trait}")
             if positive_trait in game_settings["positive_traits"]:
                 time_out -= 1
@@ -185,10 +216,91 @@ async def create_custom_challenge_traits(  # pylint: disable=too-many-statements
             trait_value += custom_config["PositivePropertiesValue"][positive_trait]
             game_settings["positive_traits"].append(positive_trait)
             min_run_trait_loops -= 1
-        if time_out <= 0:
-            print(f"Fehler bei {game_settings}")
-            game_settings["successful_generated"] = False
-            break
+
+
+async def custom_challenge_handler(difficulty: str, code: str) -> dict:
+    """
+    Create a custom challenge for requester based on selected difficulty. All random
+    decisions are taken from the random stream of the challenge code, so the same
+    code always creates the same challenge.
+    :param difficulty: level of difficulty
+    :param code: challenge code with the seed of the challenge
+    :return: game settings for challenge
+    """
+    rng = challenge_random(code)
+    game_settings = {
+        "successful_generated": True,
+        "code": code,
+        "location": None,
+        "profession": None,
+        "difficulty": difficulty,
+        "negative_traits": [],
+        "positive_traits": [],
+        "mission": None,
+        "min_traits": difficulty_profiles[difficulty].min_traits,
+        "settings": None,
+        "trait_difference_thr": TRAIT_DIFFERENCE_THR,
+    }
+    game_settings["location"], location_value = get_location(difficulty, rng)
+    game_settings["profession"], profession_value = get_profession(difficulty, rng)
+    game_settings["mission"], _ = get_mission(difficulty, rng)
+    game_settings["settings"] = get_settings(difficulty, rng)
+    # print(game_settings)
+    trait_value = profession_value
+    end_trait_value = (
+        get_end_trait_value(difficulty) + location_value + OFFSET_TRAIT_VALUE
+    )
+    if (
+        end_trait_value - trait_value
+        not in difficulty_profiles[difficulty].reachable_trait_sums
+    ):
+        game_settings["successful_generated"] = False
+        log_failure_report("challenge_trait_sum_unreachable", game_settings)
+        return game_settings
+    await create_custom_challenge_traits(
+        trait_value, end_trait_value, game_settings, rng
+    )
+    return game_settings
+
+
+async def get_custom_challenge(code: str) -> dict:
+    """
+    Get the game settings of a challenge code from the challenge cache or generate
+    them if the code is not cached.
+    :param code: challenge code
+    :return: game settings for challenge
+    """
+    if code in challenge_cache:
+        challenge_cache.move_to_end(code)
+        return challenge_cache[code]
+    game_settings = await custom_challenge_handler(difficulty_from_code(code), code)
+    challenge_cache[code] = game_settings
+    if len(challenge_cache) > CHALLENGE_CACHE_SIZE:
+        challenge_cache.popitem(last=False)
+    return game_settings
+
+
+async def get_custom_challenge_picture(game_settings: dict, user: User) -> bytes:
+    """
+    Get the picture of a challenge from the picture cache or create it. The picture
+    contains the user and the date, so both are part of the cache key.
+    :param game_settings: game settings for challenge
+    :param user: Requested user
+    :return: Picture as PNG data
+    """
+    picture_key = (
+        game_settings["code"],
+        user.user_display_name,
+        datetime.now().strftime("%Y-%m-%d"),
+    )
+    if picture_key in picture_cache:
+        picture_cache.move_to_end(picture_key)
+        return picture_cache[picture_key]
+    picture = await create_challenge_picture(game_settings, user)
+    picture_cache[picture_key] = picture
+    if len(picture_cache) > CHALLENGE_CACHE_SIZE:
+        picture_cache.popitem(last=False)
+    return picture
 
 
 def main() -> None:
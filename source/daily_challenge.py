@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Challenge of the day. At midnight one challenge per difficulty level is generated and
+rendered once, posted to the daily channel and then reused from the cache. After the
+first upload only the attachment URL of the picture is sent.
+"""
+import os
+import io
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+import discord
+from source.game_settings import (
+    User,
+    difficulty_profiles,
+    get_custom_challenge_summary,
+    DIFFICULTY_LEVELS,
+)
+from source.custom_challenge import get_custom_challenge
+from source.picture import create_challenge_picture
+from source.challenge_message import create_challenge_embed
+from source.state_backend import state_backend, INSTANCE_ID
+from source.event_log import log_event
+from source.constants import (
+    CHALLENGE_CODE_ALPHABET,
+    CHALLENGE_CODE_LENGTH,
+    DAILY_CHALLENGE_ATTEMPTS,
+    DAILY_CHALLENGE_LEASE,
+    DAILY_CHALLENGE_RETRY_DELAY,
+    DAILY_CHALLENGE_MAX_RETRY_DELAY,
+)
+
+CHANNEL_DAILY_CHALLENGE_ID = os.getenv("CHANNEL_DAILY_CHALLENGE_ID", None)
+DAILY_USER = User(user_id=0, user_name="daily", user_display_name="Challenge des Tages")
+
+
+def daily_challenge_code(day: str, difficulty: str, attempt: int) -> str:
+    """
+    Create the challenge code of a day, so a restart creates the same challenge
+    :param day: Date of the challenge
+    :param difficulty: Difficulty level
+    :param attempt: Number of the attempt, if a code could not be generated
+    :return: Challenge code
+    """
+    rng = random.Random(f"daily:{day}:{difficulty}:{attempt}")
+    seed = "".join(
+        rng.choice(CHALLENGE_CODE_ALPHABET) for _ in range(CHALLENGE_CODE_LENGTH)
+    )
+    return CHALLENGE_CODE_ALPHABET[DIFFICULTY_LEVELS.index(difficulty)] + seed
+
+
+class DailyChallenge:
+    """
+    Challenges of the current day with their picture or attachment URL
+    """
+
+    def __init__(self):
+        self.day = None
+        self.challenges = {}
+        self.lock = None
+
+    async def prepare(self, day: str) -> None:
+        """
+        Generate and render the challenges of a day, the URLs of a day which was
+        already posted are taken from the configuration
+        :param day: Date of the challenges
+        :return: None
+        """
+        stored = await state_backend.get_value("daily_challenge", {})
+        stored_urls = stored.get("urls", {}) if stored.get("day") == day else {}
+        challenges = {}
+        for difficulty in difficulty_profiles:
+            for attempt in range(DAILY_CHALLENGE_ATTEMPTS):
+                code = daily_challenge_code(day, difficulty, attempt)
+                game_settings = await get_custom_challenge(code)
+                if game_settings["successful_generated"]:
+                    break
+            else:
+                log_event(
+                    "daily_challenge_failed", logging.ERROR, difficulty=difficulty
+                )
+                continue
+            challenges[difficulty] = {
+                "code": code,
+                "game_settings": game_settings,
+                "url": stored_urls.get(code),
+                "picture": None,
+            }
+            if challenges[difficulty]["url"] is None:
+                challenges[difficulty]["picture"] = await create_challenge_picture(
+                    game_settings, DAILY_USER
+                )
+        self.day = day
+        self.challenges = challenges
+        log_event("daily_challenge_prepared", day=day, renders=self.pending_uploads())
+
+    def pending_uploads(self) -> int:
+        """
+        Number of challenges, which picture was not uploaded yet
+        :return: Number of challenges without attachment URL
+        """
+        return sum(1 for element in self.challenges.values() if element["url"] is None)
+
+    async def current(self) -> dict:
+        """
+        Get the challenges of today, they are prepared if the day changed
+        :return: Challenges by difficulty level
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            day = datetime.now().strftime("%Y-%m-%d")
+            if self.day != day:
+                await self.prepare(day)
+        return self.challenges
+
+    def message(self, difficulties: list) -> dict:
+        """
+        Create the message of the challenges. Pictures with attachment URL are
+        linked, the other pictures are attached.
+        :param difficulties: Difficulty levels of the message
+        :return: Content, embeds and files of the message
+        """
+        embeds = []
+        files = []
+        for difficulty in difficulties:
+            challenge = self.challenges[difficulty]
+            embed = create_challenge_embed(
+                get_custom_challenge_summary(challenge["game_settings"])
+            )
+            embed.title = f"{difficulty} ({challenge['code']})"
+            if challenge["url"] is not None:
+                embed.set_image(url=challenge["url"])
+            else:
+                filename = f"daily_{challenge['code']}.png"
+                embed.set_image(url=f"attachment://{filename}")
+                files.append(
+                    discord.File(io.BytesIO(challenge["picture"]), filename=filename)
+                )
+            embeds.append(embed)
+        return {
+            "content": f"Challenge des Tages ({self.day}):",
+            "embeds": embeds,
+            "files": files,
+        }
+
+    async def store_urls(self, message: discord.Message) -> None:
+        """
+        Keep the attachment URLs of an uploaded message and release the pictures
+        :param message: Sent message with the attached pictures
+        :return: None
+        """
+        urls = {
+            attachment.filename: attachment.url for attachment in message.attachments
+        }
+        for challenge in self.challenges.values():
+            url = urls.get(f"daily_{challenge['code']}.png")
+            if url is not None:
+                challenge["url"] = url
+                challenge["picture"] = None
+        await state_backend.set_value(
+            "daily_challenge",
+            {
+                "day": self.day,
+                "urls": {
+                    element["code"]: element["url"]
+                    for element in self.challenges.values()
+                    if element["url"] is not None
+                },
+            },
+        )
+
+    async def send(self, send, difficulties: list) -> None:
+        """
+        Send the challenges of today and keep the URLs of uploaded pictures. Uploads
+        are serialized, so every picture is uploaded only once.
+        :param send: Coroutine function to send the message, must return the message
+        :param difficulties: Difficulty levels, all levels if it is empty
+        :return: None
+        """
+        challenges = await self.current()
+        difficulties = [
+            element for element in difficulties or challenges if element in challenges
+        ]
+        message = self.message(difficulties)
+        if not message["files"]:
+            await send(**message)
+            return
+        async with self.lock:
+            message = self.message(difficulties)
+            sent_message = await send(**message)
+            if message["files"]:
+                await self.store_urls(sent_message)
+
+    async def post(self, client: discord.Client) -> bool:
+        """
+        Post the challenges of today to the daily channel, if no instance posted them
+        yet. The lease of the day is held while posting and released afterwards.
+        :param client: Discord client
+        :return: True if the challenges of today are posted
+        """
+        challenges = await self.current()
+        if await state_backend.get_value("daily_challenge_posted") == self.day:
+            return True
+        lease = f"daily_challenge:{self.day}"
+        if not await state_backend.acquire_lease(
+            lease, INSTANCE_ID, DAILY_CHALLENGE_LEASE
+        ):
+            return False
+        try:
+            channel_id = int(CHANNEL_DAILY_CHALLENGE_ID)
+            channel = client.get_channel(channel_id)
+            if channel is None:
+                channel = await client.fetch_channel(channel_id)
+            await self.send(channel.send, list(challenges))
+        except BaseException:
+            await state_backend.release_lease(lease, INSTANCE_ID)
+            raise
+        # If the day could not be marked, the lease blocks a second post until it expires
+        if await state_backend.set_value("daily_challenge_posted", self.day):
+            await state_backend.release_lease(lease, INSTANCE_ID)
+        log_event("daily_challenge_posted", day=self.day)
+        return True
+
+    async def run(self, client: discord.Client) -> None:
+        """
+        Post the challenges to the daily channel at startup, if they were not posted
+        today, and then every midnight. A failed post or a post of another instance,
+        which is not finished, is checked again with an increasing delay.
+        :param client: Discord client
+        :return: None
+        """
+        if CHANNEL_DAILY_CHALLENGE_ID is None:
+            return
+        retry_delay = DAILY_CHALLENGE_RETRY_DELAY
+        while True:
+            try:
+                posted = await self.post(client)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                log_event(
+                    "daily_challenge_post_failed",
+                    logging.ERROR,
+                    day=self.day,
+                    error=repr(error),
+                    retry_delay=retry_delay,
+                )
+                posted = False
+            if not posted:
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, DAILY_CHALLENGE_MAX_RETRY_DELAY)
+                continue
+            retry_delay = DAILY_CHALLENGE_RETRY_DELAY
+            now = datetime.now()
+            midnight = datetime.combine(
+                now.date() + timedelta(days=1), datetime.min.time()
+            )
+            await asyncio.sleep((midnight - now).total_seconds())
+
+
+daily_challenge = DailyChallenge()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
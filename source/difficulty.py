@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Difficulty profiles of the custom challenge. Every profile of the configuration is
+compiled once into tables, so the generation only needs constant time lookups.
+"""
+from collections import namedtuple
+from source.sampling import weighted_sampler
+
+DifficultyProfile = namedtuple(
+    "DifficultyProfile",
+    [
+        "name",
+        "emoji",
+        "description",
+        "locations",
+        "location_values",
+        "professions",
+        "profession_values",
+        "missions",
+        "settings",
+        "end_trait_value",
+        "min_traits",
+        "unlimited_trait_difference",
+        "reachable_trait_sums",
+        "location_sampler",
+        "profession_sampler",
+        "mission_sampler",
+        "settings_sampler",
+    ],
+)
+
+
+def reachable_trait_sums(trait_values: list) -> frozenset:
+    """
+    Calculate all sums which can be reached with any combination of the traits,
+    every trait can be selected once.
+    :param trait_values: Values of all traits
+    :return: Set of reachable sums
+    """
+    sums = {0}
+    for value in trait_values:
+        sums |= {element + value for element in sums}
+    return frozenset(sums)
+
+
+def compile_difficulty_profile(name: str, profile: dict, trait_sums) -> tuple:
+    """
+    Compile the configuration of one difficulty level into sampling tables. The
+    optional weights of the locations, professions, missions and settings are
+    compiled into alias samplers.
+    :param name: Name of the difficulty level
+    :param profile: Configuration of the difficulty level
+    :param trait_sums: Reachable trait sums of all traits
+    :return: Compiled difficulty profile
+    """
+    weights = profile.get("Weights", {})
+    return DifficultyProfile(
+        name=name,
+        emoji=profile.get("Emoji"),
+        description=profile.get("Description", name),
+        locations=tuple(profile["StartLocation"].keys()),
+        location_values=dict(profile["StartLocation"]),
+        professions=tuple(profile["Professions"].keys()),
+        profession_values=dict(profile["Professions"]),
+        missions=tuple(profile["Mission"]),
+        settings=tuple(profile["Settings"]),
+        end_trait_value=profile["EndTraitValue"],
+        min_traits=profile["MinTraits"],
+        unlimited_trait_difference=profile.get("UnlimitedTraitDifference", False),
+        reachable_trait_sums=trait_sums,
+        location_sampler=weighted_sampler(
+            profile["StartLocation"].keys(), weights.get("StartLocation")
+        ),
+        profession_sampler=weighted_sampler(
+            profile["Professions"].keys(), weights.get("Professions")
+        ),
+        mission_sampler=weighted_sampler(profile["Mission"], weights.get("Mission")),
+        settings_sampler=weighted_sampler(profile["Settings"], weights.get("Settings")),
+    )
+
+
+def compile_difficulty_profiles(custom_config: dict) -> dict:
+    """
+    Compile all difficulty profiles of the custom challenge configuration. The
+    order of the configuration is the order of the levels.
+    :param custom_config: Configuration of the custom challenge
+    :return: Compiled profiles by name of the difficulty level
+    """
+    trait_sums = reachable_trait_sums(
+        list(custom_config["NegativePropertiesValue"].values())
+        + list(custom_config["PositivePropertiesValue"].values())
+    )
+    return {
+        name: compile_difficulty_profile(name, profile, trait_sums)
+        for name, profile in custom_config["DifficultyProfiles"].items()
+    }
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Structured logging of the bot. Log records are put into a queue on the event loop
+and written by a background listener thread, so log I/O never blocks the loop.
+Failed challenge generations are stored as reports in a rotating directory.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from source.constants import FAILURE_REPORT_PATH, FAILURE_REPORT_MAX_FILES
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+
+logger = logging.getLogger("tetue_pz_challenge_bot")
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+log_listener = {"listener": None}
+
+
+def set_correlation_id(value) -> None:
+    """
+    Set the correlation id for all log events of the current command or session
+    :param value: Id of the interaction or session
+    :return: None
+    """
+    correlation_id.set(str(value))
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Log a structured event with additional fields
+    :param event: Name of the event
+    :param level: Log level
+    :param fields: Additional fields of the event
+    :return: None
+    """
+    logger.log(level, event, extra={"fields": fields})
+
+
+def log_failure_report(event: str, report: dict) -> None:
+    """
+    Log an error with a report, which is also written to the failure report store
+    :param event: Name of the event
+    :param report: Report with all information to replay the failure
+    :return: None
+    """
+    logger.error(event, extra={"fields": {}, "report": report})
+
+
+class CorrelationFilter(logging.Filter):  # pylint: disable=too-few-public-methods
+    """
+    Add the correlation id of the current context to the record. This must run on
+    the event loop, before the record is put into the queue.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):  # pylint: disable=too-few-public-methods
+    """
+    Let only a fraction of the debug and info records pass, warnings and errors
+    are never dropped.
+    """
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.sample_rate >= 1:
+            return True
+        return random.random() < self.sample_rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a log record as one JSON object per line
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None),
+        }
+        event.update(getattr(record, "fields", {}))
+        if hasattr(record, "report"):
+            event["report"] = record.report
+        if record.exc_info:
+            event["exception"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class FailureReportHandler(logging.Handler):
+    """
+    Write records with a report to the rotating failure report store
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not hasattr(record, "report"):
+            return
+        try:
+            os.makedirs(FAILURE_REPORT_PATH, exist_ok=True)
+            report_name = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime())
+            report_name += (
+                f"_{record.report.get('code', 'unknown')}_{uuid.uuid4().hex[:6]}.json"
+            )
+            with open(
+                os.path.join(FAILURE_REPORT_PATH, report_name), "w", encoding="utf-8"
+            ) as file:
+                file.write(self.format(record))
+            reports = sorted(os.listdir(FAILURE_REPORT_PATH))
+            for old_report in reports[:-FAILURE_REPORT_MAX_FILES]:
+                os.remove(os.path.join(FAILURE_REPORT_PATH, old_report))
+        except OSError:
+            self.handleError(record)
+
+
+def setup_logging() -> None:
+    """
+    Route all log records of the bot and discord.py through a queue to a background
+    listener thread, which writes them as JSON to stdout and the failure reports
+    to the store.
+    :return: None
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+    root_logger = logging.getLogger()
+    root_logger.setLevel(LOG_LEVEL)
+    root_logger.addHandler(queue_handler)
+
+    formatter = JsonFormatter()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    report_handler = FailureReportHandler()
+    report_handler.setFormatter(formatter)
+    listener = QueueListener(
+        log_queue, stream_handler, report_handler, respect_handler_level=True
+    )
+    listener.start()
+    log_listener["listener"] = listener
+
+
+def shutdown_logging() -> None:
+    """
+    Stop the listener thread after all queued records are written
+    :return: None
+    """
+    if log_listener["listener"] is not None:
+        log_listener["listener"].stop()
+        log_listener["listener"] = None
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Font fallback chain for the challenge pictures. Characters which are missing in the
+display font are drawn with the next font of the chain. The glyph coverage of each
+font is probed once per character and the split of a text into font runs is cached.
+"""
+import os
+import math
+import functools
+from PIL import Image, ImageFont
+from source.game_settings import (
+    substitution_dictionary,
+    custom_config,
+    stream_challenge_config,
+)
+from source.constants import (
+    FONT_FILE,
+    FONT_FALLBACK_FILE,
+    FONT_SIZE,
+    FONT_MASK_CACHE_SIZE,
+)
+
+MISSING_GLYPH_PROBE = "\U0010fffd"
+
+
+class FontChain:
+    """
+    Fonts in order of preference with their cached glyph coverage
+    """
+
+    def __init__(self, font_files: list, size: int):
+        self.fonts = [
+            ImageFont.truetype(font_file, size)
+            for font_file in font_files
+            if os.path.isfile(font_file)
+        ]
+        self.missing_glyphs = [
+            bytes(font.getmask(MISSING_GLYPH_PROBE)) for font in self.fonts
+        ]
+        self.coverage = [set() for _ in self.fonts]
+        self.probed = set()
+        self.runs = functools.lru_cache(maxsize=4096)(self.split_runs)
+        self.masks = functools.lru_cache(maxsize=FONT_MASK_CACHE_SIZE)(self.rasterize)
+        self.lengths = functools.lru_cache(maxsize=FONT_MASK_CACHE_SIZE)(self.measure)
+
+    def probe(self, character: str) -> None:
+        """
+        Add a character to the coverage of all fonts which contain its glyph
+        :param character: Character to probe
+        :return: None
+        """
+        for index, font in enumerate(self.fonts):
+            if character.isspace():
+                self.coverage[index].add(character)
+                continue
+            mask = font.getmask(character)
+            if mask.getbbox() is not None and (
+                bytes(mask) != self.missing_glyphs[index]
+            ):
+                self.coverage[index].add(character)
+        self.probed.add(character)
+
+    def warm_up(self, texts) -> None:
+        """
+        Probe all characters of known texts, so the renders do not need to probe
+        :param texts: Texts which are drawn on the pictures
+        :return: None
+        """
+        for text in texts:
+            for character in set(text) - self.probed:
+                self.probe(character)
+
+    def font_index(self, character: str) -> int:
+        """
+        Get the first font of the chain which contains the character
+        :param character: Character to draw
+        :return: Index of the font, None if no font contains it
+        """
+        if character not in self.probed:
+            self.probe(character)
+        for index, coverage in enumerate(self.coverage):
+            if character in coverage:
+                return index
+        return None
+
+    def split_runs(self, text: str) -> tuple:
+        """
+        Split a text into runs of characters which are drawn with the same font.
+        Characters without glyph in any font are replaced with the substitution.
+        :param text: Text to draw
+        :return: Tuple of font index and text of each run
+        """
+        runs = []
+        for character in text:
+            index = self.font_index(character)
+            if index is None:
+                character = character.translate(substitution_dictionary)
+                index = 0
+            if runs and runs[-1][0] == index:
+                runs[-1][1] += character
+            else:
+                runs.append([index, character])
+        return tuple((index, run) for index, run in runs)
+
+    def rasterize(self, index: int, run: str, mode: str, start: float) -> tuple:
+        """
+        Rasterize a run with FreeType, the mask is cached and reused by all renders
+        which draw the same run at the same subpixel offset
+        :param index: Index of the font
+        :param run: Text of the run
+        :param mode: Mode of the mask
+        :param start: Fractional part of the horizontal position
+        :return: Alpha mask as image and its offset from the baseline position
+        """
+        mask, offset = self.fonts[index].getmask2(
+            run, mode, anchor="ls", start=(start, 0.0)
+        )
+        return Image.frombytes(mask.mode, mask.size, bytes(mask)), offset
+
+    def measure(self, index: int, run: str) -> float:
+        """
+        Get the advance of a run, cached with the masks
+        :param index: Index of the font
+        :param run: Text of the run
+        :return: Length of the run in pixels
+        """
+        return self.fonts[index].getlength(run)
+
+    def draw_text(self, draw, position: tuple, text: str, fill) -> None:
+        """
+        Draw a text with the fallback chain. All runs share the baseline of the
+        display font, so the text is at the same position as with the display font.
+        The cached masks are drawn with ImageDraw.bitmap, which blits them the same
+        way as ImageDraw.text, so the picture is identical to drawing each run with
+        ImageDraw.text.
+        :param draw: Draw object of the picture
+        :param position: Left top position of the text
+        :param text: Text to draw
+        :param fill: Color of the text
+        :return: None
+        """
+        pos_x, pos_y = position
+        baseline = int(pos_y + self.fonts[0].getmetrics()[0])
+        for index, run in self.runs(text):
+            start, whole = math.modf(pos_x)
+            mask, offset = self.masks(index, run, draw.fontmode, start)
+            draw.bitmap((int(whole) + offset[0], baseline + offset[1]), mask, fill)
+            pos_x += self.lengths(index, run)
+
+
+def config_texts(value):
+    """
+    Get all texts of a configuration, which can be drawn on a picture
+    :param value: Configuration or part of it
+    :return: Generator of all keys and string values
+    """
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for key, element in value.items():
+            yield from config_texts(key)
+            yield from config_texts(element)
+    elif isinstance(value, list):
+        for element in value:
+            yield from config_texts(element)
+
+
+@functools.lru_cache(maxsize=1)
+def get_font_chain() -> FontChain:
+    """
+    Load the font chain once and probe the characters of the configuration, the
+    fonts are shared by all renders
+    :return: Font chain of the pictures
+    """
+    font_chain = FontChain(
+        [FONT_FILE, os.getenv("FONT_FALLBACK_FILE", FONT_FALLBACK_FILE)], FONT_SIZE
+    )
+    font_chain.warm_up(config_texts(custom_config))
+    font_chain.warm_up(config_texts(stream_challenge_config))
+    return font_chain
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
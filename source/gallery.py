@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gallery of the created challenges. A thumbnail is created in the background when a
+picture is archived and stored by the hash of the picture. Contact sheets of the
+thumbnails are composed on demand and cached until new pictures arrive.
+"""
+import os
+import io
+import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from PIL import Image, ImageDraw, ImageFont
+from source.profiling import run_in_worker
+from source.constants import (
+    GALLERY_PATH,
+    GALLERY_INDEX_FILE,
+    GALLERY_THUMBNAIL_SIZE,
+    GALLERY_COLUMNS,
+    GALLERY_ROWS,
+    GALLERY_SHEET_CACHE_SIZE,
+)
+
+LABEL_HEIGHT = 16
+
+
+def create_thumbnail(picture: bytes, thumbnail_path: str) -> None:
+    """
+    Create the thumbnail of a picture, runs in a worker thread
+    :param picture: Picture as PNG data
+    :param thumbnail_path: Path of the thumbnail
+    :return: None
+    """
+    with Image.open(io.BytesIO(picture)) as img:
+        img.thumbnail(GALLERY_THUMBNAIL_SIZE)
+        img.convert("RGB").save(thumbnail_path, format="PNG")
+
+
+def append_index(entry: dict) -> None:
+    """
+    Append an entry to the gallery index, runs in a worker thread
+    :param entry: Hash, label and date of the picture
+    :return: None
+    """
+    with open(GALLERY_INDEX_FILE, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def compose_sheet(entries: list) -> bytes:
+    """
+    Compose the contact sheet of thumbnails, runs in a worker thread
+    :param entries: Entries of the page, newest first
+    :return: Contact sheet as PNG data
+    """
+    width, height = GALLERY_THUMBNAIL_SIZE
+    rows = (len(entries) + GALLERY_COLUMNS - 1) // GALLERY_COLUMNS
+    font = ImageFont.load_default()
+    with Image.new(
+        "RGB",
+        (GALLERY_COLUMNS * width, max(rows, 1) * (height + LABEL_HEIGHT)),
+        (32, 32, 32),
+    ) as sheet:
+        draw = ImageDraw.Draw(sheet)
+        for index, entry in enumerate(entries):
+            pos_x = index % GALLERY_COLUMNS * width
+            pos_y = index // GALLERY_COLUMNS * (height + LABEL_HEIGHT)
+            with Image.open(os.path.join(GALLERY_PATH, entry["hash"] + ".png")) as img:
+                sheet.paste(img, (pos_x, pos_y))
+            draw.text(
+                (pos_x + 2, pos_y + height + 2),
+                f"{entry['date']} {entry['label']}",
+                fill=(255, 255, 255),
+                font=font,
+            )
+        picture = io.BytesIO()
+        sheet.save(picture, format="PNG")
+    return picture.getvalue()
+
+
+class Gallery:
+    """
+    Index of the thumbnails with the cache of the composed contact sheets
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.hashes = set()
+        self.sheets = OrderedDict()
+        self.tasks = set()
+        self.metrics = {"sheet_hits": 0, "sheet_misses": 0, "known_pictures": 0}
+
+    def load(self) -> None:
+        """
+        Read the gallery index
+        :return: None
+        """
+        os.makedirs(GALLERY_PATH, exist_ok=True)
+        if not os.path.isfile(GALLERY_INDEX_FILE):
+            return
+        with open(GALLERY_INDEX_FILE, encoding="utf-8") as file:
+            for line in file:
+                entry = json.loads(line)
+                if entry["hash"] not in self.hashes:
+                    self.hashes.add(entry["hash"])
+                    self.entries.append(entry)
+
+    def add(self, picture: bytes, label: str) -> None:
+        """
+        Create the thumbnail of an archived picture in the background
+        :param picture: Picture as PNG data
+        :param label: Label of the picture in the contact sheet
+        :return: None
+        """
+        task = asyncio.get_running_loop().create_task(self.create_entry(picture, label))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def create_entry(self, picture: bytes, label: str) -> None:
+        """
+        Create the thumbnail and the index entry, if the picture is new
+        :param picture: Picture as PNG data
+        :param label: Label of the picture in the contact sheet
+        :return: None
+        """
+        picture_hash = hashlib.sha256(picture).hexdigest()[:32]
+        if picture_hash in self.hashes:
+            self.metrics["known_pictures"] += 1
+            return
+        self.hashes.add(picture_hash)
+        thumbnail_path = os.path.join(GALLERY_PATH, picture_hash + ".png")
+        await run_in_worker(create_thumbnail, picture, thumbnail_path)
+        entry = {
+            "hash": picture_hash,
+            "label": label,
+            "date": datetime.now().strftime("%Y-%m-%d"),
+        }
+        await run_in_worker(append_index, entry)
+        self.entries.append(entry)
+
+    def pages(self) -> int:
+        """
+        Number of contact sheet pages
+        :return: Number of pages
+        """
+        page_size = GALLERY_COLUMNS * GALLERY_ROWS
+        return max((len(self.entries) + page_size - 1) // page_size, 1)
+
+    async def sheet(self, page: int) -> bytes:
+        """
+        Get a contact sheet page, the newest pictures are on the first page. Pages
+        are cached until a new picture is added.
+        :param page: Number of the page, starting with 1
+        :return: Contact sheet as PNG data, None if the gallery is empty
+        """
+        if not self.entries:
+            return None
+        key = (page, len(self.entries))
+        if key in self.sheets:
+            self.metrics["sheet_hits"] += 1
+            self.sheets.move_to_end(key)
+            return self.sheets[key]
+        self.metrics["sheet_misses"] += 1
+        page_size = GALLERY_COLUMNS * GALLERY_ROWS
+        newest_first = self.entries[::-1]
+        entries = newest_first[(page - 1) * page_size : page * page_size]
+        picture = await run_in_worker(compose_sheet, entries)
+        self.sheets[key] = picture
+        if len(self.sheets) > GALLERY_SHEET_CACHE_SIZE:
+            self.sheets.popitem(last=False)
+        return picture
+
+    def statistics(self) -> dict:
+        """
+        Metrics of the gallery for monitoring. A sheet request is a cache hit, if
+        the page was composed before and no picture was added since.
+        :return: Cache counters, thumbnails and pending thumbnail tasks
+        """
+        requests = self.metrics["sheet_hits"] + self.metrics["sheet_misses"]
+        return {
+            **self.metrics,
+            "sheet_hit_rate": self.metrics["sheet_hits"] / max(requests, 1),
+            "cached_sheets": len(self.sheets),
+            "thumbnails": len(self.entries),
+            "pending_tasks": len(self.tasks),
+        }
+
+
+gallery = Gallery()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
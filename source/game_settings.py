@@ -4,6 +4,8 @@
 Package to provide all necessary information and functions for the game settings
 """
 import random
+import secrets
+import functools
 from collections import namedtuple
 import yaml
 from source.constants import (
@@ -18,7 +20,12 @@ from source.constants import (
     USER_INFO_MESSAGE_APPROVAL_4,
     USER_INFO_MESSAGE_APPROVAL_5,
     DEFAULT_SKIP_SELECTION,
+    CHALLENGE_CODE_ALPHABET,
+    CHALLENGE_CODE_LENGTH,
 )
+from source.session_registry import StreamChallengeSession
+from source.difficulty import compile_difficulty_profiles
+from source.sampling import AliasSampler, weighted_sampler
 
 with open(CONFIG_FILE, encoding="utf-8") as f:
     config = yaml.safe_load(f)
@@ -31,6 +38,8 @@ with open(CONFIG_STREAM_CHALLENGE_FILE, encoding="utf-8") as f:
 
 LIST_OF_POSITIVE_TRAITS = list(custom_config["PositivePropertiesValue"].keys())
 LIST_OF_NEGATIVE_TRAITS = list(custom_config["NegativePropertiesValue"].keys())
+difficulty_profiles = compile_difficulty_profiles(custom_config)
+DIFFICULTY_LEVELS = list(difficulty_profiles.keys())
 
 substitution_dictionary = {
     ord("Ü"): "Ue",
@@ -45,6 +54,52 @@ substitution_dictionary = {
 User = namedtuple("User", ["user_id", "user_name", "user_display_name"])
 
 
+def read_custom_config() -> tuple:
+    """
+    Read the configuration of the custom challenge again and compile the difficulty
+    profiles and samplers, runs in a worker thread. The difficulty levels must keep
+    their order, because the first character of a challenge code is the index of its
+    level, so new levels can only be appended.
+    :return: New configuration and compiled difficulty profiles
+    """
+    with open(CONFIG_CUSTOM_CHALLENGE_FILE, encoding="utf-8") as file:
+        new_config = yaml.safe_load(file)
+    new_profiles = compile_difficulty_profiles(new_config)
+    if list(new_profiles)[: len(DIFFICULTY_LEVELS)] != DIFFICULTY_LEVELS:
+        raise ValueError(
+            f"difficulty levels {DIFFICULTY_LEVELS} must not be removed or reordered"
+        )
+    return new_config, new_profiles
+
+
+def apply_custom_config(new_config: dict, new_profiles: dict) -> None:
+    """
+    Use a new configuration of the custom challenge. All objects are updated in
+    place, so every module uses the new configuration.
+    :param new_config: New configuration of the custom challenge
+    :param new_profiles: Compiled difficulty profiles of the new configuration
+    :return: None
+    """
+    custom_config.clear()
+    custom_config.update(new_config)
+    LIST_OF_POSITIVE_TRAITS[:] = list(custom_config["PositivePropertiesValue"].keys())
+    LIST_OF_NEGATIVE_TRAITS[:] = list(custom_config["NegativePropertiesValue"].keys())
+    difficulty_profiles.clear()
+    difficulty_profiles.update(new_profiles)
+    DIFFICULTY_LEVELS[:] = list(difficulty_profiles.keys())
+    get_background_sampler.cache_clear()
+
+
+@functools.lru_cache(maxsize=8)
+def get_background_sampler(pictures: tuple) -> AliasSampler:
+    """
+    Get the sampler of the background pictures with their optional weights
+    :param pictures: Sorted names of all background pictures
+    :return: Sampler of the background pictures
+    """
+    return weighted_sampler(pictures, custom_config.get("BackgroundWeights"))
+
+
 def write_config(key: str, value) -> None:
     """
     Function to write statistic data in a configuration file
@@ -57,93 +112,88 @@ def write_config(key: str, value) -> None:
         yaml.dump(config, datei, default_flow_style=False)
 
 
-def get_location(difficulty: str) -> list[str, int]:
+def create_challenge_code(difficulty: str) -> str:
+    """
+    Create a new short code for a challenge. The first character encodes the
+    difficulty level, the rest is the seed of the challenge.
+    :param difficulty: difficulty level
+    :return: Challenge code as string
+    """
+    seed = "".join(
+        secrets.choice(CHALLENGE_CODE_ALPHABET) for _ in range(CHALLENGE_CODE_LENGTH)
+    )
+    return CHALLENGE_CODE_ALPHABET[DIFFICULTY_LEVELS.index(difficulty)] + seed
+
+
+def difficulty_from_code(code: str) -> str | None:
+    """
+    Get the difficulty level of a challenge code
+    :param code: Challenge code
+    :return: Difficulty level or None if the code is not valid
+    """
+    if len(code) != CHALLENGE_CODE_LENGTH + 1 or any(
+        element not in CHALLENGE_CODE_ALPHABET for element in code
+    ):
+        return None
+    level_index = CHALLENGE_CODE_ALPHABET.index(code[0])
+    if level_index >= len(DIFFICULTY_LEVELS):
+        return None
+    return DIFFICULTY_LEVELS[level_index]
+
+
+def challenge_random(code: str, stream: str = "challenge") -> random.Random:
+    """
+    Create the random number generator of a challenge, so the same code always
+    creates the same challenge.
+    :param code: Challenge code
+    :param stream: Name of the random stream, e.g. for the background image
+    :return: Random number generator
+    """
+    return random.Random(f"{code}:{stream}")
+
+
+def get_location(difficulty: str, rng: random.Random) -> list[str, int]:
     """
     Get the location for the challenge based on difficulty level
     :param difficulty: difficulty level
+    :param rng: Random number generator of the challenge
     :return: List of the location with the trait value
     """
-    location_settings = ["Location", 0]
-    if difficulty == "Easy":
-        location_settings[0] = random.choice(
-            list(custom_config["EasyStartLocation"].keys())
-        )
-        location_settings[1] = custom_config["EasyStartLocation"][location_settings[0]]
-    elif difficulty == "Hard":
-        location_settings[0] = random.choice(
-            list(custom_config["HardStartLocation"].keys())
-        )
-        location_settings[1] = custom_config["HardStartLocation"][location_settings[0]]
-    elif difficulty == "Impossible":
-        location_settings[0] = random.choice(
-            list(custom_config["ImpossibleStartLocation"].keys())
-        )
-        location_settings[1] = custom_config["ImpossibleStartLocation"][
-            location_settings[0]
-        ]
-    return location_settings
+    profile = difficulty_profiles[difficulty]
+    location = profile.location_sampler.sample(rng)
+    return [location, profile.location_values[location]]
 
 
-def get_profession(difficulty: str) -> list[str, int]:
+def get_profession(difficulty: str, rng: random.Random) -> list[str, int]:
     """
     Get the profession for the challenge based on difficulty level
     :param difficulty: difficulty level
+    :param rng: Random number generator of the challenge
     :return: List of the profession with the trait value
     """
-    profession_settings = ["Profession", 0]
-    if difficulty == "Easy":
-        profession_settings[0] = random.choice(
-            list(custom_config["EasyProfessions"].keys())
-        )
-        profession_settings[1] = custom_config["EasyProfessions"][
-            profession_settings[0]
-        ]
-    elif difficulty == "Hard":
-        profession_settings[0] = random.choice(
-            list(custom_config["HardProfessions"].keys())
-        )
-        profession_settings[1] = custom_config["HardProfessions"][
-            profession_settings[0]
-        ]
-    elif difficulty == "Impossible":
-        profession_settings[0] = random.choice(
-            list(custom_config["ImpossibleProfessions"].keys())
-        )
-        profession_settings[1] = custom_config["ImpossibleProfessions"][
-            profession_settings[0]
-        ]
-    return profession_settings
+    profile = difficulty_profiles[difficulty]
+    profession = profile.profession_sampler.sample(rng)
+    return [profession, profile.profession_values[profession]]
 
 
-def get_mission(difficulty: str) -> list[str, int]:
+def get_mission(difficulty: str, rng: random.Random) -> list[str, int]:
     """
     Get the mission for the challenge based on difficulty level
     :param difficulty: difficulty level
+    :param rng: Random number generator of the challenge
     :return: List of the mission with the trait value
     """
-    mission_settings = ["Mission", 0]
-    if difficulty == "Easy":
-        mission_settings[0] = random.choice(custom_config["EasyMission"])
-    elif difficulty == "Hard":
-        mission_settings[0] = random.choice(custom_config["HardMission"])
-    elif difficulty == "Impossible":
-        mission_settings[0] = random.choice(custom_config["ImpossibleMission"])
-    return mission_settings
+    return [difficulty_profiles[difficulty].mission_sampler.sample(rng), 0]
 
 
-def get_settings(difficulty: str) -> str:
+def get_settings(difficulty: str, rng: random.Random) -> str:
     """
     Get the settings for the challenge based on difficulty level
     :param difficulty: difficulty level
+    :param rng: Random number generator of the challenge
     :return: Settings as string
     """
-    if difficulty == "Easy":
-        return random.choice(custom_config["EasySettings"])
-    if difficulty == "Hard":
-        return random.choice(custom_config["HardSettings"])
-    if difficulty == "Impossible":
-        return random.choice(custom_config["ImpossibleSettings"])
-    return "No settings"
+    return difficulty_profiles[difficulty].settings_sampler.sample(rng)
 
 
 def get_end_trait_value(difficulty: str) -> int:
@@ -152,7 +202,7 @@ def get_end_trait_value(difficulty: str) -> int:
     :param difficulty: difficulty level
     :return: end trait value as integer
     """
-    return custom_config["EndTraitValue"][difficulty]
+    return difficulty_profiles[difficulty].end_trait_value
 
 
 def total_sum_of_neg_traits(traits: list) -> int:
@@ -182,42 +232,71 @@ def send_user_info_message_with_points(points: int) -> str:
     return USER_INFO_MESSAGE_1 + str(points) + USER_INFO_MESSAGE_2
 
 
-def get_all_negative_traits(game_settings: dict) -> list:
+def get_all_negative_traits(game_settings: StreamChallengeSession) -> list:
     """
     Combine all the negative traits from game settings and delete process created
     and not used traits.
-    :param game_settings: Current game settings
+    :param game_settings: Session with the current game settings
     :return: List of all negative traits
     """
     negative_traits = (
-        game_settings["negative_trait_1"]
-        + game_settings["negative_trait_2"]
-        + game_settings["negative_trait_3"]
+        game_settings.negative_trait_1
+        + game_settings.negative_trait_2
+        + game_settings.negative_trait_3
     )
     if "Nichts auswählen" in negative_traits:
         negative_traits.remove("Nichts auswählen")
     return negative_traits
 
 
-def send_user_info_message_for_approval(game_settings: dict) -> str:
+def get_stream_challenge_summary(game_settings: StreamChallengeSession) -> dict:
+    """
+    Get the selected game settings of a stream challenge for the user information
+    :param game_settings: Session with the current game settings
+    :return: Game settings by their name in the message
+    """
+    return {
+        "Start-Stadt": game_settings.start_location,
+        "Negative Traits": ", ".join(get_all_negative_traits(game_settings)),
+        "Auftrag": game_settings.mission[0],
+    }
+
+
+def get_custom_challenge_summary(game_settings: dict) -> dict:
+    """
+    Get the generated game settings of a custom challenge for the user information
+    :param game_settings: Game settings of the custom challenge
+    :return: Game settings by their name in the message
+    """
+    return {
+        "Start-Stadt": game_settings["location"],
+        "Beruf": game_settings["profession"],
+        "Positive Traits": ", ".join(game_settings["positive_traits"]) or "-",
+        "Negative Traits": ", ".join(game_settings["negative_traits"]) or "-",
+        "Auftrag": game_settings["mission"],
+        "Einstellungen": game_settings["settings"],
+    }
+
+
+def send_user_info_message_for_approval(game_settings: StreamChallengeSession) -> str:
     """
     Send user information message with all selected game settings
-    :param game_settings: Current game settings
+    :param game_settings: Session with the current game settings
     :return: Information as string
     """
-    negative_traits = get_all_negative_traits(game_settings)
+    summary = get_stream_challenge_summary(game_settings)
     info_message = (
         USER_INFO_MESSAGE_APPROVAL_1
-        + game_settings["start_location"]
+        + summary["Start-Stadt"]
         + "\n"
         + USER_INFO_MESSAGE_APPROVAL_2
-        + ", ".join(negative_traits)
+        + summary["Negative Traits"]
         + "\n"
         + USER_INFO_MESSAGE_APPROVAL_3
-        + game_settings["mission"][0]
+        + summary["Auftrag"]
         + "\n"
         + USER_INFO_MESSAGE_APPROVAL_4
-        + str(game_settings["challenge_points"])
+        + str(game_settings.challenge_points)
         + "\n"
         + USER_INFO_MESSAGE_APPROVAL_5
     )
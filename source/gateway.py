@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gateway profiles of the Discord client. The bot only needs the guild events for the
+channel and role cache, the commands and components are delivered as interactions.
+The minimal profile subscribes to nothing else and turns off the member and message
+caches. The resource usage of the process is logged every hour, so the profiles can
+be compared in production.
+"""
+import os
+import time
+import asyncio
+import resource
+import discord
+from source.render import current_rss
+from source.event_log import log_event
+from source.constants import GATEWAY_USAGE_INTERVAL
+
+GATEWAY_PROFILE = os.getenv("GATEWAY_PROFILE", "minimal").lower()
+
+
+def gateway_options(profile: str = GATEWAY_PROFILE) -> dict:
+    """
+    Get the client options of a gateway profile
+    :param profile: Name of the profile, minimal or default
+    :return: Keyword arguments of the Discord client
+    """
+    if profile == "default":
+        return {"intents": discord.Intents.default()}
+    intents = discord.Intents.none()
+    intents.guilds = True
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+        "max_messages": None,
+    }
+
+
+def cpu_seconds() -> float:
+    """
+    Get the CPU time of the process
+    :return: User and system time in seconds
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def report_usage(interval: int = GATEWAY_USAGE_INTERVAL) -> None:
+    """
+    Log the resident memory and the CPU time per hour of the process
+    :param interval: Time between two reports in seconds
+    :return: None
+    """
+    last_cpu = cpu_seconds()
+    last_time = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now_cpu = cpu_seconds()
+        now_time = time.monotonic()
+        log_event(
+            "process_usage",
+            profile=GATEWAY_PROFILE,
+            rss_bytes=current_rss(),
+            cpu_seconds_per_hour=round(
+                (now_cpu - last_cpu) * 3600 / (now_time - last_time), 3
+            ),
+        )
+        last_cpu = now_cpu
+        last_time = now_time
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
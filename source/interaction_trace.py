@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recording of the interactions for the replay of real workloads. Every command and
+component interaction is written as one compact JSON line with its time offset, an
+anonymous user number, the step and its arguments. User ids, names and session ids
+are not recorded.
+"""
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+import discord
+from source.profiling import run_in_worker
+from source.constants import INTERACTION_TRACE_PATH, INTERACTION_TRACE_FLUSH_INTERVAL
+
+INTERACTION_TRACE = os.getenv("INTERACTION_TRACE", "false").lower() == "true"
+
+
+def trace_step(interaction: discord.Interaction) -> tuple:
+    """
+    Get the step and the arguments of an interaction. The session id in the custom
+    id of a component is removed, so the step is the same in every session.
+    :param interaction: Interaction from message
+    :return: Step and arguments, None if the interaction is not traced
+    """
+    data = interaction.data or {}
+    if interaction.type == discord.InteractionType.application_command:
+        options = {
+            option["name"]: option["value"] for option in data.get("options", [])
+        }
+        return f"command:{data.get('name')}", options
+    if interaction.type == discord.InteractionType.component:
+        parts = data.get("custom_id", "").split(":", 2)
+        step = f"{parts[0]}:{parts[-1]}" if len(parts) == 3 else parts[0]
+        return step, data.get("values", [])
+    return None
+
+
+def write_trace(trace_file: str, lines: list) -> None:
+    """
+    Append the recorded lines to the trace file, runs in a worker thread
+    :param trace_file: Path of the trace file
+    :param lines: Serialized trace lines
+    :return: None
+    """
+    with open(trace_file, "a", encoding="utf-8") as file:
+        file.writelines(lines)
+
+
+def read_trace(trace_file: str) -> list:
+    """
+    Read the events of a trace file
+    :param trace_file: Path of the trace file
+    :return: Events ordered by their time offset
+    """
+    with open(trace_file, encoding="utf-8") as file:
+        events = [json.loads(line) for line in file if line.strip()]
+    return sorted(events, key=lambda event: event["t"])
+
+
+class InteractionTrace:
+    """
+    Buffer of the recorded interactions of this process
+    """
+
+    def __init__(self, enabled: bool = INTERACTION_TRACE):
+        self.enabled = enabled
+        self.trace_file = None
+        self.start = None
+        self.users = {}
+        self.buffer = []
+
+    def record(self, interaction: discord.Interaction) -> None:
+        """
+        Record a command or component interaction
+        :param interaction: Interaction from message
+        :return: None
+        """
+        if not self.enabled:
+            return
+        traced = trace_step(interaction)
+        if traced is None:
+            return
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+            os.makedirs(INTERACTION_TRACE_PATH, exist_ok=True)
+            self.trace_file = os.path.join(
+                INTERACTION_TRACE_PATH,
+                f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+            )
+        user = self.users.setdefault(interaction.user.id, len(self.users))
+        step, arguments = traced
+        event = {"t": round(now - self.start, 3), "u": user, "s": step, "a": arguments}
+        self.buffer.append(json.dumps(event, ensure_ascii=False) + "\n")
+
+    async def flush(self) -> None:
+        """
+        Write the buffered interactions to the trace file
+        :return: None
+        """
+        if not self.buffer:
+            return
+        lines = self.buffer
+        self.buffer = []
+        await run_in_worker(write_trace, self.trace_file, lines)
+
+    async def run_flush(self) -> None:
+        """
+        Write the buffered interactions regularly
+        :return: None
+        """
+        while self.enabled:
+            await asyncio.sleep(INTERACTION_TRACE_FLUSH_INTERVAL)
+            await self.flush()
+
+
+interaction_trace = InteractionTrace()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
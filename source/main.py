@@ -4,46 +4,102 @@
 Main functions for discord bot and general implementations for challenge generator.
 """
 import os
+import io
+import time
 import asyncio
+import functools
+import logging
+import yaml
 import discord
 from discord import app_commands
 
 from source.game_settings import (
     User,
-    get_location,
-    get_profession,
-    get_mission,
-    get_settings,
-    get_end_trait_value,
     send_user_info_message_with_points,
+    create_challenge_code,
+    difficulty_from_code,
+    read_custom_config,
+    apply_custom_config,
 )
 from source.game_settings import (
-    custom_config,
+    difficulty_profiles,
     stream_challenge_config,
     total_sum_of_neg_traits,
     send_user_info_message_for_approval,
+    get_all_negative_traits,
+    get_custom_challenge_summary,
+    get_stream_challenge_summary,
+)
+from source.custom_challenge import (
+    challenge_cache,
+    picture_cache,
+    get_custom_challenge,
+    get_custom_challenge_picture,
 )
-from source.custom_challenge import create_custom_challenge_traits
 from source.stream_challenge import (
     stream_challenge_location,
-    negative_trait_one,
-    negative_trait_two,
-    negative_trait_three,
-    mission,
     mission_value,
+    NegativeTraitOne,
+    NegativeTraitTwo,
+    NegativeTraitThree,
+    MissionOption,
+)
+from source.picture import archive_challenge_picture, herr_apfelring
+from source.session_store import new_session_id
+from source.autocomplete import (
+    DIFFICULTY_CHOICES,
+    difficulty_options,
+    update_difficulty_choices,
+    location_autocomplete,
+)
+from source.session_view import SessionView, resume_session
+from source.challenge_message import send_challenge
+from source.profiling import profiled, set_sample_rate, run_in_worker
+from source.watchdog import loop_watchdog
+from source.fonts import get_font_chain
+from source.outbound import outbound_scheduler
+from source.statistics import challenge_statistics
+from source.daily_challenge import daily_challenge
+from source.gallery import gallery
+from source.overlay import challenge_overlay
+from source.voting import StreamChallengeVote
+from source.gateway import gateway_options, report_usage
+from source.command_sync import sync_command_tree
+from source.interaction_trace import interaction_trace
+from source.state_backend import state_backend
+from source.random_fill import fill_session, get_random_fill
+from source.event_log import (
+    log_event,
+    set_correlation_id,
+    setup_logging,
+    shutdown_logging,
+)
+from source.session_registry import (
+    ChallengeSession,
+    StreamChallengeSession,
+    session_from_dict,
+    session_registry,
 )
-from source.picture import create_challenge_picture, herr_apfelring
+from source.metrics import report_metrics
 from source.constants import (
-    OFFSET_TRAIT_VALUE,
-    TRAIT_DIFFERENCE_THR,
     USER_INFO_WRONG_CHANNEL,
     USER_INFO_NO_ROLE,
+    USER_INFO_INVALID_CODE,
+    USER_INFO_INVALID_LOCATION,
+    CUSTOM_CHALLENGE_TIMEOUT,
+    STREAM_CHALLENGE_TIMEOUT,
+    STATISTICS_TOP_COUNT,
+    VOTING_ROUND_SECONDS,
+    VOTING_STARTED_MESSAGE,
+    RANDOM_FILL_LABEL,
+    RANDOM_FILL_NO_COMBINATION,
 )
 
-intents = discord.Intents.default()
-intents.message_content = True
-
-client = discord.Client(intents=intents)
+client = discord.Client(
+    **gateway_options(), http_trace=outbound_scheduler.trace_config()
+)
+outbound_scheduler.install(client)
+session_registry.store = state_backend
 tree = app_commands.CommandTree(client)
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN", None)
 CHANNEL_CUSTOM_CHALLENGE_LINK = os.getenv("CHANNEL_CUSTOM_CHALLENGE_LINK", None)
@@ -52,89 +108,42 @@ CHANNEL_STREAM_CHALLENGE_LINK = os.getenv("CHANNEL_STREAM_CHALLENGE_LINK", None)
 CHANNEL_STREAM_CHALLENGE_ID = os.getenv("CHANNEL_STREAM_CHALLENGE_ID", None)
 SERVER_ID = os.getenv("SERVER_ID", None)
 STREAM_CHALLENGE_CREATOR_ROLE_ID = os.getenv("STREAM_CHALLENGE_CREATOR_ROLE_ID", None)
+STARTUP_DONE = False
 
 
-async def failed_choice_explanation_option_one(
-    challenge_settings: dict, interaction: discord.Interaction
-) -> None:
+def failed_choice_explanation_option_one(
+    challenge_settings: StreamChallengeSession,
+) -> str:
     """
-    Send the user an information that he has exceeded the maximum number of points
+    Create the information for the user that he has exceeded the maximum number of points
     :param challenge_settings: Challenge settings
-    :param interaction: Interaction
-    :return:
+    :return: Information as string
     """
-    trait_points = abs(challenge_settings["challenge_points"])
-    info_text = (
+    trait_points = abs(challenge_settings.challenge_points)
+    return (
         f"Du hast die maximale Anzahl an Eigenschaftspunkten um {trait_points} Punkten "
         f"überschritten. Bitte starte mit dem Befehl neu und wähle weniger Eigenschaften "
         f"aus oder lass die Challenge in einer anderen Stadt mit weniger Punkten starten."
     )
-    await interaction.message.channel.send(info_text)
-
-
-async def custom_challenge_handler(difficulty: str) -> dict:
-    """
-    Create a custom challenge for requester based on selected difficulty.
-    :param difficulty: level of difficulty
-    :return: game settings for challenge
-    """
-    game_settings = {
-        "successful_generated": True,
-        "location": None,
-        "profession": None,
-        "difficulty": difficulty,
-        "negative_traits": [],
-        "positive_traits": [],
-        "mission": None,
-        "min_traits": custom_config["MinTraits"][difficulty],
-        "settings": None,
-        "trait_difference_thr": TRAIT_DIFFERENCE_THR,
-    }
-    game_settings["location"], location_value = get_location(difficulty)
-    game_settings["profession"], profession_value = get_profession(difficulty)
-    game_settings["mission"], _ = get_mission(difficulty)
-    game_settings["settings"] = get_settings(difficulty)
-    # print(game_settings)
-    trait_value = profession_value
-    end_trait_value = (
-        get_end_trait_value(difficulty) + location_value + OFFSET_TRAIT_VALUE
-    )
-    await create_custom_challenge_traits(trait_value, end_trait_value, game_settings)
-    return game_settings
 
 
-class CustomChallenge(discord.ui.View):
+class CustomChallenge(SessionView):
     """
     Class to create dropdown menu for selecting the difficulty level of the
     custom challenge.
     """
 
-    def __init__(self, user, timeout=180):
-        super().__init__(timeout=timeout)
-        self.user_id = user.user_id
-        self.response = None
+    kind = "custom_challenge"
 
-    async def on_timeout(self):
-        self.children[0].disabled = True
-        self.clear_items()
+    def __init__(self, session: ChallengeSession):
+        super().__init__(session)
+        self.select_difficulty_level.custom_id = self.custom_id("difficulty")
+        self.select_difficulty_level.options = difficulty_options()
+        self.response = None
 
     @discord.ui.select(
         placeholder="What difficulty should the challenge have?",
-        options=[
-            discord.SelectOption(
-                label="Easy",
-                description="Easy challenge with random elements",
-                emoji="😃",
-            ),
-            discord.SelectOption(
-                label="Hard", description="Difficult only for professionals", emoji="🤕"
-            ),
-            discord.SelectOption(
-                label="Impossible",
-                description="Impossible to finish this challenge.",
-                emoji="😰",
-            ),
-        ],
+        options=difficulty_options(),
         min_values=1,
         max_values=1,
     )
@@ -151,24 +160,39 @@ class CustomChallenge(discord.ui.View):
             return
         self.response = select_item.values
         self.children[0].disabled = True
-        await interaction.message.edit(view=self)
-        await interaction.response.defer()
-        self.stop()
+        await interaction.response.edit_message(view=self)
+        self.close_session()
+        await deliver_custom_challenge(interaction.channel, self.user, self.response[0])
 
 
-class StreamChallengeApproval(discord.ui.View):
+class StreamChallengeApproval(SessionView):
     """
     Class to create dropdown menu for selecting and create a stream challenge
     """
 
-    def __init__(self, user, timeout=180):
-        super().__init__(timeout=timeout)
-        self.user_id = user.user_id
+    kind = "stream_challenge_approval"
+
+    def __init__(self, session: StreamChallengeSession):
+        super().__init__(session)
+        self.select_difficulty_level.custom_id = self.custom_id("approval")
         self.response = None
 
-    async def on_timeout(self):
-        self.children[0].disabled = True
-        self.clear_items()
+    @classmethod
+    def approval_session(
+        cls, stage_session: StreamChallengeSession
+    ) -> StreamChallengeSession:
+        """
+        Create the approval session with the selections of a finished stage session
+        :param stage_session: Finished session of the stream challenge stage
+        :return: New session
+        """
+        state = stage_session.to_dict()
+        state.update(
+            session_id=new_session_id(),
+            kind=cls.kind,
+            expires=time.time() + STREAM_CHALLENGE_TIMEOUT,
+        )
+        return session_from_dict(state, User)
 
     @discord.ui.select(
         placeholder="Do you want to enter this challenge like this?",
@@ -200,104 +224,87 @@ class StreamChallengeApproval(discord.ui.View):
             return
         self.response = select_item.values
         self.children[0].disabled = True
-        await interaction.message.edit(view=self)
-        await interaction.response.defer()
-        self.stop()
+        await interaction.response.edit_message(view=self)
+        self.close_session()
+        if "yes" in self.response[0].lower():
+            await deliver_stream_challenge(interaction, self.user, self.session)
 
 
-class MissionOption(discord.ui.Select):
+class StreamChallengeStage(SessionView):
     """
-    Class to create a selection for the mission options
-    """
-
-    def __init__(self, game_settings: dict):
-        mission_options = mission(game_settings)
-        super().__init__(
-            options=mission_options,
-            placeholder="Select the mission for the challenge",
-            min_values=1,
-            max_values=1,
-        )
-
-    async def callback(self, interaction: discord.Interaction):
-        await self.view.respond_to_mission_option(interaction, self.values)
-
-
-class NegativeTraitThree(discord.ui.Select):
-    """
-    Class to create a selection for the third negative traits
-    """
-
-    def __init__(self, game_settings: dict):
-        trait_options = negative_trait_three(game_settings)
-        super().__init__(
-            options=trait_options,
-            placeholder="Select the 3rd negative traits",
-            min_values=1,
-            max_values=len(trait_options),
-        )
-
-    async def callback(self, interaction: discord.Interaction):
-        await self.view.respond_to_option_three(interaction, self.values)
-
-
-class NegativeTraitTwo(discord.ui.Select):
-    """
-    Class to create a selection for the second negative traits
+    Class to create dropdown menu for creating a stream challenge for the streamer
     """
 
-    def __init__(self, game_settings: dict):
-        trait_options = negative_trait_two(game_settings)
-        super().__init__(
-            options=trait_options,
-            placeholder="Select the 2nd negative traits",
-            min_values=1,
-            max_values=len(trait_options),
-        )
-
-    async def callback(self, interaction: discord.Interaction):
-        await self.view.respond_to_option_two(interaction, self.values)
-
-
-class NegativeTraitOne(discord.ui.Select):
-    """
-    Class to create a selection for the first negative traits
-    """
+    kind = "stream_challenge_stage"
+    options = stream_challenge_location()
 
-    def __init__(self, game_settings: dict):
-        trait_options = negative_trait_one(game_settings)
-        super().__init__(
-            options=trait_options,
-            placeholder="Select the 1st negative traits",
-            min_values=1,
-            max_values=len(trait_options),
+    def __init__(self, session: StreamChallengeSession):
+        super().__init__(session)
+        self.select_starting_area.custom_id = self.custom_id("location")
+        self.random_fill.custom_id = self.custom_id("random_fill")
+        self.restore_items()
+
+    @classmethod
+    def new_session(cls, user, session_timeout: int) -> StreamChallengeSession:
+        return StreamChallengeSession(
+            new_session_id(),
+            cls.kind,
+            user,
+            time.time() + session_timeout,
+            stream_challenge_config["TotalPoints"],
         )
 
-    async def callback(self, interaction: discord.Interaction):
-        await self.view.respond_to_option_one(interaction, self.values)
-
-
-class StreamChallengeStage(discord.ui.View):
-    """
-    Class to create dropdown menu for creating a stream challenge for the streamer
-    """
+    def restore_items(self) -> None:
+        """
+        Rebuild the selections of a restored session from the stored game settings
+        :return: None
+        """
+        stages = [
+            ("start_location", NegativeTraitOne, "trait_1"),
+            ("negative_trait_1", NegativeTraitTwo, "trait_2"),
+            ("negative_trait_2", NegativeTraitThree, "trait_3"),
+            ("negative_trait_3", MissionOption, "mission"),
+        ]
+        for setting, next_selection, name in stages:
+            if getattr(self.session, setting) is None:
+                return
+            self.disable_selection()
+            if next_selection is MissionOption:
+                self.remove_item(self.random_fill)
+            self.add_item(next_selection(self.session, self.custom_id(name)))
+
+    def disable_selection(self) -> None:
+        """
+        Disable the last selection of the stage message
+        :return: None
+        """
+        selections = [
+            item for item in self.children if isinstance(item, discord.ui.Select)
+        ]
+        selections[-1].disabled = True
 
-    options = stream_challenge_location()
+    async def update_stage_message(self, interaction: discord.Interaction) -> None:
+        """
+        Coalesce the view change and the points message of one interaction into a
+        single edit of the stage message.
+        :param interaction: Interaction from message
+        :return: None
+        """
+        user_message = send_user_info_message_with_points(self.session.challenge_points)
+        await interaction.response.edit_message(content=user_message, view=self)
 
-    def __init__(self, user, interaction, timeout=300):
-        super().__init__(timeout=timeout)
-        self.user_id = user.user_id
-        self.start_interaction = interaction
-        self.game_settings = {
-            "challenge_points": stream_challenge_config["TotalPoints"],
-            "start_location": None,
-            "negative_trait_1": None,
-            "negative_trait_2": None,
-            "negative_trait_3": None,
-            "prohibitions": None,
-            "mission": None,
-            "choices_valid": True,
-        }
+    async def abort_stage(self, interaction: discord.Interaction) -> None:
+        """
+        Stop the selection because the points are exceeded and show the explanation
+        together with the disabled view in one edit.
+        :param interaction: Interaction from message
+        :return: None
+        """
+        self.session.choices_valid = False
+        self.random_fill.disabled = True
+        info_text = failed_choice_explanation_option_one(self.session)
+        await interaction.response.edit_message(content=info_text, view=self)
+        self.close_session()
 
     @discord.ui.select(
         placeholder="Select the starting area",
@@ -316,19 +323,42 @@ class StreamChallengeStage(discord.ui.View):
         """
         if interaction.user.id != self.user_id:
             return
-        self.game_settings["start_location"] = select_item.values[0]
-        self.game_settings["challenge_points"] -= stream_challenge_config[
-            "StartingArea"
-        ][self.game_settings["start_location"]]
-        self.children[0].disabled = True
-        user_message = send_user_info_message_with_points(
-            self.game_settings["challenge_points"]
-        )
-        await self.start_interaction.edit_original_response(content=user_message)
-        call_option_one = NegativeTraitOne(self.game_settings)
-        self.add_item(call_option_one)
-        await interaction.message.edit(view=self)
-        await interaction.response.defer()
+        self.session.start_location = select_item.values[0]
+        self.session.challenge_points -= stream_challenge_config["StartingArea"][
+            self.session.start_location
+        ]
+        self.disable_selection()
+        self.add_item(NegativeTraitOne(self.session, self.custom_id("trait_1")))
+        self.persist()
+        await self.update_stage_message(interaction)
+
+    @discord.ui.button(label=RANDOM_FILL_LABEL, emoji="🎲")
+    async def random_fill(
+        self, interaction: discord.Interaction, _button: discord.ui.Button
+    ) -> None:
+        """
+        Fill the open selections with a random combination, which uses up the
+        remaining points, and send the challenge for approval. If no combination
+        fits, the session stays open for the manual selection.
+        :param interaction: Interaction from message
+        :return: None
+        """
+        if interaction.user.id != self.user_id:
+            return
+        if not fill_session(self.session):
+            self.random_fill.disabled = True
+            user_message = send_user_info_message_with_points(
+                self.session.challenge_points
+            )
+            await interaction.response.edit_message(
+                content=RANDOM_FILL_NO_COMBINATION + user_message, view=self
+            )
+            return
+        for item in self.children:
+            item.disabled = True
+        await self.update_stage_message(interaction)
+        self.close_session()
+        await request_stream_challenge_approval(interaction.channel, self.session)
 
     async def respond_to_option_one(
         self, interaction: discord.Interaction, choices
@@ -341,24 +371,15 @@ class StreamChallengeStage(discord.ui.View):
         """
         if interaction.user.id != self.user_id:
             return
-        self.game_settings["challenge_points"] -= total_sum_of_neg_traits(choices)
-        self.game_settings["negative_trait_1"] = choices
-        self.children[1].disabled = True
-        if self.game_settings["challenge_points"] >= 0:
-            user_message = send_user_info_message_with_points(
-                self.game_settings["challenge_points"]
-            )
-            await self.start_interaction.edit_original_response(content=user_message)
-            call_option_two = NegativeTraitTwo(self.game_settings)
-            self.add_item(call_option_two)
-            await interaction.message.edit(view=self)
-            await interaction.response.defer()
+        self.session.challenge_points -= total_sum_of_neg_traits(choices)
+        self.session.negative_trait_1 = choices
+        self.disable_selection()
+        if self.session.challenge_points >= 0:
+            self.add_item(NegativeTraitTwo(self.session, self.custom_id("trait_2")))
+            self.persist()
+            await self.update_stage_message(interaction)
         else:
-            await failed_choice_explanation_option_one(self.game_settings, interaction)
-            self.game_settings["choices_valid"] = False
-            await interaction.message.edit(view=self)
-            await interaction.response.defer()
-            self.stop()
+            await self.abort_stage(interaction)
 
     async def respond_to_option_two(
         self, interaction: discord.Interaction, choices
@@ -371,24 +392,15 @@ class StreamChallengeStage(discord.ui.View):
         """
         if interaction.user.id != self.user_id:
             return
-        self.game_settings["challenge_points"] -= total_sum_of_neg_traits(choices)
-        self.game_settings["negative_trait_2"] = choices
-        await interaction.message.edit(view=self)
-        await interaction.response.defer()
-        self.children[2].disabled = True
-        if self.game_settings["challenge_points"] >= 0:
-            user_message = send_user_info_message_with_points(
-                self.game_settings["challenge_points"]
-            )
-            await self.start_interaction.edit_original_response(content=user_message)
-            call_option_three = NegativeTraitThree(self.game_settings)
-            self.add_item(call_option_three)
-            await interaction.message.edit(view=self)
+        self.session.challenge_points -= total_sum_of_neg_traits(choices)
+        self.session.negative_trait_2 = choices
+        self.disable_selection()
+        if self.session.challenge_points >= 0:
+            self.add_item(NegativeTraitThree(self.session, self.custom_id("trait_3")))
+            self.persist()
+            await self.update_stage_message(interaction)
         else:
-            await failed_choice_explanation_option_one(self.game_settings, interaction)
-            self.game_settings["choices_valid"] = False
-            await interaction.message.edit(view=self)
-            self.stop()
+            await self.abort_stage(interaction)
 
     async def respond_to_option_three(
         self, interaction: discord.Interaction, choices
@@ -401,24 +413,17 @@ class StreamChallengeStage(discord.ui.View):
         """
         if interaction.user.id != self.user_id:
             return
-        self.game_settings["challenge_points"] -= total_sum_of_neg_traits(choices)
-        self.game_settings["negative_trait_3"] = choices
-        await interaction.message.edit(view=self)
-        await interaction.response.defer()
-        self.children[3].disabled = True
-        if self.game_settings["challenge_points"] >= 0:
-            user_message = send_user_info_message_with_points(
-                self.game_settings["challenge_points"]
-            )
-            await self.start_interaction.edit_original_response(content=user_message)
-            call_option_mission = MissionOption(self.game_settings)
-            self.add_item(call_option_mission)
-            await interaction.message.edit(view=self)
+        self.session.challenge_points -= total_sum_of_neg_traits(choices)
+        self.session.negative_trait_3 = choices
+        self.disable_selection()
+        if self.session.challenge_points >= 0:
+            # The mission selection needs the row of the random fill button
+            self.remove_item(self.random_fill)
+            self.add_item(MissionOption(self.session, self.custom_id("mission")))
+            self.persist()
+            await self.update_stage_message(interaction)
         else:
-            await failed_choice_explanation_option_one(self.game_settings, interaction)
-            self.game_settings["choices_valid"] = False
-            await interaction.message.edit(view=self)
-            self.stop()
+            await self.abort_stage(interaction)
 
     async def respond_to_mission_option(
         self, interaction: discord.Interaction, choices
@@ -431,19 +436,155 @@ class StreamChallengeStage(discord.ui.View):
         """
         if interaction.user.id != self.user_id:
             return
-        self.game_settings["challenge_points"] -= mission_value(choices)
-        self.game_settings["mission"] = choices
-        await interaction.message.edit(view=self)
-        await interaction.response.defer()
-        self.children[4].disabled = True
-        if self.game_settings["challenge_points"] >= 0:
-            await interaction.message.edit(view=self)
-            self.stop()
+        self.session.challenge_points -= mission_value(choices)
+        self.session.mission = choices
+        self.disable_selection()
+        self.random_fill.disabled = True
+        if self.session.challenge_points >= 0:
+            await self.update_stage_message(interaction)
+            self.close_session()
+            await request_stream_challenge_approval(interaction.channel, self.session)
         else:
-            await failed_choice_explanation_option_one(self.game_settings, interaction)
-            self.game_settings["choices_valid"] = False
-            await interaction.message.edit(view=self)
-            self.stop()
+            await self.abort_stage(interaction)
+
+
+SESSION_VIEWS = {
+    CustomChallenge.kind: CustomChallenge,
+    StreamChallengeApproval.kind: StreamChallengeApproval,
+    StreamChallengeStage.kind: StreamChallengeStage,
+}
+
+
+async def restore_sessions() -> int:
+    """
+    Restore the persistent views of all open sessions from the session store
+    :return: Number of restored sessions
+    """
+    sessions = await state_backend.load_sessions()
+    for session in sessions:
+        client.add_view(
+            SESSION_VIEWS[session["kind"]](session_from_dict(session, User))
+        )
+    return len(sessions)
+
+
+@profiled("challenge")
+async def send_custom_challenge(send, user: User, code: str, new: bool) -> None:
+    """
+    Generate the custom challenge of a code and send it to the requester
+    :param send: Coroutine function to send the message, must return the message
+    :param user: Requested user
+    :param code: Challenge code
+    :param new: The challenge is new and must be archived
+    :return: None
+    """
+    game_settings = await get_custom_challenge(code)
+    log_event(
+        "challenge_generated",
+        code=code,
+        new=new,
+        successful=game_settings["successful_generated"],
+    )
+    if not game_settings["successful_generated"]:
+        await send(
+            f"{user.user_display_name}, es ist ein Fehler aufgetreten. "
+            f"Bitte erstelle nochmal eine Challenge. Ein Fehler-Report zum "
+            f"Challenge-Code {code} ist gespeichert."
+        )
+        return
+    if new:
+        challenge_statistics.record(
+            "custom",
+            game_settings["location"],
+            game_settings["negative_traits"] + game_settings["positive_traits"],
+            game_settings["mission"],
+        )
+
+    async def render() -> bytes:
+        """
+        Render the picture of the challenge and archive new challenges
+        :return: picture as PNG data
+        """
+        picture = await get_custom_challenge_picture(game_settings, user)
+        if new:
+            await archive_challenge_picture(picture, game_settings, user)
+        return picture
+
+    await send_challenge(
+        send,
+        f"{user.user_display_name} das ist deine Challenge ({code}):",
+        get_custom_challenge_summary(game_settings),
+        render,
+        f"challenge_{code}.png",
+    )
+
+
+async def deliver_custom_challenge(channel, user: User, difficulty: str) -> None:
+    """
+    Generate a new custom challenge and send it to the requester
+    :param channel: Channel of the custom challenge
+    :param user: Requested user
+    :param difficulty: Selected difficulty level
+    :return: None
+    """
+    code = create_challenge_code(difficulty)
+    await send_custom_challenge(channel.send, user, code, True)
+
+
+async def request_stream_challenge_approval(
+    channel, stage_session: StreamChallengeSession
+) -> None:
+    """
+    Send the selected stream challenge to the user for approval
+    :param channel: Channel of the stream challenge
+    :param stage_session: Finished session with the selected game settings
+    :return: None
+    """
+    approval_message = send_user_info_message_for_approval(stage_session)
+    approval_view = StreamChallengeApproval(
+        StreamChallengeApproval.approval_session(stage_session)
+    )
+    approval_view.persist()
+    await channel.send(approval_message, view=approval_view)
+
+
+@profiled("streamchallenge")
+async def deliver_stream_challenge(
+    interaction: discord.Interaction, user: User, game_settings: StreamChallengeSession
+) -> None:
+    """
+    Create the picture of the approved stream challenge and remove the creator role
+    :param interaction: Interaction of the approval
+    :param user: Requested user
+    :param game_settings: Session with the approved game settings
+    :return: None
+    """
+    log_event("stream_challenge_approved", session_id=game_settings.session_id)
+    challenge_statistics.record(
+        "stream",
+        game_settings.start_location,
+        get_all_negative_traits(game_settings),
+        game_settings.mission[0],
+    )
+
+    async def render() -> bytes:
+        """
+        Render the picture of the stream challenge
+        :return: picture as PNG data
+        """
+        return await herr_apfelring(game_settings, user)
+
+    await send_challenge(
+        interaction.channel.send,
+        f"{user.user_display_name} das ist deine Challenge:",
+        get_stream_challenge_summary(game_settings),
+        render,
+        "stream_challenge.png",
+    )
+    role = interaction.guild.get_role(int(STREAM_CHALLENGE_CREATOR_ROLE_ID))
+    await interaction.user.remove_roles(
+        role, reason="Finish stream challenge creation."
+    )
 
 
 @client.event
@@ -452,8 +593,35 @@ async def on_ready() -> None:
     Function to be called when the bot is ready.
     :return: None
     """
-    await tree.sync(guild=discord.Object(id=SERVER_ID))
-    print(f"We have logged in as {client.user}")
+    global STARTUP_DONE  # pylint: disable=global-statement
+    if not STARTUP_DONE:
+        STARTUP_DONE = True
+        loop_watchdog.start()
+        challenge_statistics.load()
+        await run_in_worker(gallery.load)
+        await run_in_worker(get_font_chain)
+        await challenge_overlay.start()
+        client.loop.create_task(challenge_statistics.run_flush())
+        client.loop.create_task(daily_challenge.run(client))
+        client.loop.create_task(report_usage())
+        client.loop.create_task(report_metrics())
+        client.loop.create_task(interaction_trace.run_flush())
+        restored_sessions = await restore_sessions()
+        log_event("sessions_restored", sessions=restored_sessions)
+    await sync_command_tree(tree, [SERVER_ID])
+    log_event("logged_in", user=str(client.user))
+
+
+@client.event
+async def on_interaction(interaction: discord.Interaction) -> None:
+    """
+    Function to be called for every interaction, records it if tracing is enabled and
+    resumes the sessions of other instances
+    :param interaction: Interaction from message
+    :return: None
+    """
+    interaction_trace.record(interaction)
+    await resume_session(interaction, SESSION_VIEWS, state_backend)
 
 
 @tree.command(
@@ -461,12 +629,27 @@ async def on_ready() -> None:
     description="Create a random Project Zomboid challenge for your game.",
     guild=discord.Object(id=SERVER_ID),
 )
-async def custom_challenge(interaction: discord.interactions.Interaction) -> None:
+@app_commands.describe(
+    code="Code of an existing challenge to create it again",
+    difficulty="Difficulty level, the selection is skipped",
+)
+@app_commands.choices(difficulty=DIFFICULTY_CHOICES)
+@profiled("challenge")
+async def custom_challenge(
+    interaction: discord.interactions.Interaction,
+    code: str = None,
+    difficulty: str = None,
+) -> None:
     """
-    Command to create a custom challenge in Project Zomboid
+    Command to create a custom challenge in Project Zomboid. Without code or
+    difficulty level the difficulty level is selected in a dropdown.
     :param interaction: Interaction from message
+    :param code: Optional code of an existing challenge
+    :param difficulty: Optional difficulty level of a new challenge
     :return:
     """
+    set_correlation_id(interaction.id)
+    log_event("command_challenge", code=code, difficulty=difficulty)
     if interaction.channel.id != int(CHANNEL_CUSTOM_CHALLENGE_ID):
         message = USER_INFO_WRONG_CHANNEL + CHANNEL_CUSTOM_CHALLENGE_LINK
         await interaction.response.send_message(
@@ -478,99 +661,312 @@ async def custom_challenge(interaction: discord.interactions.Interaction) -> Non
         user_name=interaction.user.display_name,
         user_display_name=interaction.user.global_name,
     )
-    view = CustomChallenge(user=user)
-    await interaction.response.send_message(view=view)
-    await view.wait()
-    result = view.response
-    if result is not None:
-        task_create_custom_challenge = asyncio.create_task(
-            custom_challenge_handler(result[0])
-        )
-        game_settings = await task_create_custom_challenge
-        if game_settings["successful_generated"]:
-            picture_path = await create_challenge_picture(game_settings, user)
-            with open(picture_path, "rb") as file:
-                image = discord.File(file)
-                await interaction.channel.send(
-                    f"{user.user_display_name} das ist deine Challenge:"
-                )
-                await interaction.channel.send(file=image)
-        else:
-            await interaction.channel.send(
-                f"{user.user_display_name}, es ist ein Fehler aufgetreten. Bitte erstelle "
-                f"nochmal eine Challenge. Ein Fehler-Report ist gespeichert."
+    if code is not None:
+        code = code.strip().upper()
+        if difficulty_from_code(code) is None:
+            await interaction.response.send_message(
+                USER_INFO_INVALID_CODE, ephemeral=True, delete_after=60
             )
+            return
+        await interaction.response.defer(thinking=True)
+        await send_custom_challenge(
+            functools.partial(interaction.followup.send, wait=True), user, code, False
+        )
+        return
+    if difficulty in difficulty_profiles:
+        await interaction.response.defer(thinking=True)
+        await send_custom_challenge(
+            functools.partial(interaction.followup.send, wait=True),
+            user,
+            create_challenge_code(difficulty),
+            True,
+        )
+        return
+    view = CustomChallenge(CustomChallenge.new_session(user, CUSTOM_CHALLENGE_TIMEOUT))
+    view.persist()
+    log_event("session_started", session_id=view.session.session_id)
+    await interaction.response.send_message(view=view)
 
 
 @tree.command(
-    name="streamchallenge",
-    description="Create a Project Zomboid challenge for TeTüs stream.",
+    name="daily",
+    description="Show the Project Zomboid challenge of the day.",
     guild=discord.Object(id=SERVER_ID),
 )
-async def stream_challenge(interaction: discord.interactions.Interaction) -> None:
+@app_commands.describe(difficulty="Difficulty level, all levels if it is empty")
+@app_commands.choices(difficulty=DIFFICULTY_CHOICES)
+async def daily(
+    interaction: discord.interactions.Interaction, difficulty: str = None
+) -> None:
     """
-    Create a stream challenge for the streamer
+    Command to show the challenge of the day from the cache
     :param interaction: Interaction from message
+    :param difficulty: Optional difficulty level
     :return: None
     """
+    set_correlation_id(interaction.id)
+    log_event("command_daily", difficulty=difficulty)
+    await interaction.response.defer(thinking=True)
+    await daily_challenge.send(
+        functools.partial(interaction.followup.send, wait=True),
+        [difficulty] if difficulty is not None else [],
+    )
+
+
+async def check_stream_challenge_creator(
+    interaction: discord.interactions.Interaction,
+) -> bool:
+    """
+    Check the channel and the creator role of a stream challenge command, the user
+    is informed if the command is not allowed
+    :param interaction: Interaction from message
+    :return: True if the user can create a stream challenge
+    """
     if interaction.channel.id != int(CHANNEL_STREAM_CHALLENGE_ID):
         message = USER_INFO_WRONG_CHANNEL + CHANNEL_STREAM_CHALLENGE_LINK
         await interaction.response.send_message(
             message, ephemeral=True, delete_after=60
         )
-        return
+        return False
     if int(STREAM_CHALLENGE_CREATOR_ROLE_ID) not in [
         role.id for role in interaction.user.roles
     ]:
         await interaction.response.send_message(
             USER_INFO_NO_ROLE, ephemeral=True, delete_after=60
         )
+        return False
+    return True
+
+
+@tree.command(
+    name="streamchallenge",
+    description="Create a Project Zomboid challenge for TeTüs stream.",
+    guild=discord.Object(id=SERVER_ID),
+)
+@app_commands.describe(location="Start location, the selection is skipped")
+@profiled("streamchallenge")
+async def stream_challenge(
+    interaction: discord.interactions.Interaction, location: str = None
+) -> None:
+    """
+    Create a stream challenge for the streamer. With a start location the location
+    selection is skipped.
+    :param interaction: Interaction from message
+    :param location: Optional start location
+    :return: None
+    """
+    set_correlation_id(interaction.id)
+    log_event("command_streamchallenge", location=location)
+    if not await check_stream_challenge_creator(interaction):
         return
     user = User(
         user_id=interaction.user.id,
         user_name=interaction.user.display_name,
         user_display_name=interaction.user.global_name,
     )
-    user_message = send_user_info_message_with_points(
-        stream_challenge_config["TotalPoints"]
-    )
-    await interaction.response.send_message(user_message)
-    view = StreamChallengeStage(user=user, interaction=interaction)
-    await interaction.channel.send(view=view)
-    await view.wait()
-    result = view.game_settings
-    if not result["choices_valid"]:
-        return
-    approval_message = send_user_info_message_for_approval(result)
-    await interaction.channel.send(approval_message)
-    approval_view = StreamChallengeApproval(user)
-    await interaction.channel.send(view=approval_view)
-    await approval_view.wait()
-    approval_result = approval_view.response
-    if "yes" in approval_result[0].lower():
-        picture_path = await herr_apfelring(result, user)
-        with open(picture_path, "rb") as file:
-            image = discord.File(file)
-            await interaction.channel.send(
-                f"{user.user_display_name} das ist deine Challenge:"
+    session = StreamChallengeStage.new_session(user, STREAM_CHALLENGE_TIMEOUT)
+    if location is not None:
+        if location not in stream_challenge_config["StartingArea"]:
+            await interaction.response.send_message(
+                USER_INFO_INVALID_LOCATION, ephemeral=True, delete_after=60
             )
-            await interaction.channel.send(file=image)
-        role = interaction.guild.get_role(int(STREAM_CHALLENGE_CREATOR_ROLE_ID))
-        await interaction.user.remove_roles(
-            role, reason="Finish stream challenge creation."
+            return
+        session.start_location = location
+        session.challenge_points -= stream_challenge_config["StartingArea"][location]
+    user_message = send_user_info_message_with_points(session.challenge_points)
+    view = StreamChallengeStage(session)
+    view.persist()
+    log_event("session_started", session_id=view.session.session_id)
+    await interaction.response.send_message(user_message, view=view)
+
+
+stream_challenge.autocomplete("location")(location_autocomplete)
+
+
+@tree.command(
+    name="streamvote",
+    description="Let the viewers vote on a Project Zomboid challenge for TeTüs stream.",
+    guild=discord.Object(id=SERVER_ID),
+)
+@app_commands.describe(seconds="Duration of each voting round in seconds")
+async def stream_vote(
+    interaction: discord.interactions.Interaction,
+    seconds: app_commands.Range[int, 10, 600] = VOTING_ROUND_SECONDS,
+) -> None:
+    """
+    Create a stream challenge by viewer voting on every selection
+    :param interaction: Interaction from message
+    :param seconds: Duration of each voting round
+    :return: None
+    """
+    set_correlation_id(interaction.id)
+    log_event("command_streamvote", seconds=seconds)
+    if not await check_stream_challenge_creator(interaction):
+        return
+    user = User(
+        user_id=interaction.user.id,
+        user_name=interaction.user.display_name,
+        user_display_name=interaction.user.global_name,
+    )
+    await interaction.response.send_message(VOTING_STARTED_MESSAGE)
+    session = await StreamChallengeVote(interaction.channel, user, seconds).run()
+    await request_stream_challenge_approval(interaction.channel, session)
+
+
+@tree.command(
+    name="profiling",
+    description="Change the fraction of profiled command executions.",
+    guild=discord.Object(id=SERVER_ID),
+)
+@app_commands.describe(sample_rate="Fraction between 0 (disabled) and 1 (every call)")
+@app_commands.default_permissions(administrator=True)
+async def profiling(
+    interaction: discord.interactions.Interaction, sample_rate: float
+) -> None:
+    """
+    Admin command to toggle the profiling of the commands
+    :param interaction: Interaction from message
+    :param sample_rate: Fraction of profiled command executions
+    :return: None
+    """
+    sample_rate = set_sample_rate(sample_rate)
+    await interaction.response.send_message(
+        f"Profiling sample rate: {sample_rate}", ephemeral=True
+    )
+
+
+@tree.command(
+    name="stats",
+    description="Show the most used traits, locations and missions.",
+    guild=discord.Object(id=SERVER_ID),
+)
+@app_commands.describe(
+    source="Stream challenges or custom challenges",
+    category="Traits, locations or missions",
+    period="Time period of the statistics",
+)
+@app_commands.choices(
+    source=[
+        app_commands.Choice(name="Stream challenge", value="stream"),
+        app_commands.Choice(name="Custom challenge", value="custom"),
+    ],
+    category=[
+        app_commands.Choice(name="Traits", value="traits"),
+        app_commands.Choice(name="Locations", value="locations"),
+        app_commands.Choice(name="Missions", value="missions"),
+    ],
+    period=[
+        app_commands.Choice(name="Last 24 hours", value="day"),
+        app_commands.Choice(name="Last 7 days", value="week"),
+        app_commands.Choice(name="Last 30 days", value="month"),
+        app_commands.Choice(name="All time", value="all"),
+    ],
+)
+async def stats(
+    interaction: discord.interactions.Interaction,
+    source: str,
+    category: str,
+    period: str = "all",
+) -> None:
+    """
+    Show the most used elements of the challenges from the statistics
+    :param interaction: Interaction from message
+    :param source: stream or custom
+    :param category: traits, locations or missions
+    :param period: day, week, month or all
+    :return: None
+    """
+    set_correlation_id(interaction.id)
+    log_event("command_stats", source=source, category=category, period=period)
+    top_elements = challenge_statistics.top(
+        source, category, period, STATISTICS_TOP_COUNT
+    )
+    if not top_elements:
+        message = "Für diesen Zeitraum gibt es noch keine Challenges."
+    else:
+        message = "\n".join(
+            f"{rank}. {element}: {count}"
+            for rank, (element, count) in enumerate(top_elements, start=1)
         )
+    await interaction.response.send_message(message, ephemeral=True)
 
 
-@client.event
-async def on_message(message) -> None:
+@tree.command(
+    name="gallery",
+    description="Show the thumbnails of the recently created challenges.",
+    guild=discord.Object(id=SERVER_ID),
+)
+@app_commands.describe(page="Page of the gallery, the newest challenges are on page 1")
+@app_commands.default_permissions(manage_messages=True)
+async def show_gallery(
+    interaction: discord.interactions.Interaction, page: int = 1
+) -> None:
+    """
+    Moderator command to browse the created challenges
+    :param interaction: Interaction from message
+    :param page: Page of the gallery
+    :return: None
+    """
+    set_correlation_id(interaction.id)
+    page = min(max(page, 1), gallery.pages())
+    await interaction.response.defer(thinking=True, ephemeral=True)
+    sheet = await gallery.sheet(page)
+    if sheet is None:
+        await interaction.followup.send("Es gibt noch keine Challenges.")
+        return
+    await interaction.followup.send(
+        f"Seite {page} von {gallery.pages()}",
+        file=discord.File(io.BytesIO(sheet), filename=f"gallery_{page}.png"),
+    )
+
+
+@tree.command(
+    name="reloadconfig",
+    description="Reload the configuration of the custom challenge.",
+    guild=discord.Object(id=SERVER_ID),
+)
+@app_commands.default_permissions(administrator=True)
+async def reload_config(interaction: discord.interactions.Interaction) -> None:
     """
-    Function to be called when user sends a message.
-    :param message: Message object
+    Admin command to reload the custom challenge configuration, e.g. after changed
+    weights. The cached challenges are dropped, because they can change. The
+    difficulty choices are rebuilt and the commands are synced, if they changed.
+    :param interaction: Interaction from message
     :return: None
     """
-    if message.author == client.user:
+    set_correlation_id(interaction.id)
+    try:
+        new_config, new_profiles = await run_in_worker(read_custom_config)
+    except (OSError, KeyError, ValueError, yaml.YAMLError) as error:
+        log_event("config_reload_failed", logging.ERROR, error=str(error))
+        await interaction.response.send_message(
+            f"Die Konfiguration konnte nicht geladen werden: {error}", ephemeral=True
+        )
         return
-    _ = message.content.lower()
+    apply_custom_config(new_config, new_profiles)
+    update_difficulty_choices()
+    get_random_fill.cache_clear()
+    challenge_cache.clear()
+    picture_cache.clear()
+    log_event("config_reloaded", difficulty_levels=list(difficulty_profiles))
+    await interaction.response.send_message(
+        "Die Konfiguration wurde neu geladen.", ephemeral=True
+    )
+    await sync_command_tree(tree, [SERVER_ID])
+
+
+async def run_bot() -> None:
+    """
+    Run the bot until it is closed and write the queued state afterwards
+    :return: None
+    """
+    try:
+        async with client:
+            await client.start(DISCORD_TOKEN)
+    finally:
+        await challenge_statistics.close()
+        await interaction_trace.flush()
+        await state_backend.close()
 
 
 def main() -> None:
@@ -578,6 +974,7 @@ def main() -> None:
     Scheduling function for regular call.
     :return: None
     """
+    setup_logging()
     if not None in (
         DISCORD_TOKEN,
         CHANNEL_CUSTOM_CHALLENGE_LINK,
@@ -587,9 +984,15 @@ def main() -> None:
         SERVER_ID,
         STREAM_CHALLENGE_CREATOR_ROLE_ID,
     ):
-        client.run(DISCORD_TOKEN)
+        try:
+            asyncio.run(run_bot())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            shutdown_logging()
     else:
-        print("One of the environmental variables is not defined")
+        log_event("missing_environment_variable", logging.ERROR)
+        shutdown_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Periodic report of the metrics of the subsystems. The statistics of all subsystems
+are logged together as one event, so they can be followed in the log.
+"""
+import asyncio
+from source.watchdog import loop_watchdog
+from source.session_registry import session_registry
+from source.outbound import outbound_scheduler
+from source.render import render_budget
+from source.gallery import gallery
+from source.overlay import challenge_overlay
+from source.state_backend import state_backend
+from source.event_log import log_event
+from source.constants import METRICS_REPORT_INTERVAL
+
+
+def collect_metrics() -> dict:
+    """
+    Collect the statistics of all subsystems
+    :return: Statistics by subsystem
+    """
+    return {
+        "watchdog": loop_watchdog.statistics(),
+        "sessions": session_registry.statistics(),
+        "outbound": outbound_scheduler.statistics(),
+        "render": render_budget.statistics(),
+        "gallery": gallery.statistics(),
+        "overlay": challenge_overlay.statistics(),
+        "state_backend": state_backend.statistics(),
+    }
+
+
+async def report_metrics(interval: int = METRICS_REPORT_INTERVAL) -> None:
+    """
+    Log the statistics of all subsystems regularly
+    :param interval: Time between two reports in seconds
+    :return: None
+    """
+    while True:
+        await asyncio.sleep(interval)
+        log_event("metrics", **collect_metrics())
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
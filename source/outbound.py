@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scheduler for the outbound requests to Discord. Interaction responses must be sent
+within three seconds, so they are never queued behind message edits or picture
+uploads. All other requests get a slot in priority order and are limited per route.
+The rate limit headers of all responses are tracked per bucket and a request of an
+exhausted bucket waits for the reset before it takes a slot.
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from datetime import datetime, timezone
+import aiohttp
+import discord
+from discord.webhook.async_ import async_context
+from source.event_log import log_event
+from source.constants import (
+    INTERACTION_DEADLINE,
+    OUTBOUND_MAX_CONCURRENCY,
+    OUTBOUND_ROUTE_CONCURRENCY,
+)
+
+PRIORITY_INTERACTION = 0
+PRIORITY_EDIT = 1
+PRIORITY_UPLOAD = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTION: "interaction",
+    PRIORITY_EDIT: "edit",
+    PRIORITY_UPLOAD: "upload",
+}
+
+
+def request_priority(route: discord.http.Route, kwargs: dict) -> int:
+    """
+    Classify a request: interaction responses first, edits and other requests
+    second and requests with attachments last
+    :param route: Route of the request
+    :param kwargs: Keyword arguments of the request
+    :return: Priority, lower is more important
+    """
+    if route.path.endswith("/callback"):
+        return PRIORITY_INTERACTION
+    if kwargs.get("files"):
+        return PRIORITY_UPLOAD
+    return PRIORITY_EDIT
+
+
+class OutboundScheduler:  # pylint: disable=too-many-instance-attributes
+    """
+    Priority scheduler around the HTTP requests of the client and the interaction
+    webhooks
+    """
+
+    def __init__(
+        self,
+        max_concurrency=OUTBOUND_MAX_CONCURRENCY,
+        route_concurrency=OUTBOUND_ROUTE_CONCURRENCY,
+    ):
+        self.free_slots = max_concurrency
+        self.route_concurrency = route_concurrency
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.route_limits = {}
+        self.pending_routes = {}
+        self.route_buckets = {}
+        self.buckets = {}
+        self.metrics = {
+            "requests": {name: 0 for name in PRIORITY_NAMES.values()},
+            "max_wait_ms": {name: 0.0 for name in PRIORITY_NAMES.values()},
+            "total_wait_ms": {name: 0.0 for name in PRIORITY_NAMES.values()},
+            "deadline_misses": 0,
+            "bucket_delays": 0,
+            "rate_limited": 0,
+            "global_rate_limited": 0,
+        }
+
+    async def acquire(self, priority: int) -> None:
+        """
+        Wait for a free slot, waiting requests get the slots in priority order
+        :param priority: Priority of the request
+        :return: None
+        """
+        if self.free_slots > 0 and not self.waiting:
+            self.free_slots -= 1
+            return
+        slot = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.sequence), slot))
+        try:
+            await slot
+        except asyncio.CancelledError:
+            if slot.done() and not slot.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """
+        Give the slot to the most important waiting request
+        :return: None
+        """
+        while self.waiting:
+            _, _, slot = heapq.heappop(self.waiting)
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.free_slots += 1
+
+    @staticmethod
+    def route_key(route: discord.http.Route) -> str:
+        """
+        Get the key of a route, routes are separated like the rate limit buckets by
+        their major parameters
+        :param route: Route of the request
+        :return: Key of the route
+        """
+        return f"{route.key}:{route.major_parameters}"
+
+    def route_limit(self, key: str) -> asyncio.Semaphore:
+        """
+        Get the concurrency limit of a route
+        :param key: Key of the route
+        :return: Semaphore of the route
+        """
+        if key not in self.route_limits:
+            self.route_limits[key] = asyncio.Semaphore(self.route_concurrency)
+        return self.route_limits[key]
+
+    async def wait_for_bucket(self, key: str) -> None:
+        """
+        Wait until the reset of the rate limit bucket of a route, if the last
+        response of the route exhausted the bucket
+        :param key: Key of the route
+        :return: None
+        """
+        bucket = self.buckets.get(self.route_buckets.get(key))
+        if bucket is None or bucket["remaining"] > 0:
+            return
+        delay = bucket["reset"] - time.time()
+        if delay > 0:
+            self.metrics["bucket_delays"] += 1
+            await asyncio.sleep(delay)
+
+    def check_deadline(self, route: discord.http.Route) -> None:
+        """
+        Count an interaction response which is sent after the deadline
+        :param route: Route of the interaction response
+        :return: None
+        """
+        created = discord.utils.snowflake_time(int(route.webhook_id))
+        age = (datetime.now(timezone.utc) - created).total_seconds()
+        if age > INTERACTION_DEADLINE:
+            self.metrics["deadline_misses"] += 1
+            log_event("interaction_deadline_missed", logging.WARNING, age_s=age)
+
+    def wrap(self, request):
+        """
+        Wrap the request function of an HTTP client or webhook adapter
+        :param request: Request coroutine function with the route as first argument
+        :return: Scheduled request coroutine function
+        """
+
+        async def scheduled_request(route, *args, **kwargs):
+            priority = request_priority(route, kwargs)
+            name = PRIORITY_NAMES[priority]
+            self.metrics["requests"][name] += 1
+            if priority == PRIORITY_INTERACTION:
+                try:
+                    return await request(route, *args, **kwargs)
+                finally:
+                    self.check_deadline(route)
+            start = time.monotonic()
+            key = self.route_key(route)
+            async with self.route_limit(key):
+                await self.wait_for_bucket(key)
+                await self.acquire(priority)
+                self.pending_routes[(route.method, route.url)] = key
+                try:
+                    wait_ms = (time.monotonic() - start) * 1000
+                    self.metrics["total_wait_ms"][name] += wait_ms
+                    self.metrics["max_wait_ms"][name] = max(
+                        self.metrics["max_wait_ms"][name], wait_ms
+                    )
+                    return await request(route, *args, **kwargs)
+                finally:
+                    self.pending_routes.pop((route.method, route.url), None)
+                    self.release()
+
+        return scheduled_request
+
+    def install(self, client: discord.Client) -> None:
+        """
+        Schedule all requests of the client and of the interaction responses
+        :param client: Discord client
+        :return: None
+        """
+        client.http.request = self.wrap(client.http.request)
+        adapter = async_context.get()
+        adapter.request = self.wrap(adapter.request)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Create the trace of the HTTP session, which records the rate limit headers
+        :return: Trace configuration for the client
+        """
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self.on_request_end)
+        return trace
+
+    async def on_request_end(self, _session, _context, params) -> None:
+        """
+        Record the rate limit state of the bucket, the bucket of the scheduled route
+        and count rate limited responses
+        :param params: Trace parameters with the response
+        :return: None
+        """
+        headers = params.response.headers
+        bucket = headers.get("X-RateLimit-Bucket")
+        if bucket is not None:
+            key = self.pending_routes.get(
+                (params.method, str(params.url.with_query(None)))
+            )
+            if key is not None:
+                self.route_buckets[key] = bucket
+            self.buckets[bucket] = {
+                "remaining": int(headers.get("X-RateLimit-Remaining", 0)),
+                "reset": time.time() + float(headers.get("X-RateLimit-Reset-After", 0)),
+            }
+        if params.response.status == 429:
+            self.metrics["rate_limited"] += 1
+            if headers.get("X-RateLimit-Global") or (
+                headers.get("X-RateLimit-Scope") == "global"
+            ):
+                self.metrics["global_rate_limited"] += 1
+
+    def statistics(self) -> dict:
+        """
+        Metrics of the scheduler for monitoring
+        :return: Request, wait, deadline and rate limit counters
+        """
+        now = time.time()
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, slot in self.waiting:
+            if not slot.done():
+                waiting[PRIORITY_NAMES[priority]] += 1
+        return {
+            **self.metrics,
+            "mean_wait_ms": {
+                name: total / max(self.metrics["requests"][name], 1)
+                for name, total in self.metrics["total_wait_ms"].items()
+            },
+            "waiting": waiting,
+            "buckets": len(self.buckets),
+            "exhausted_buckets": sum(
+                1
+                for bucket in self.buckets.values()
+                if bucket["remaining"] == 0 and bucket["reset"] > now
+            ),
+        }
+
+
+outbound_scheduler = OutboundScheduler(
+    max_concurrency=int(
+        os.getenv("OUTBOUND_MAX_CONCURRENCY", str(OUTBOUND_MAX_CONCURRENCY))
+    ),
+)
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
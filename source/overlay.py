@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local HTTP endpoint with the approved stream challenges for the stream overlay. The
+JSON document is serialized once per new challenge and served with an ETag, so an
+unchanged poll is answered with 304. Overlays can wait for changes with a long poll
+or the server-sent events stream instead of polling.
+"""
+import os
+import json
+import asyncio
+import hashlib
+from collections import deque
+from datetime import datetime
+from aiohttp import web
+from source.game_settings import User, get_all_negative_traits
+from source.session_registry import StreamChallengeSession
+from source.event_log import log_event
+from source.constants import (
+    OVERLAY_PAGE_FILE,
+    OVERLAY_HISTORY_SIZE,
+    OVERLAY_LONG_POLL_TIMEOUT,
+    OVERLAY_KEEP_ALIVE,
+)
+
+OVERLAY_HOST = os.getenv("OVERLAY_HOST", "127.0.0.1")
+OVERLAY_PORT = os.getenv("OVERLAY_PORT", None)
+
+
+class ChallengeOverlay:
+    """
+    Current and recent stream challenges with their serialized document
+    """
+
+    def __init__(self, history_size: int = OVERLAY_HISTORY_SIZE):
+        self.challenges = deque(maxlen=history_size)
+        self.body = b""
+        self.etag = ""
+        self.changed = None
+        self.runner = None
+        self.metrics = {"requests": 0, "not_modified": 0, "event_clients": 0}
+        self.serialize()
+
+    def serialize(self) -> None:
+        """
+        Serialize the document and its ETag once for all requests
+        :return: None
+        """
+        document = {
+            "current": self.challenges[0] if self.challenges else None,
+            "recent": list(self.challenges),
+        }
+        self.body = json.dumps(document, ensure_ascii=False).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:16]}"'
+
+    def publish(
+        self, game_settings: StreamChallengeSession, challenge_id: int, user: User
+    ) -> None:
+        """
+        Add an approved stream challenge and wake up the waiting overlays
+        :param game_settings: Session with the approved game settings
+        :param challenge_id: Number of the stream challenge
+        :param user: Requested user
+        :return: None
+        """
+        self.challenges.appendleft(
+            {
+                "id": challenge_id,
+                "creator": user.user_display_name,
+                "date": datetime.now().strftime("%Y-%m-%d"),
+                "location": game_settings.start_location,
+                "negative_traits": get_all_negative_traits(game_settings),
+                "mission": game_settings.mission[0],
+                "points_left": game_settings.challenge_points,
+            }
+        )
+        self.serialize()
+        if self.changed is not None:
+            self.changed.set()
+            self.changed = asyncio.Event()
+
+    async def wait_for_change(self, etag: str, timeout: float) -> bool:
+        """
+        Wait until the document differs from the known version
+        :param etag: ETag of the known version
+        :param timeout: Maximum waiting time in seconds
+        :return: True if the document changed
+        """
+        if etag != self.etag:
+            return True
+        if self.changed is None:
+            self.changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def handle_document(self, request: web.Request) -> web.Response:
+        """
+        Answer with the challenges as JSON. With If-None-Match and the query parameter
+        wait the request is held until the document changes or the time is up.
+        :param request: HTTP request
+        :return: Document or 304 if the overlay has the current version
+        """
+        self.metrics["requests"] += 1
+        known_etag = request.headers.get("If-None-Match")
+        try:
+            wait = min(float(request.query.get("wait", "0")), OVERLAY_LONG_POLL_TIMEOUT)
+        except ValueError:
+            wait = 0
+        if known_etag is not None and wait > 0:
+            await self.wait_for_change(known_etag, wait)
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if known_etag == self.etag:
+            self.metrics["not_modified"] += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=self.body, content_type="application/json", headers=headers
+        )
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        """
+        Stream the document as server-sent event after each change
+        :param request: HTTP request
+        :return: Event stream
+        """
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        self.metrics["event_clients"] += 1
+        etag = None
+        try:
+            while True:
+                if await self.wait_for_change(etag, OVERLAY_KEEP_ALIVE):
+                    etag = self.etag
+                    await response.write(b"data: " + self.body + b"\n\n")
+                else:
+                    await response.write(b": keep-alive\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            self.metrics["event_clients"] -= 1
+        return response
+
+    async def handle_page(self, _request: web.Request) -> web.FileResponse:
+        """
+        Answer with the HTML overlay for the browser source
+        :return: Overlay page
+        """
+        return web.FileResponse(OVERLAY_PAGE_FILE)
+
+    async def start(self) -> None:
+        """
+        Start the HTTP server, if a port is configured
+        :return: None
+        """
+        if OVERLAY_PORT is None or self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/", self.handle_page)
+        app.router.add_get("/challenge.json", self.handle_document)
+        app.router.add_get("/events", self.handle_events)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, OVERLAY_HOST, int(OVERLAY_PORT)).start()
+        log_event("overlay_started", host=OVERLAY_HOST, port=OVERLAY_PORT)
+
+    def statistics(self) -> dict:
+        """
+        Metrics of the overlay endpoint for monitoring. A request is a cache hit, if
+        the overlay already had the current document and got a 304.
+        :return: Request counters and cache hit rate
+        """
+        return {
+            **self.metrics,
+            "hit_rate": self.metrics["not_modified"] / max(self.metrics["requests"], 1),
+            "challenges": len(self.challenges),
+        }
+
+
+challenge_overlay = ChallengeOverlay()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -4,36 +4,61 @@
 All functions to generate pictures
 """
 import os
+import io
 import random
 import uuid
+import functools
 from datetime import datetime
-from PIL import Image, ImageFont, ImageDraw
+from PIL import Image, ImageDraw
 from source.game_settings import (
     User,
     substitution_dictionary,
-    write_config,
-    config,
     remove_wildcard_selection,
+    challenge_random,
+    get_background_sampler,
 )
+from source.session_registry import StreamChallengeSession
+from source.profiling import run_in_worker
+from source.render import render_budget
+from source.fonts import get_font_chain
+from source.gallery import gallery
+from source.overlay import challenge_overlay
+from source.state_backend import state_backend
 from source.constants import (
     GENERIC_IMAGE_PATH,
     MAX_CHARS_PRINT,
+    CHALLENGE_CODE_LOG,
 )
 
+ARCHIVE_CHALLENGE_PICTURES = (
+    os.getenv("ARCHIVE_CHALLENGE_PICTURES", "false").lower() == "true"
+)
+
+
+@functools.lru_cache(maxsize=1)
+def list_background_images() -> tuple:
+    """
+    List the background pictures once, the directory does not change while the bot
+    is running
+    :return: Sorted names of the pictures
+    """
+    files = os.listdir(GENERIC_IMAGE_PATH)
+    return tuple(sorted(element for element in files if element.endswith(".png")))
 
-async def get_background_image() -> str:
+
+async def get_background_image(rng: random.Random) -> str:
     """
     Function to get a random background picture
+    :param rng: Random number generator of the challenge
     :return: Path and picture name
     """
-    files = os.listdir(GENERIC_IMAGE_PATH)
-    pictures = [element for element in files if element.endswith(".png")]
+    pictures = await run_in_worker(list_background_images)
     if len(pictures) == 0:
         return None
-    return GENERIC_IMAGE_PATH + random.choice(pictures)
+    return GENERIC_IMAGE_PATH + get_background_sampler(pictures).sample(rng)
 
 
-async def sort_text_for_print(text: str) -> list:
+def sort_text_for_print(text: str) -> list:
     """
     Sort all words in a string to a list to print them in one picture line
     :param text: String to sort
@@ -55,72 +80,119 @@ async def sort_text_for_print(text: str) -> list:
     return return_strings
 
 
-async def herr_apfelring(  # pylint: disable=too-many-locals
-    game_settings: dict, user: User
-) -> str:
+def write_picture(picture_path: str, picture: bytes) -> None:
+    """
+    Write a picture to the archive
+    :param picture_path: Path and name of the picture
+    :param picture: Picture as PNG data
+    :return: None
+    """
+    with open(picture_path, "wb") as file:
+        file.write(picture)
+
+
+def write_code_log(entry: str) -> None:
+    """
+    Append an entry to the code log
+    :param entry: Line of the code log
+    :return: None
+    """
+    with open(CHALLENGE_CODE_LOG, "a", encoding="utf-8") as file:
+        file.write(entry)
+
+
+def draw_stream_challenge_picture(
+    background_image: str,
+    game_settings: StreamChallengeSession,
+    user: User,
+    challenge_id: int,
+) -> bytes:
+    """
+    Draw the picture of a stream challenge, runs in a worker thread. The background
+    is closed and its memory released when the picture is encoded.
+    :param background_image: Path of the background picture
+    :param game_settings: Session with the current game settings
+    :param user: Requested user
+    :param challenge_id: Number of the stream challenge
+    :return: Picture as PNG data
+    """
+    with Image.open(background_image) as img:
+        draw_stream_challenge(img, game_settings, user, challenge_id)
+        picture = io.BytesIO()
+        img.save(picture, format="PNG")
+    return picture.getvalue()
+
+
+def draw_stream_challenge(  # pylint: disable=too-many-locals
+    img: Image.Image, game_settings: StreamChallengeSession, user: User, challenge_id
+) -> None:
     """
-    Function to create the picture for stream challenge
-    :param game_settings: Current game settings
+    Draw the game settings of a stream challenge on the background
+    :param img: Background picture
+    :param game_settings: Session with the current game settings
     :param user: Requested user
-    :return: Picture path and name
+    :param challenge_id: Number of the stream challenge
+    :return: None
     """
-    background_image = await get_background_image()
-    img = Image.open(background_image)
     draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype("../files/CrotahFreeVersionItalic-z8Ev3.ttf", 25)
+    font_chain = get_font_chain()
     color = (255, 255, 255)
     # Nummer und Datum
     zeitstempel = datetime.now().strftime("%Y-%m-%d")
-    challenge_id = config["challenge_id"] + 1
-    write_config("challenge_id", challenge_id)
     text = (
-        f"#{challenge_id}, erstellt von "
-        f"{user.user_display_name.translate(substitution_dictionary)}, "
-        f"{zeitstempel}"
+        f"#{challenge_id}, erstellt von " f"{user.user_display_name}, " f"{zeitstempel}"
     )
-    draw.text((10, 10), text, fill=color, font=font)
+    font_chain.draw_text(draw, (10, 10), text, color)
     # Location
-    location = game_settings["start_location"]
+    location = game_settings.start_location
     text = f"Start in: {location}"
-    draw.text((10, 100), text, fill=color, font=font)
+    font_chain.draw_text(draw, (10, 100), text, color)
     # negative Traits
     negative_traits = (
-        game_settings["negative_trait_1"]
-        + game_settings["negative_trait_2"]
-        + game_settings["negative_trait_3"]
+        game_settings.negative_trait_1
+        + game_settings.negative_trait_2
+        + game_settings.negative_trait_3
     )
     remove_wildcard_selection(negative_traits)
     text = "Mit den negativen Traits:"
-    draw.text((10, 140), text, fill=color, font=font)
+    font_chain.draw_text(draw, (10, 140), text, color)
     pos_x = 350
     pos_y = 140
     for element in negative_traits:
         pos = (pos_x, pos_y)
-        draw.text(
-            pos, element.translate(substitution_dictionary), fill=color, font=font
-        )
+        font_chain.draw_text(draw, pos, element, color)
         pos_y += 20
     # Mission
-    mission = game_settings["mission"][0]
+    mission = game_settings.mission[0]
     pos_y += 50
     pos = (10, pos_y)
-    draw.text(
-        pos,
-        "Deine Mission:",
-        fill=color,
-        font=font,
-    )
-    text_list = await sort_text_for_print(mission.translate(substitution_dictionary))
+    font_chain.draw_text(draw, pos, "Deine Mission:", color)
+    text_list = sort_text_for_print(mission)
     pos = (200, pos_y)
     for element in text_list:
-        draw.text(
-            pos,
-            element,
-            fill=color,
-            font=font,
-        )
+        font_chain.draw_text(draw, pos, element, color)
         pos_y += 20
         pos = (200, pos_y)
+
+
+async def herr_apfelring(game_settings: StreamChallengeSession, user: User) -> bytes:
+    """
+    Function to create and archive the picture for stream challenge
+    :param game_settings: Session with the current game settings
+    :param user: Requested user
+    :return: Picture as PNG data
+    """
+    background_image = await get_background_image(random.Random())
+    challenge_id = await state_backend.next_sequence("challenge_id")
+    challenge_overlay.publish(game_settings, challenge_id, user)
+    picture = await render_budget.render(
+        draw_stream_challenge_picture,
+        background_image,
+        game_settings,
+        user,
+        challenge_id,
+    )
+    zeitstempel = datetime.now().strftime("%Y-%m-%d")
     # Bildname und Pfad
     bildname_und_pfad = (
         "../created_challenges/"
@@ -134,23 +206,41 @@ async def herr_apfelring(  # pylint: disable=too-many-locals
         + str(uuid.uuid4()).replace("-", "")
         + ".png"
     )
-    img.save(bildname_und_pfad)
-    return bildname_und_pfad
+    await run_in_worker(write_picture, bildname_und_pfad, picture)
+    gallery.add(picture, f"#{challenge_id} {user.user_display_name}")
+    return picture
 
 
-async def create_challenge_picture(  # pylint: disable=too-many-statements, too-many-locals
-    game_settings: dict, user: User
-) -> str:
+def draw_challenge_picture(
+    background_image: str, game_settings: dict, user: User
+) -> bytes:
     """
-    Function to create the pictures with the challenge based on game settings.
+    Draw the picture of a custom challenge, runs in a worker thread. The background
+    is closed and its memory released when the picture is encoded.
+    :param background_image: Path of the background picture
+    :param game_settings: Game settings with map, traits and mission.
+    :param user: User information
+    :return: Picture as PNG data
+    """
+    with Image.open(background_image) as img:
+        draw_challenge(img, game_settings, user)
+        picture = io.BytesIO()
+        img.save(picture, format="PNG")
+    return picture.getvalue()
+
+
+def draw_challenge(  # pylint: disable=too-many-statements, too-many-locals
+    img: Image.Image, game_settings: dict, user: User
+) -> None:
+    """
+    Draw the game settings of a custom challenge on the background
+    :param img: Background picture
     :param game_settings: Game settings with map, traits and mission.
     :param user: User information
-    :return: picture name and path
+    :return: None
     """
-    background_image = await get_background_image()
-    img = Image.open(background_image)
     draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype("../files/CrotahFreeVersionItalic-z8Ev3.ttf", 25)
+    font_chain = get_font_chain()
     color = (255, 255, 255)
     # Ersteller
     pos = (10, 10)
@@ -158,27 +248,29 @@ async def create_challenge_picture(  # pylint: disable=too-many-statements, too-
     challenge_difficulty = game_settings["difficulty"]
     text = (
         f"Challenge: {challenge_difficulty}, "
-        f"{user.user_display_name.translate(substitution_dictionary)}, "
+        f"{user.user_display_name}, "
         f"{zeitstempel}"
     )
-    draw.text(pos, text, fill=color, font=font)
+    font_chain.draw_text(draw, pos, text, color)
+    # Code
+    pos = (10, 40)
+    text = f"Code: {game_settings['code']}"
+    font_chain.draw_text(draw, pos, text, color)
     # Location and profession
     location = game_settings["location"]
-    profession = game_settings["profession"].translate(substitution_dictionary)
+    profession = game_settings["profession"]
     pos = (10, 100)
     text = f"Starte in: {location} als {profession}"
-    draw.text(pos, text, fill=color, font=font)
+    font_chain.draw_text(draw, pos, text, color)
     # positiv Traits
     text = "Mit den positiven Traits:"
     pos = (10, 140)
-    draw.text(pos, text, fill=color, font=font)
+    font_chain.draw_text(draw, pos, text, color)
     pos_x = 350
     pos_y = 140
     for element in game_settings["positive_traits"]:
         pos = (pos_x, pos_y)
-        draw.text(
-            pos, element.translate(substitution_dictionary), fill=color, font=font
-        )
+        font_chain.draw_text(draw, pos, element, color)
         pos_y += 20
     # negativ Traits
     if len(game_settings["positive_traits"]) == 0:
@@ -187,70 +279,84 @@ async def create_challenge_picture(  # pylint: disable=too-many-statements, too-
         pos_y += 5
     text = "Mit den negativen Traits:"
     pos = (10, pos_y)
-    draw.text(pos, text, fill=color, font=font)
+    font_chain.draw_text(draw, pos, text, color)
     pos_x = 350
     for element in game_settings["negative_traits"]:
         pos = (pos_x, pos_y)
-        draw.text(
-            pos, element.translate(substitution_dictionary), fill=color, font=font
-        )
+        font_chain.draw_text(draw, pos, element, color)
         pos_y += 20
     # Mission
     mission = game_settings["mission"]
     pos_y += 50
     pos = (10, pos_y)
-    draw.text(
-        pos,
-        "Deine Mission:",
-        fill=color,
-        font=font,
-    )
-    text_list = await sort_text_for_print(mission.translate(substitution_dictionary))
+    font_chain.draw_text(draw, pos, "Deine Mission:", color)
+    text_list = sort_text_for_print(mission)
     pos = (200, pos_y)
     for element in text_list:
-        draw.text(
-            pos,
-            element,
-            fill=color,
-            font=font,
-        )
+        font_chain.draw_text(draw, pos, element, color)
         pos_y += 20
         pos = (200, pos_y)
     # Einstellungen
     einstellungen = game_settings["settings"]
-    text_list = await sort_text_for_print(
-        einstellungen.translate(substitution_dictionary)
-    )
+    text_list = sort_text_for_print(einstellungen)
     pos_y += 50
     pos = (10, pos_y)
-    draw.text(
-        pos,
-        "Einstellungen:",
-        fill=color,
-        font=font,
-    )
+    font_chain.draw_text(draw, pos, "Einstellungen:", color)
     pos = (200, pos_y)
     for element in text_list:
-        draw.text(
-            pos,
-            element,
-            fill=color,
-            font=font,
-        )
+        font_chain.draw_text(draw, pos, element, color)
         pos_y += 20
         pos = (200, pos_y)
+
+
+async def create_challenge_picture(game_settings: dict, user: User) -> bytes:
+    """
+    Function to create the pictures with the challenge based on game settings.
+    :param game_settings: Game settings with map, traits and mission.
+    :param user: User information
+    :return: picture as PNG data
+    """
+    background_image = await get_background_image(
+        challenge_random(game_settings["code"], "background")
+    )
+    return await render_budget.render(
+        draw_challenge_picture, background_image, game_settings, user
+    )
+
+
+async def archive_challenge_picture(
+    picture: bytes, game_settings: dict, user: User
+) -> None:
+    """
+    Archive a new custom challenge. The code is always written to the code log, the
+    picture itself only if archiving of pictures is enabled, because it can be
+    recreated from the code.
+    :param picture: Picture as PNG data
+    :param game_settings: Game settings with the challenge code
+    :param user: User information
+    :return: None
+    """
+    zeitstempel = datetime.now().strftime("%Y-%m-%d")
+    user_name = user.user_display_name.translate(substitution_dictionary)
+    await run_in_worker(
+        write_code_log, f"{zeitstempel};{game_settings['code']};{user_name}\n"
+    )
+    gallery.add(picture, f"{game_settings['code']} {user.user_display_name}")
+    if not ARCHIVE_CHALLENGE_PICTURES:
+        return
     # Bildname und Pfad
     bildname_und_pfad = (
         "../created_challenges/"
         + zeitstempel
         + "_"
-        + user.user_display_name.translate(substitution_dictionary).replace(" ", "")
+        + user_name.replace(" ", "")
+        + "_"
+        + game_settings["code"]
         + "_"
         + str(uuid.uuid4()).replace("-", "")
         + ".png"
     )
-    img.save(bildname_und_pfad)
-    return bildname_und_pfad
+    await run_in_worker(write_picture, bildname_und_pfad, picture)
 
 
 def main() -> None:
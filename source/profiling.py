@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of the commands. A fraction of the command executions is sampled
+with cProfile, which is only enabled while the sampled coroutine is running. Other
+tasks on the event loop are not part of the sample.
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+import pstats
+import cProfile
+import functools
+import contextvars
+from source.constants import PROFILE_PATH, PROFILE_MAX_FILES
+
+profiler_settings = {
+    "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+}
+active_sample = contextvars.ContextVar("active_sample", default=None)
+
+
+class ProfileSample:  # pylint: disable=too-few-public-methods
+    """
+    Profile of one sampled command with the profiles of its worker threads
+    """
+
+    __slots__ = ("profile", "worker_profiles")
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.worker_profiles = []
+
+
+class ProfiledCoroutine:  # pylint: disable=too-few-public-methods
+    """
+    Awaitable that drives a coroutine and enables the profiler only for the steps
+    of this coroutine.
+    """
+
+    def __init__(self, coroutine, profile: cProfile.Profile):
+        self.coroutine = coroutine
+        self.profile = profile
+
+    def __await__(self):
+        iterator = self.coroutine.__await__()
+        send_value = None
+        throw_value = None
+        while True:
+            self.profile.enable()
+            try:
+                if throw_value is None:
+                    result = iterator.send(send_value)
+                else:
+                    result = iterator.throw(throw_value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profile.disable()
+            try:
+                send_value = yield result
+                throw_value = None
+            except BaseException as error:  # pylint: disable=broad-exception-caught
+                send_value = None
+                throw_value = error
+
+
+def set_sample_rate(sample_rate: float) -> float:
+    """
+    Change the fraction of command executions that are profiled
+    :param sample_rate: Fraction between 0 (disabled) and 1 (every execution)
+    :return: New sample rate
+    """
+    profiler_settings["sample_rate"] = min(max(sample_rate, 0.0), 1.0)
+    return profiler_settings["sample_rate"]
+
+
+async def run_in_worker(func, *args):
+    """
+    Run a blocking function in a worker thread. If the calling command is sampled,
+    the worker is profiled as part of the sample.
+    :param func: Blocking function
+    :param args: Arguments of the function
+    :return: Result of the function
+    """
+    sample = active_sample.get()
+    if sample is None:
+        return await asyncio.to_thread(func, *args)
+    worker_profile = cProfile.Profile()
+    sample.worker_profiles.append(worker_profile)
+    return await asyncio.to_thread(worker_profile.runcall, func, *args)
+
+
+def write_profile(sample: ProfileSample, name: str) -> str:
+    """
+    Write a sample as pstats file and remove the oldest files above the limit
+    :param sample: Finished sample
+    :param name: Name of the profiled command
+    :return: Path of the profile file
+    """
+    os.makedirs(PROFILE_PATH, exist_ok=True)
+    profile_path = os.path.join(
+        PROFILE_PATH,
+        f"{name}_{time.strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:8]}.prof",
+    )
+    stats = pstats.Stats(sample.profile)
+    for worker_profile in sample.worker_profiles:
+        stats.add(worker_profile)
+    stats.dump_stats(profile_path)
+    profile_files = sorted(
+        (
+            os.path.join(PROFILE_PATH, element)
+            for element in os.listdir(PROFILE_PATH)
+            if element.endswith(".prof")
+        ),
+        key=os.path.getmtime,
+    )
+    for old_profile in profile_files[:-PROFILE_MAX_FILES]:
+        os.remove(old_profile)
+    return profile_path
+
+
+def profiled(name: str):
+    """
+    Decorator to sample a coroutine function with the profiler. If profiling is
+    disabled, the only overhead is the comparison of the sample rate.
+    :param name: Name of the profile files
+    :return: Decorator
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            sample_rate = profiler_settings["sample_rate"]
+            if sample_rate <= 0 or active_sample.get() is not None:
+                return await func(*args, **kwargs)
+            if random.random() >= sample_rate:
+                return await func(*args, **kwargs)
+            sample = ProfileSample()
+            token = active_sample.set(sample)
+            try:
+                return await ProfiledCoroutine(func(*args, **kwargs), sample.profile)
+            finally:
+                active_sample.reset(token)
+                await asyncio.to_thread(write_profile, sample, name)
+
+        return wrapper
+
+    return decorator
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Random fill of a stream challenge. Start location, the traits of the three tiers and
+the mission are sampled uniformly from all combinations which use up the remaining
+points, or as many as possible. A knapsack table counts the combinations of every
+suffix of the decisions for every total, so a sample is one walk over the decisions.
+Combinations with excluded traits are rejected, which keeps the sample uniform.
+"""
+import random
+import functools
+from source.game_settings import (
+    custom_config,
+    stream_challenge_config,
+    total_sum_of_neg_traits,
+)
+from source.session_registry import StreamChallengeSession
+from source.stream_challenge import get_option_wildcard_for_selection, mission_value
+from source.constants import RANDOM_FILL_ATTEMPTS
+
+STAGES = ["start_location", "negative_trait_1", "negative_trait_2", "negative_trait_3"]
+TIERS = [
+    "NegativePropertiesValueOptionOne",
+    "NegativePropertiesValueOptionTwo",
+    "NegativePropertiesValueOptionThree",
+]
+
+
+class RandomFill:
+    """
+    Knapsack count table of the decisions of a stream challenge
+    """
+
+    def __init__(self, decisions: list, budget: int):
+        self.decisions = decisions
+        self.counts = [[0] * (budget + 1) for _ in range(len(decisions) + 1)]
+        self.counts[-1][0] = 1
+        for index in range(len(decisions) - 1, -1, -1):
+            following = self.counts[index + 1]
+            for total in range(budget + 1):
+                self.counts[index][total] = sum(
+                    following[total - cost]
+                    for _, cost in decisions[index][1]
+                    if cost <= total
+                )
+
+    def walk(self, start: int, total: int, rng: random.Random) -> list:
+        """
+        Sample the options of the decisions from the start with the exact total
+        :param start: Index of the first decision
+        :param total: Total points of the sampled options
+        :param rng: Random number generator
+        :return: List of stage and label of the chosen options
+        """
+        chosen = []
+        for index in range(start, len(self.decisions)):
+            stage, options = self.decisions[index]
+            following = self.counts[index + 1]
+            label, cost = pick_option(
+                options, following, total, rng.randrange(self.counts[index][total])
+            )
+            if label is not None:
+                chosen.append((stage, label))
+            total -= cost
+        return chosen
+
+    def sample(
+        self, session: StreamChallengeSession, rng: random.Random = random
+    ) -> dict:
+        """
+        Sample the open stages of a session, which use up the remaining points of
+        the session or as many as possible
+        :param session: Session with the stages selected so far
+        :param rng: Random number generator
+        :return: Selections of the open stages, None if no combination is valid
+        """
+        open_stages = [
+            element for element in STAGES if getattr(session, element) is None
+        ]
+        start = next(
+            index
+            for index, (stage, _) in enumerate(self.decisions)
+            if stage in open_stages + ["mission"]
+        )
+        selected = set()
+        for element in STAGES[1:]:
+            selected.update(getattr(session, element) or [])
+        budget = min(session.challenge_points, len(self.counts[0]) - 1)
+        for total in range(budget, -1, -1):
+            if not self.counts[start][total]:
+                continue
+            for _ in range(RANDOM_FILL_ATTEMPTS):
+                chosen = self.walk(start, total, rng)
+                if not excluded(selected | {label for _, label in chosen}):
+                    return selections(open_stages, chosen)
+        return None
+
+
+def fill_session(session: StreamChallengeSession, rng: random.Random = random) -> bool:
+    """
+    Fill the open stages of a session with a random combination and deduct its points
+    :param session: Session with the stages selected so far
+    :param rng: Random number generator
+    :return: True if the session was filled
+    """
+    settings = get_random_fill().sample(session, rng)
+    if settings is None:
+        return False
+    for setting, value in settings.items():
+        setattr(session, setting, value)
+    if "start_location" in settings:
+        session.challenge_points -= stream_challenge_config["StartingArea"][
+            settings["start_location"]
+        ]
+    traits = [trait for stage in STAGES[1:] for trait in settings.get(stage, [])]
+    session.challenge_points -= total_sum_of_neg_traits(traits)
+    session.challenge_points -= mission_value(settings["mission"])
+    return True
+
+
+def pick_option(options: list, following: list, total: int, pick: int) -> tuple:
+    """
+    Get the option of a decision, which is weighted with the number of combinations
+    of the following decisions for the remaining total
+    :param options: Label and points of the options
+    :param following: Combinations of the following decisions by total
+    :param total: Remaining total
+    :param pick: Random number below the combinations of this decision
+    :return: Label and points of the picked option
+    """
+    for label, cost in options:
+        ways = following[total - cost] if cost <= total else 0
+        if pick < ways:
+            return label, cost
+        pick -= ways
+    raise ValueError("pick exceeds the combinations of the decision")
+
+
+def excluded(traits: set) -> bool:
+    """
+    Check if a trait excludes another trait of the set
+    :param traits: Selected traits
+    :return: True if the combination is not allowed
+    """
+    for trait in traits:
+        exclusions = custom_config.get(trait)
+        if isinstance(exclusions, list) and traits.intersection(exclusions):
+            return True
+    return False
+
+
+def selections(stages: list, chosen: list) -> dict:
+    """
+    Create the settings of the open stages from the chosen options. A tier without
+    traits gets the wildcard selection.
+    :param stages: Open stages before the mission
+    :param chosen: Stage and label of the chosen options
+    :return: Selections by setting name
+    """
+    wildcard = get_option_wildcard_for_selection().label
+    settings = {stage: [] for stage in stages + ["mission"]}
+    for stage, label in chosen:
+        settings[stage].append(label)
+    for stage in stages:
+        if stage == "start_location":
+            settings[stage] = settings[stage][0]
+        elif not settings[stage]:
+            settings[stage] = [wildcard]
+    return settings
+
+
+@functools.lru_cache(maxsize=1)
+def get_random_fill() -> RandomFill:
+    """
+    Build the knapsack table of the stream challenge configuration once
+    :return: Random fill of the stream challenges
+    """
+    decisions = [
+        ("start_location", list(stream_challenge_config["StartingArea"].items()))
+    ]
+    for stage, tier in zip(STAGES[1:], TIERS):
+        for trait in stream_challenge_config[tier]:
+            cost = total_sum_of_neg_traits([trait])
+            decisions.append((stage, [(None, 0), (trait, cost)]))
+    decisions.append(("mission", list(stream_challenge_config["Mission"].items())))
+    return RandomFill(decisions, stream_challenge_config["TotalPoints"])
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
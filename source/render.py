@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render subsystem for the challenge pictures. Renders run in worker threads and the
+number of renders in flight is limited by a memory budget, divided by the measured
+peak memory of one render. The traced and resident memory belong to the whole
+process, so they are measured over a busy period, from the first render in flight
+until no render is left, and divided by the renders in flight at the same time.
+"""
+import os
+import time
+import asyncio
+import resource
+import tracemalloc
+from collections import deque
+from PIL import Image
+from source.profiling import run_in_worker
+from source.constants import (
+    RENDER_MEMORY_BUDGET_MB,
+    RENDER_INITIAL_PEAK_MB,
+    RENDER_PEAK_WINDOW,
+)
+
+RENDER_TRACE_MEMORY = os.getenv("RENDER_TRACE_MEMORY", "false").lower() == "true"
+
+
+def current_rss() -> int:
+    """
+    Get the resident memory of the process
+    :return: Resident memory in bytes, 0 if it is not available
+    """
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def decoded_image_size(image_path: str) -> int:
+    """
+    Calculate the memory of a decoded image from its header without decoding it
+    :param image_path: Path of the image
+    :return: Memory of the decoded image in bytes
+    """
+    with Image.open(image_path) as image:
+        return image.width * image.height * len(image.getbands())
+
+
+class RenderBudget:  # pylint: disable=too-many-instance-attributes
+    """
+    Limit the renders in flight, so the sum of their peak memory stays in the budget
+    """
+
+    def __init__(
+        self,
+        budget_mb=RENDER_MEMORY_BUDGET_MB,
+        initial_peak_mb=RENDER_INITIAL_PEAK_MB,
+        trace_memory=False,
+    ):
+        self.budget = budget_mb * 1024 * 1024
+        self.peaks = deque([initial_peak_mb * 1024 * 1024], maxlen=RENDER_PEAK_WINDOW)
+        self.trace_memory = trace_memory
+        self.in_flight = 0
+        self.condition = None
+        self.period = None
+        self.metrics = {
+            "renders": 0,
+            "waited": 0,
+            "max_in_flight": 0,
+            "last_image_bytes": 0,
+            "last_render_ms": 0.0,
+            "periods": 0,
+            "last_period_renders": 0,
+            "last_period_in_flight": 0,
+            "last_period_traced_peak_bytes": 0,
+            "last_period_rss_growth_bytes": 0,
+            "last_peak_bytes": 0,
+            "max_peak_bytes": 0,
+        }
+
+    def capacity(self) -> int:
+        """
+        Number of renders which fit into the budget with the measured peak memory
+        :return: Maximum number of renders in flight
+        """
+        return max(1, self.budget // max(self.peaks))
+
+    async def acquire(self) -> None:
+        """
+        Wait until the next render fits into the budget
+        :return: None
+        """
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            if self.in_flight >= self.capacity():
+                self.metrics["waited"] += 1
+            await self.condition.wait_for(lambda: self.in_flight < self.capacity())
+            if self.in_flight == 0:
+                self.start_period()
+            self.in_flight += 1
+            self.period["in_flight"] = max(self.period["in_flight"], self.in_flight)
+            self.metrics["max_in_flight"] = max(
+                self.metrics["max_in_flight"], self.in_flight
+            )
+
+    async def release(self) -> None:
+        """
+        Free the budget of a finished render
+        :return: None
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.end_period()
+            self.condition.notify_all()
+
+    def start_period(self) -> None:
+        """
+        Start the memory measurement of a busy period, the traced peak is only reset
+        here, so no render resets the peak of another render
+        :return: None
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self.period = {
+            "rss": current_rss(),
+            "traced": tracemalloc.get_traced_memory()[0],
+            "renders": 0,
+            "in_flight": 0,
+            "peak": 0,
+        }
+
+    def end_period(self) -> None:
+        """
+        Finish the memory measurement of a busy period. The peak of one render is the
+        larger of its image memory and the process growth divided by the renders,
+        which were in flight at the same time.
+        :return: None
+        """
+        period = self.period
+        traced_peak = max(tracemalloc.get_traced_memory()[1] - period["traced"], 0)
+        rss_growth = max(current_rss() - period["rss"], 0)
+        peak = max(period["peak"], max(traced_peak, rss_growth) // period["in_flight"])
+        self.peaks.append(peak)
+        self.metrics["periods"] += 1
+        self.metrics["last_period_renders"] = period["renders"]
+        self.metrics["last_period_in_flight"] = period["in_flight"]
+        self.metrics["last_period_traced_peak_bytes"] = traced_peak
+        self.metrics["last_period_rss_growth_bytes"] = rss_growth
+        self.metrics["last_peak_bytes"] = peak
+        self.metrics["max_peak_bytes"] = max(self.metrics["max_peak_bytes"], peak)
+
+    def record(self, image_bytes: int, render_ms: float) -> None:
+        """
+        Record a finished render of the current busy period
+        :param image_bytes: Decoded background and encoded picture in bytes
+        :param render_ms: Duration of the render in milliseconds
+        :return: None
+        """
+        self.period["renders"] += 1
+        self.period["peak"] = max(self.period["peak"], image_bytes)
+        self.metrics["renders"] += 1
+        self.metrics["last_image_bytes"] = image_bytes
+        self.metrics["last_render_ms"] = render_ms
+
+    @staticmethod
+    def measure(func, image_path: str, *args) -> tuple:
+        """
+        Run a render in the worker thread
+        :param func: Render function with the background path as first argument
+        :param image_path: Path of the background image
+        :param args: Further arguments of the render function
+        :return: Picture as PNG data, memory of the decoded background and the
+            picture and duration of the render in milliseconds
+        """
+        start = time.monotonic()
+        picture = func(image_path, *args)
+        image_bytes = decoded_image_size(image_path) + len(picture)
+        return picture, image_bytes, (time.monotonic() - start) * 1000
+
+    async def render(self, func, image_path: str, *args) -> bytes:
+        """
+        Render a picture in a worker thread within the memory budget
+        :param func: Render function with the background path as first argument
+        :param image_path: Path of the background image
+        :param args: Further arguments of the render function
+        :return: Picture as PNG data
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        await self.acquire()
+        try:
+            picture, image_bytes, render_ms = await run_in_worker(
+                self.measure, func, image_path, *args
+            )
+            self.record(image_bytes, render_ms)
+            return picture
+        finally:
+            await self.release()
+
+    def statistics(self) -> dict:
+        """
+        Metrics of the renders for monitoring
+        :return: Memory and concurrency counters
+        """
+        return {
+            **self.metrics,
+            "in_flight": self.in_flight,
+            "capacity": self.capacity(),
+            "process_peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            * 1024,
+        }
+
+
+render_budget = RenderBudget(
+    budget_mb=int(os.getenv("RENDER_MEMORY_BUDGET_MB", str(RENDER_MEMORY_BUDGET_MB))),
+    trace_memory=RENDER_TRACE_MEMORY,
+)
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay of recorded interaction traces against the real command and view handlers.
+Discord is replaced by a local stand-in, which answers every call immediately, so
+the measured latency is the time of the bot itself. The handlers create pictures and
+write the configuration, so the replay should run in a scratch copy of the bot.
+
+Usage: python replay.py TRACE_FILE [--speed N | --speed max]
+"""
+import os
+import time
+import asyncio
+import argparse
+import itertools
+from collections import defaultdict
+import discord
+from source.interaction_trace import read_trace
+
+STAND_IN_IDS = itertools.count(1)
+
+
+class StandInMessage:  # pylint: disable=too-few-public-methods
+    """
+    Message of the stand-in, edits are passed to the replayed user
+    """
+
+    def __init__(self, user, channel):
+        self.id = next(STAND_IN_IDS)
+        self.user = user
+        self.channel = channel
+        self.attachments = []
+
+    async def edit(self, **kwargs):
+        """
+        Edit the message
+        :param kwargs: Changed content of the message
+        :return: None
+        """
+        self.user.capture(kwargs)
+
+
+class StandInChannel:  # pylint: disable=too-few-public-methods
+    """
+    Channel of the stand-in
+    """
+
+    def __init__(self, user, channel_id: int):
+        self.id = channel_id
+        self.user = user
+
+    async def send(self, *_args, **kwargs):
+        """
+        Send a message to the channel
+        :param kwargs: Content of the message
+        :return: Sent message
+        """
+        self.user.capture(kwargs)
+        return StandInMessage(self.user, self)
+
+
+class StandInResponse:
+    """
+    Interaction response of the stand-in
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.done = False
+
+    def is_done(self) -> bool:
+        """
+        Check if the interaction was answered
+        :return: True if the interaction was answered
+        """
+        return self.done
+
+    async def send_message(self, *_args, **kwargs):
+        """
+        Answer the interaction with a message
+        :param kwargs: Content of the message
+        :return: None
+        """
+        self.done = True
+        self.user.capture(kwargs)
+
+    async def edit_message(self, **kwargs):
+        """
+        Answer the interaction with an edit of its message
+        :param kwargs: Changed content of the message
+        :return: None
+        """
+        self.done = True
+        self.user.capture(kwargs)
+
+    async def defer(self, **_kwargs):
+        """
+        Acknowledge the interaction
+        :return: None
+        """
+        self.done = True
+
+
+class StandInFollowup:  # pylint: disable=too-few-public-methods
+    """
+    Followup webhook of the stand-in
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, *args, **kwargs):
+        """
+        Send a followup message
+        :param kwargs: Content of the message
+        :return: Sent message
+        """
+        kwargs.pop("wait", None)
+        return await self.channel.send(*args, **kwargs)
+
+
+class StandInMember:  # pylint: disable=too-few-public-methods
+    """
+    Member of the stand-in with all roles the commands check
+    """
+
+    def __init__(self, user_id: int, role_ids: list):
+        self.id = user_id
+        self.display_name = f"replay{user_id}"
+        self.global_name = f"Replay {user_id}"
+        self.roles = [discord.Object(id=role_id) for role_id in role_ids]
+
+    async def remove_roles(self, *_roles, **_kwargs):
+        """
+        Remove roles from the member
+        :return: None
+        """
+
+
+class StandInGuild:  # pylint: disable=too-few-public-methods
+    """
+    Guild of the stand-in
+    """
+
+    def get_role(self, role_id: int) -> discord.Object:
+        """
+        Get a role of the guild
+        :param role_id: Id of the role
+        :return: Role
+        """
+        return discord.Object(id=role_id)
+
+
+class StandInInteraction:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    """
+    Interaction of the stand-in
+    """
+
+    def __init__(self, user, channel_id: int, data: dict):
+        self.id = next(STAND_IN_IDS)
+        self.user = user.member
+        self.channel = StandInChannel(user, channel_id)
+        self.guild = StandInGuild()
+        self.response = StandInResponse(user)
+        self.followup = StandInFollowup(self.channel)
+        self.message = StandInMessage(user, self.channel)
+        self.data = data
+
+
+class ReplayUser:
+    """
+    Replayed user with the views of the received messages
+    """
+
+    def __init__(self, user_id: int, role_ids: list):
+        self.member = StandInMember(user_id, role_ids)
+        self.views = {}
+        self.channel_id = 0
+
+    def capture(self, message: dict) -> None:
+        """
+        Keep the view of a sent or edited message for the next component steps
+        :param message: Keyword arguments of the message
+        :return: None
+        """
+        view = message.get("view")
+        if view is not None:
+            self.views[getattr(view, "kind", "vote")] = view
+
+    def find_component(self, step: str):
+        """
+        Find the component of a step in the views of the user
+        :param step: Recorded step with view kind and component name
+        :return: View and component, None if the user has no such component
+        """
+        kind, _, name = step.partition(":")
+        view = self.views.get(kind)
+        if view is None:
+            return None
+        for item in view.children:
+            custom_id = getattr(item, "custom_id", "") or ""
+            if custom_id.split(":", 2)[-1] == name and not item.disabled:
+                return view, item
+        return None
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Get the nearest-rank percentile of a list of values
+    :param values: Measured values
+    :param fraction: Percentile between 0 and 1
+    :return: Value of the percentile
+    """
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Replayer:
+    """
+    Drive the handlers of the bot with the events of a trace
+    """
+
+    def __init__(self, bot, speed: float):
+        self.bot = bot
+        self.speed = speed
+        self.guild = discord.Object(id=int(bot.SERVER_ID))
+        self.role_ids = [int(bot.STREAM_CHALLENGE_CREATOR_ROLE_ID)]
+        self.latencies = defaultdict(list)
+        self.skipped = defaultdict(int)
+
+    def channel_id(self, command: str) -> int:
+        """
+        Get the channel in which a command is allowed
+        :param command: Name of the command
+        :return: Id of the channel
+        """
+        if command.startswith("stream"):
+            return int(self.bot.CHANNEL_STREAM_CHALLENGE_ID)
+        return int(self.bot.CHANNEL_CUSTOM_CHALLENGE_ID)
+
+    async def run_step(self, user: ReplayUser, event: dict) -> None:
+        """
+        Run the handler of a recorded step and measure its latency
+        :param user: Replayed user
+        :param event: Recorded event
+        :return: None
+        """
+        step = event["s"]
+        start = time.perf_counter()
+        if step.startswith("command:"):
+            command = self.bot.tree.get_command(step[8:], guild=self.guild)
+            if command is None:
+                self.skipped[step] += 1
+                return
+            user.channel_id = self.channel_id(command.name)
+            interaction = StandInInteraction(user, user.channel_id, {})
+            await command.callback(interaction, **event["a"])
+        else:
+            found = user.find_component(step)
+            if found is None:
+                self.skipped[step] += 1
+                return
+            view, item = found
+            item._values = event["a"]  # pylint: disable=protected-access
+            interaction = StandInInteraction(
+                user, user.channel_id, {"values": event["a"]}
+            )
+            if await view.interaction_check(interaction):
+                await item.callback(interaction)
+        self.latencies[step].append((time.perf_counter() - start) * 1000)
+
+    async def run_user(self, events: list, start: float) -> None:
+        """
+        Replay the events of one user in order with the recorded delays
+        :param events: Events of the user
+        :param start: Start time of the replay
+        :return: None
+        """
+        user = ReplayUser(1000 + events[0]["u"], self.role_ids)
+        for event in events:
+            if self.speed > 0:
+                delay = start + event["t"] / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.run_step(user, event)
+
+    async def run(self, events: list) -> None:
+        """
+        Replay all users of a trace concurrently
+        :param events: Events of the trace
+        :return: None
+        """
+        self.bot.gallery.load()
+        self.bot.get_font_chain()
+        by_user = defaultdict(list)
+        for event in events:
+            by_user[event["u"]].append(event)
+        start = time.monotonic()
+        await asyncio.gather(
+            *(self.run_user(user_events, start) for user_events in by_user.values())
+        )
+
+    def report(self) -> str:
+        """
+        Create the report of the latency percentiles per step
+        :return: Report as text
+        """
+        lines = [
+            f"{'step':40} {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"
+        ]
+        for step, values in sorted(self.latencies.items()):
+            lines.append(
+                f"{step:40} {len(values):6d} {percentile(values, 0.5):9.1f} "
+                f"{percentile(values, 0.9):9.1f} {percentile(values, 0.99):9.1f} "
+                f"{max(values):9.1f}"
+            )
+        for step, count in sorted(self.skipped.items()):
+            lines.append(f"{step:40} {count:6d} skipped")
+        return "\n".join(lines)
+
+
+def main() -> None:
+    """
+    Replay a trace file and print the latency percentiles per step in milliseconds
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Replay an interaction trace.")
+    parser.add_argument("trace_file")
+    parser.add_argument("--speed", default="1", help="Speed factor or max")
+    arguments = parser.parse_args()
+    for name in [
+        "SERVER_ID",
+        "CHANNEL_CUSTOM_CHALLENGE_ID",
+        "CHANNEL_STREAM_CHALLENGE_ID",
+        "STREAM_CHALLENGE_CREATOR_ROLE_ID",
+    ]:
+        os.environ.setdefault(name, "1")
+    from source import main as bot  # pylint: disable=import-outside-toplevel
+
+    speed = 0 if arguments.speed == "max" else float(arguments.speed)
+    replayer = Replayer(bot, speed)
+    asyncio.run(replayer.run(read_trace(arguments.trace_file)))
+    print(replayer.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Weighted sampling with the alias method. The tables are built once when the
+configuration is loaded, every draw needs constant time independent of the pool size.
+"""
+import random
+
+
+class AliasSampler:  # pylint: disable=too-few-public-methods
+    """
+    Sampler for a pool of items with optional weights. With equal weights a draw
+    takes the same random numbers as random.choice, so existing challenge codes
+    create the same challenges.
+    """
+
+    __slots__ = ("items", "probabilities", "aliases")
+
+    def __init__(self, items, weights=None):
+        self.items = tuple(items)
+        if weights is None:
+            weights = [1] * len(self.items)
+        total = sum(weights)
+        if not self.items or total <= 0 or min(weights) < 0:
+            raise ValueError("The pool needs items with positive total weight")
+        scaled = [weight * len(self.items) / total for weight in weights]
+        self.probabilities = [1.0] * len(self.items)
+        self.aliases = list(range(len(self.items)))
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            small_index = small.pop()
+            large_index = large.pop()
+            self.probabilities[small_index] = scaled[small_index]
+            self.aliases[small_index] = large_index
+            scaled[large_index] += scaled[small_index] - 1
+            if scaled[large_index] < 1:
+                small.append(large_index)
+            else:
+                large.append(large_index)
+
+    def sample(self, rng: random.Random):
+        """
+        Draw one item
+        :param rng: Random number generator
+        :return: Drawn item
+        """
+        index = rng.randrange(len(self.items))
+        probability = self.probabilities[index]
+        if probability < 1.0 and rng.random() >= probability:
+            index = self.aliases[index]
+        return self.items[index]
+
+
+def weighted_sampler(items, weights: dict) -> AliasSampler:
+    """
+    Create the sampler of a pool, items without configured weight have weight 1
+    :param items: Items of the pool
+    :param weights: Optional weights by item
+    :return: Sampler of the pool
+    """
+    items = tuple(items)
+    if not weights:
+        return AliasSampler(items)
+    return AliasSampler(items, [weights.get(item, 1) for item in items])
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
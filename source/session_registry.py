@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Central registry for all open challenge sessions. The registry limits the number of
+live sessions, expires them with a single timer wheel and keeps the session store
+up to date.
+"""
+import time
+import asyncio
+from collections import OrderedDict
+from source import session_store
+from source.constants import (
+    MAX_LIVE_SESSIONS,
+    SESSION_WHEEL_SLOTS,
+    SESSION_WHEEL_TICK,
+)
+
+
+class ChallengeSession:  # pylint: disable=too-few-public-methods
+    """
+    Compact state of a session of a challenge view
+    """
+
+    __slots__ = ("session_id", "kind", "user", "expires", "view")
+
+    def __init__(self, session_id: str, kind: str, user, expires: float):
+        self.session_id = session_id
+        self.kind = kind
+        self.user = user
+        self.expires = expires
+        self.view = None
+
+    def to_dict(self) -> dict:
+        """
+        Create the serializable state of the session for the session store
+        :return: State of the session
+        """
+        return {
+            "session_id": self.session_id,
+            "kind": self.kind,
+            "user": list(self.user),
+            "expires": self.expires,
+        }
+
+
+class StreamChallengeSession(  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    ChallengeSession
+):
+    """
+    Compact state of a session to create a stream challenge
+    """
+
+    __slots__ = (
+        "challenge_points",
+        "start_location",
+        "negative_trait_1",
+        "negative_trait_2",
+        "negative_trait_3",
+        "prohibitions",
+        "mission",
+        "choices_valid",
+    )
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self, session_id: str, kind: str, user, expires: float, challenge_points: int
+    ):
+        super().__init__(session_id, kind, user, expires)
+        self.challenge_points = challenge_points
+        self.start_location = None
+        self.negative_trait_1 = None
+        self.negative_trait_2 = None
+        self.negative_trait_3 = None
+        self.prohibitions = None
+        self.mission = None
+        self.choices_valid = True
+
+    def to_dict(self) -> dict:
+        session = super().to_dict()
+        for name in StreamChallengeSession.__slots__:
+            session[name] = getattr(self, name)
+        return session
+
+
+def session_from_dict(session: dict, user_class) -> ChallengeSession:
+    """
+    Create a session object from the state in the session store
+    :param session: State of the session
+    :param user_class: Class to create the user of the session
+    :return: Session object
+    """
+    user = user_class(*session["user"])
+    if "challenge_points" not in session:
+        return ChallengeSession(
+            session["session_id"], session["kind"], user, session["expires"]
+        )
+    stream_session = StreamChallengeSession(
+        session["session_id"],
+        session["kind"],
+        user,
+        session["expires"],
+        session["challenge_points"],
+    )
+    for name in StreamChallengeSession.__slots__:
+        setattr(stream_session, name, session[name])
+    return stream_session
+
+
+class SessionRegistry:  # pylint: disable=too-many-instance-attributes
+    """
+    Registry of all live sessions with least recently used eviction and a timer
+    wheel for the expiry of the sessions.
+    """
+
+    def __init__(
+        self,
+        max_sessions=MAX_LIVE_SESSIONS,
+        wheel_slots=SESSION_WHEEL_SLOTS,
+        tick=SESSION_WHEEL_TICK,
+    ):
+        self.max_sessions = max_sessions
+        self.store = session_store
+        self.tick = tick
+        self.sessions = OrderedDict()
+        self.wheel = [set() for _ in range(wheel_slots)]
+        self.wheel_task = None
+        self.last_tick = int(time.time() // tick)
+        self.counters = {"created": 0, "expired": 0, "evicted": 0}
+
+    def statistics(self) -> dict:
+        """
+        Counters of the registry for monitoring
+        :return: Live, created, expired and evicted sessions
+        """
+        return {"live": len(self.sessions), **self.counters}
+
+    def wheel_slot(self, expires: float) -> set:
+        """
+        Get the slot of the timer wheel for an expiry time. The session is placed in
+        the first slot which starts after its expiry time.
+        :param expires: Expiry time of the session
+        :return: Set of session ids in this slot
+        """
+        return self.wheel[(int(expires // self.tick) + 1) % len(self.wheel)]
+
+    def add(self, session: ChallengeSession) -> None:
+        """
+        Register a new or restored session and evict the least recently used
+        sessions if the limit is reached.
+        :param session: Session to register
+        :return: None
+        """
+        if self.wheel_task is None:
+            self.wheel_task = asyncio.get_running_loop().create_task(self.run_wheel())
+        while len(self.sessions) >= self.max_sessions:
+            _, evicted_session = self.sessions.popitem(last=False)
+            self.counters["evicted"] += 1
+            self.discard(evicted_session)
+        self.sessions[session.session_id] = session
+        self.wheel_slot(session.expires).add(session.session_id)
+        self.counters["created"] += 1
+
+    def touch(self, session: ChallengeSession) -> None:
+        """
+        Mark a session as recently used
+        :param session: Used session
+        :return: None
+        """
+        if session.session_id in self.sessions:
+            self.sessions.move_to_end(session.session_id)
+
+    def persist(self, session: ChallengeSession) -> None:
+        """
+        Write the current state of a session to the session store
+        :param session: Session to store
+        :return: None
+        """
+        self.store.save_session(session.session_id, session.to_dict())
+
+    def remove(self, session: ChallengeSession) -> None:
+        """
+        Remove a finished session from the registry and the session store
+        :param session: Finished session
+        :return: None
+        """
+        self.sessions.pop(session.session_id, None)
+        self.wheel_slot(session.expires).discard(session.session_id)
+        self.store.delete_session(session.session_id)
+
+    def discard(self, session: ChallengeSession) -> None:
+        """
+        Drop an expired or evicted session and stop its view
+        :param session: Session to drop
+        :return: None
+        """
+        self.wheel_slot(session.expires).discard(session.session_id)
+        self.store.delete_session(session.session_id)
+        if session.view is not None:
+            session.view.stop()
+            session.view = None
+
+    def expire(self, now: float) -> None:
+        """
+        Expire all sessions of the wheel slots passed since the last tick which
+        reached their expiry time
+        :param now: Current time
+        :return: None
+        """
+        current_tick = int(now // self.tick)
+        first_tick = max(self.last_tick + 1, current_tick - len(self.wheel) + 1)
+        for tick in range(first_tick, current_tick + 1):
+            slot = self.wheel[tick % len(self.wheel)]
+            for session_id in list(slot):
+                session = self.sessions.get(session_id)
+                if session is None:
+                    slot.discard(session_id)
+                elif session.expires <= now:
+                    del self.sessions[session_id]
+                    self.counters["expired"] += 1
+                    self.discard(session)
+        self.last_tick = current_tick
+
+    async def run_wheel(self) -> None:
+        """
+        Turn the timer wheel one slot per tick
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.tick)
+            self.expire(time.time())
+
+
+session_registry = SessionRegistry()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
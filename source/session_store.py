@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local store for the state of open challenge sessions, so the views can be restored
+after a restart of the bot.
+"""
+import os
+import json
+import time
+import uuid
+from source.constants import SESSION_STORE_PATH
+
+
+def new_session_id() -> str:
+    """
+    Create a short unique id for a new session
+    :return: Session id as string
+    """
+    return uuid.uuid4().hex[:12]
+
+
+def save_session(session_id: str, session: dict) -> None:
+    """
+    Write the state of a session to the store. The file is replaced atomically, so a
+    crash during writing never leaves a broken session behind.
+    :param session_id: Id of the session
+    :param session: Serializable state of the session
+    :return: None
+    """
+    os.makedirs(SESSION_STORE_PATH, exist_ok=True)
+    session_path = os.path.join(SESSION_STORE_PATH, session_id + ".json")
+    temp_path = session_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(session, file, ensure_ascii=False)
+    os.replace(temp_path, session_path)
+
+
+def delete_session(session_id: str) -> None:
+    """
+    Remove a finished or expired session from the store
+    :param session_id: Id of the session
+    :return: None
+    """
+    try:
+        os.remove(os.path.join(SESSION_STORE_PATH, session_id + ".json"))
+    except FileNotFoundError:
+        pass
+
+
+def load_session(session_id: str) -> dict:
+    """
+    Load a single session, if it is not expired
+    :param session_id: Id of the session
+    :return: State of the session, None if it is unknown or expired
+    """
+    if not session_id.isalnum():
+        return None
+    try:
+        with open(
+            os.path.join(SESSION_STORE_PATH, session_id + ".json"), encoding="utf-8"
+        ) as file:
+            session = json.load(file)
+    except FileNotFoundError:
+        return None
+    return session if session["expires"] > time.time() else None
+
+
+def load_sessions() -> list:
+    """
+    Load all sessions which are not expired and remove the expired ones from the store
+    :return: List of session states
+    """
+    if not os.path.isdir(SESSION_STORE_PATH):
+        return []
+    now = time.time()
+    sessions = []
+    for file_name in os.listdir(SESSION_STORE_PATH):
+        if not file_name.endswith(".json"):
+            continue
+        with open(
+            os.path.join(SESSION_STORE_PATH, file_name), encoding="utf-8"
+        ) as file:
+            session = json.load(file)
+        if session["expires"] <= now:
+            delete_session(session["session_id"])
+            continue
+        sessions.append(session)
+    return sessions
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
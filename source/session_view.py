@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Base class of the persistent views of the challenge sessions
+"""
+import time
+import discord
+from source.session_store import new_session_id
+from source.session_registry import (
+    ChallengeSession,
+    session_from_dict,
+    session_registry,
+)
+from source.game_settings import User
+from source.event_log import set_correlation_id
+
+
+class SessionView(discord.ui.View):
+    """
+    Base class for persistent views of a challenge session. The session is held by
+    the session registry, which expires it and writes its state to the session store,
+    so the view can be restored after a restart.
+    """
+
+    kind = "session"
+
+    def __init__(self, session: ChallengeSession):
+        super().__init__(timeout=None)
+        self.session = session
+        self.user = session.user
+        self.user_id = session.user.user_id
+        session.view = self
+        session_registry.add(session)
+
+    @classmethod
+    def new_session(cls, user, session_timeout: int) -> ChallengeSession:
+        """
+        Create the session for a new view of this kind
+        :param user: Requested user
+        :param session_timeout: Time in seconds until the session expires
+        :return: New session
+        """
+        return ChallengeSession(
+            new_session_id(), cls.kind, user, time.time() + session_timeout
+        )
+
+    def custom_id(self, name: str) -> str:
+        """
+        Create a stable custom id for a component of this session
+        :param name: Name of the component
+        :return: Custom id as string
+        """
+        return f"{self.kind}:{self.session.session_id}:{name}"
+
+    async def interaction_check(  # pylint: disable=arguments-differ
+        self, interaction: discord.Interaction
+    ) -> bool:
+        set_correlation_id(self.session.session_id)
+        session_registry.touch(self.session)
+        return True
+
+    def persist(self) -> None:
+        """
+        Write the current state of the session to the session store
+        :return: None
+        """
+        session_registry.persist(self.session)
+
+    def close_session(self) -> None:
+        """
+        Finish the session and remove it from the registry and the session store
+        :return: None
+        """
+        session_registry.remove(self.session)
+        self.session.view = None
+        self.stop()
+
+
+async def resume_session(
+    interaction: discord.Interaction, views: dict, backend
+) -> bool:
+    """
+    Resume a session which is not in the registry, because it was created or restored
+    by another instance. The session is loaded from the state backend, its view is
+    added to the client and the interaction is dispatched to the component of the view.
+    :param interaction: Interaction which was not handled by a view of this instance
+    :param views: View class of every session kind
+    :param backend: Asynchronous state backend with the sessions
+    :return: True if the session was resumed, False if it is unknown or expired
+    """
+    if interaction.type != discord.InteractionType.component:
+        return False
+    custom_id = interaction.data.get("custom_id", "")
+    kind, _, session_id = custom_id.rpartition(":")[0].partition(":")
+    if kind not in views or session_id in session_registry.sessions:
+        return False
+    state = await backend.load_session(session_id)
+    if state is None:
+        return False
+    view = views[kind](session_from_dict(state, User))
+    interaction.client.add_view(view)
+    for item in view.children:
+        if getattr(item, "custom_id", None) == custom_id:
+            # The view store of discord.py 2.3 dispatched before the view was added
+            view._dispatch_item(item, interaction)  # pylint: disable=protected-access
+    return True
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
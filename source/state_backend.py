@@ -0,0 +1,782 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared state of the bot instances. The backend holds the open sessions, the values
+of the configuration which change at runtime, the challenge sequences and the leases
+for the leader election of singleton jobs. The file backend keeps the state of a
+single instance in the session store and the configuration file, the SQLite backend
+shares it between the instances of a host and the remote backend talks to a state
+server, which is a stand-in for a networked store in tests. The bot uses the backend
+through the async wrapper, which keeps the blocking calls off the event loop.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+import contextlib
+from source import session_store
+from source.game_settings import config, write_config
+from source.profiling import run_in_worker
+from source.event_log import log_event
+from source.constants import STATE_DATABASE_FILE, STATE_RETRY_DELAY
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "file").lower()
+STATE_SERVER = os.getenv("STATE_SERVER", "127.0.0.1:8765")
+INSTANCE_ID = os.getenv("INSTANCE_ID", uuid.uuid4().hex[:12])
+STATE_ERRORS = (OSError, ValueError, RuntimeError, sqlite3.Error)
+STATE_OPERATIONS = frozenset(
+    {
+        "save_session",
+        "delete_session",
+        "load_session",
+        "load_sessions",
+        "get_value",
+        "set_value",
+        "next_sequence",
+        "acquire_lease",
+        "release_lease",
+    }
+)
+CONFIG_OPERATIONS = frozenset(
+    {"get_value", "set_value", "next_sequence", "acquire_lease", "release_lease"}
+)
+
+
+class FileStateBackend:
+    """
+    State of a single instance in the session store and the configuration file. The
+    configuration calls run on the event loop, because the configuration is shared
+    with the rest of the bot. The session files are written in a worker thread.
+    """
+
+    loop_operations = CONFIG_OPERATIONS
+    save_session = staticmethod(session_store.save_session)
+    delete_session = staticmethod(session_store.delete_session)
+    load_session = staticmethod(session_store.load_session)
+    load_sessions = staticmethod(session_store.load_sessions)
+
+    @staticmethod
+    def get_value(key: str, default=None):
+        """
+        Get a value of the shared state
+        :param key: Key of the value
+        :param default: Value if the key is not set
+        :return: Stored value
+        """
+        return config.get(key, default)
+
+    @staticmethod
+    def set_value(key: str, value) -> None:
+        """
+        Set a value of the shared state
+        :param key: Key of the value
+        :param value: Serializable value
+        :return: None
+        """
+        write_config(key, value)
+
+    @staticmethod
+    def next_sequence(name: str) -> int:
+        """
+        Get the next number of a sequence
+        :param name: Name of the sequence
+        :return: Next number
+        """
+        value = config.get(name, 0) + 1
+        write_config(name, value)
+        return value
+
+    @staticmethod
+    def acquire_lease(_job: str, _owner: str, _ttl: float) -> bool:
+        """
+        Acquire or renew the lease of a singleton job, a single instance is always
+        the leader
+        :return: True
+        """
+        return True
+
+    @staticmethod
+    def release_lease(_job: str, _owner: str) -> None:
+        """
+        Release the lease of a singleton job, a single instance has nothing to release
+        :return: None
+        """
+
+
+class MemoryStateBackend:
+    """
+    State in memory, used by the state server
+    """
+
+    loop_operations = STATE_OPERATIONS
+
+    def __init__(self):
+        self.sessions = {}
+        self.values = {}
+        self.sequences = {}
+        self.leases = {}
+
+    def save_session(self, session_id: str, session: dict) -> None:
+        """
+        Write the state of a session
+        :param session_id: Id of the session
+        :param session: Serializable state of the session
+        :return: None
+        """
+        self.sessions[session_id] = session
+
+    def delete_session(self, session_id: str) -> None:
+        """
+        Remove a finished or expired session
+        :param session_id: Id of the session
+        :return: None
+        """
+        self.sessions.pop(session_id, None)
+
+    def load_session(self, session_id: str) -> dict:
+        """
+        Load a single session, if it is not expired
+        :param session_id: Id of the session
+        :return: State of the session, None if it is unknown or expired
+        """
+        session = self.sessions.get(session_id)
+        if session is None or session["expires"] <= time.time():
+            return None
+        return session
+
+    def load_sessions(self) -> list:
+        """
+        Load all sessions which are not expired and remove the expired ones
+        :return: List of session states
+        """
+        now = time.time()
+        for session_id, session in list(self.sessions.items()):
+            if session["expires"] <= now:
+                del self.sessions[session_id]
+        return list(self.sessions.values())
+
+    def get_value(self, key: str, default=None):
+        """
+        Get a value of the shared state
+        :param key: Key of the value
+        :param default: Value if the key is not set
+        :return: Stored value
+        """
+        return self.values.get(key, default)
+
+    def set_value(self, key: str, value) -> None:
+        """
+        Set a value of the shared state
+        :param key: Key of the value
+        :param value: Serializable value
+        :return: None
+        """
+        self.values[key] = value
+
+    def next_sequence(self, name: str) -> int:
+        """
+        Get the next number of a sequence
+        :param name: Name of the sequence
+        :return: Next number
+        """
+        self.sequences[name] = self.sequences.get(name, config.get(name, 0)) + 1
+        return self.sequences[name]
+
+    def acquire_lease(self, job: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew the lease of a singleton job
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :param ttl: Duration of the lease in seconds
+        :return: True if the instance holds the lease
+        """
+        now = time.time()
+        holder = self.leases.get(job)
+        if holder is not None and holder[0] != owner and holder[1] > now:
+            return False
+        self.leases[job] = (owner, now + ttl)
+        return True
+
+    def release_lease(self, job: str, owner: str) -> None:
+        """
+        Release the lease of a singleton job, if the instance holds it
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :return: None
+        """
+        if self.leases.get(job, (None,))[0] == owner:
+            del self.leases[job]
+
+
+class SQLiteStateBackend:
+    """
+    State in a SQLite database, shared by all instances of a host. Sequences and
+    leases are changed in immediate transactions, so they are atomic between the
+    processes.
+    """
+
+    loop_operations = frozenset()
+
+    def __init__(self, database_file: str = STATE_DATABASE_FILE):
+        self.database_file = database_file
+        os.makedirs(os.path.dirname(database_file) or ".", exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, state TEXT, expires REAL);"
+                "CREATE TABLE IF NOT EXISTS state_values (key TEXT PRIMARY KEY, value TEXT);"
+                "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER);"
+                "CREATE TABLE IF NOT EXISTS leases "
+                "(job TEXT PRIMARY KEY, owner TEXT, expires REAL);"
+            )
+
+    @contextlib.contextmanager
+    def connect(self):
+        """
+        Open a connection to the database, it is closed after use
+        :return: Connection in autocommit mode
+        """
+        connection = sqlite3.connect(
+            self.database_file, timeout=10, isolation_level=None
+        )
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def save_session(self, session_id: str, session: dict) -> None:
+        """
+        Write the state of a session
+        :param session_id: Id of the session
+        :param session: Serializable state of the session
+        :return: None
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (session_id, json.dumps(session), session["expires"]),
+            )
+
+    def delete_session(self, session_id: str) -> None:
+        """
+        Remove a finished or expired session
+        :param session_id: Id of the session
+        :return: None
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+
+    def load_session(self, session_id: str) -> dict:
+        """
+        Load a single session, if it is not expired
+        :param session_id: Id of the session
+        :return: State of the session, None if it is unknown or expired
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT state FROM sessions WHERE session_id = ? AND expires > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def load_sessions(self) -> list:
+        """
+        Load all sessions which are not expired and remove the expired ones
+        :return: List of session states
+        """
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+            rows = connection.execute("SELECT state FROM sessions").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_value(self, key: str, default=None):
+        """
+        Get a value of the shared state
+        :param key: Key of the value
+        :param default: Value if the key is not set
+        :return: Stored value
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT value FROM state_values WHERE key = ?", (key,)
+            ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_value(self, key: str, value) -> None:
+        """
+        Set a value of the shared state
+        :param key: Key of the value
+        :param value: Serializable value
+        :return: None
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO state_values VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def next_sequence(self, name: str) -> int:
+        """
+        Get the next number of a sequence. A new sequence continues the number of
+        the configuration file.
+        :param name: Name of the sequence
+        :return: Next number
+        """
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR IGNORE INTO sequences VALUES (?, ?)",
+                (name, config.get(name, 0)),
+            )
+            connection.execute(
+                "UPDATE sequences SET value = value + 1 WHERE name = ?", (name,)
+            )
+            value = connection.execute(
+                "SELECT value FROM sequences WHERE name = ?", (name,)
+            ).fetchone()[0]
+            connection.execute("COMMIT")
+        return value
+
+    def acquire_lease(self, job: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew the lease of a singleton job
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :param ttl: Duration of the lease in seconds
+        :return: True if the instance holds the lease
+        """
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT owner, expires FROM leases WHERE job = ?", (job,)
+            ).fetchone()
+            acquired = row is None or row[0] == owner or row[1] <= now
+            if acquired:
+                connection.execute(
+                    "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+                    (job, owner, now + ttl),
+                )
+            connection.execute("COMMIT")
+        return acquired
+
+    def release_lease(self, job: str, owner: str) -> None:
+        """
+        Release the lease of a singleton job, if the instance holds it
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :return: None
+        """
+        with self.connect() as connection:
+            connection.execute(
+                "DELETE FROM leases WHERE job = ? AND owner = ?", (job, owner)
+            )
+
+
+class RemoteStateBackend:
+    """
+    Client of the state server, every operation is one JSON line request
+    """
+
+    loop_operations = frozenset()
+
+    def __init__(self, address: str = STATE_SERVER):
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def call(self, operation: str, *args):
+        """
+        Run an operation on the state server, the connection is opened again if it
+        was closed
+        :param operation: Name of the backend method
+        :param args: Arguments of the method
+        :return: Result of the method
+        """
+        request = json.dumps({"op": operation, "args": args}).encode("utf-8") + b"\n"
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.connection is None:
+                        self.connection = socket.create_connection(
+                            self.address, timeout=5
+                        ).makefile("rwb")
+                    self.connection.write(request)
+                    self.connection.flush()
+                    response = json.loads(self.connection.readline())
+                    break
+                except (OSError, ValueError):
+                    self.connection = None
+                    if attempt == 1:
+                        raise
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def save_session(self, session_id: str, session: dict) -> None:
+        """
+        Write the state of a session
+        :param session_id: Id of the session
+        :param session: Serializable state of the session
+        :return: None
+        """
+        self.call("save_session", session_id, session)
+
+    def delete_session(self, session_id: str) -> None:
+        """
+        Remove a finished or expired session
+        :param session_id: Id of the session
+        :return: None
+        """
+        self.call("delete_session", session_id)
+
+    def load_session(self, session_id: str) -> dict:
+        """
+        Load a single session, if it is not expired
+        :param session_id: Id of the session
+        :return: State of the session, None if it is unknown or expired
+        """
+        return self.call("load_session", session_id)
+
+    def load_sessions(self) -> list:
+        """
+        Load all sessions which are not expired
+        :return: List of session states
+        """
+        return self.call("load_sessions")
+
+    def get_value(self, key: str, default=None):
+        """
+        Get a value of the shared state
+        :param key: Key of the value
+        :param default: Value if the key is not set
+        :return: Stored value
+        """
+        return self.call("get_value", key, default)
+
+    def set_value(self, key: str, value) -> None:
+        """
+        Set a value of the shared state
+        :param key: Key of the value
+        :param value: Serializable value
+        :return: None
+        """
+        self.call("set_value", key, value)
+
+    def next_sequence(self, name: str) -> int:
+        """
+        Get the next number of a sequence
+        :param name: Name of the sequence
+        :return: Next number
+        """
+        return self.call("next_sequence", name)
+
+    def acquire_lease(self, job: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew the lease of a singleton job
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :param ttl: Duration of the lease in seconds
+        :return: True if the instance holds the lease
+        """
+        return self.call("acquire_lease", job, owner, ttl)
+
+    def release_lease(self, job: str, owner: str) -> None:
+        """
+        Release the lease of a singleton job, if the instance holds it
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :return: None
+        """
+        self.call("release_lease", job, owner)
+
+
+class StateServer:
+    """
+    State server for the remote backend, stand-in for a networked store in tests
+    """
+
+    operations = STATE_OPERATIONS
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryStateBackend()
+
+    async def handle(self, reader, writer) -> None:
+        """
+        Answer the requests of one client connection
+        :param reader: Stream of the requests
+        :param writer: Stream of the responses
+        :return: None
+        """
+        while line := await reader.readline():
+            request = json.loads(line)
+            if request["op"] in self.operations:
+                result = getattr(self.backend, request["op"])(*request["args"])
+                response = {"result": result}
+            else:
+                response = {"error": f"unknown operation {request['op']}"}
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, address: str = STATE_SERVER) -> None:
+        """
+        Run the state server
+        :param address: Host and port of the server
+        :return: None
+        """
+        host, port = address.rsplit(":", 1)
+        server = await asyncio.start_server(self.handle, host, int(port))
+        async with server:
+            await server.serve_forever()
+
+
+def create_state_backend(backend: str = STATE_BACKEND):
+    """
+    Create the configured state backend
+    :param backend: Name of the backend, file, sqlite or remote
+    :return: State backend
+    """
+    if backend == "sqlite":
+        return SQLiteStateBackend()
+    if backend == "remote":
+        return RemoteStateBackend()
+    return FileStateBackend()
+
+
+class AsyncStateBackend:
+    """
+    Non-blocking access to a state backend. The calls of the SQLite and the remote
+    backend run in a worker thread, so a slow backend does not block the event loop.
+    A failed call is logged and answered with a fallback value, so an outage of the
+    backend never raises in an interaction. Session writes are queued and written by
+    a single background writer, the latest state of a session wins.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.pending = {}
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.writer_task = None
+        self.counters = {"failed": 0, "retried": 0}
+
+    async def run(self, operation: str, *args):
+        """
+        Run an operation of the backend, in a worker thread if the backend does not
+        run it on the event loop
+        :param operation: Name of the backend method
+        :param args: Arguments of the method
+        :return: Result of the method
+        """
+        method = getattr(self.backend, operation)
+        if operation in self.backend.loop_operations:
+            return method(*args)
+        return await run_in_worker(method, *args)
+
+    async def call(self, operation: str, *args, fallback=None):
+        """
+        Run an operation of the backend, a failure is logged
+        :param operation: Name of the backend method
+        :param args: Arguments of the method
+        :param fallback: Result if the operation failed
+        :return: Result of the method or the fallback
+        """
+        try:
+            return await self.run(operation, *args)
+        except STATE_ERRORS as error:
+            self.counters["failed"] += 1
+            log_event(
+                "state_backend_failed",
+                logging.WARNING,
+                operation=operation,
+                error=repr(error),
+            )
+            return fallback
+
+    async def get_value(self, key: str, default=None):
+        """
+        Get a value of the shared state
+        :param key: Key of the value
+        :param default: Value if the key is not set or the backend failed
+        :return: Stored value
+        """
+        return await self.call("get_value", key, default, fallback=default)
+
+    async def set_value(self, key: str, value) -> bool:
+        """
+        Set a value of the shared state
+        :param key: Key of the value
+        :param value: Serializable value
+        :return: True if the value was written
+        """
+        return await self.call("set_value", key, value, fallback=False) is None
+
+    async def next_sequence(self, name: str) -> int:
+        """
+        Get the next number of a sequence. If the backend failed, the local counter
+        of the configuration is continued.
+        :param name: Name of the sequence
+        :return: Next number
+        """
+        value = await self.call("next_sequence", name)
+        if value is None:
+            value = config.get(name, 0) + 1
+            config[name] = value
+        return value
+
+    async def acquire_lease(self, job: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew the lease of a singleton job. If the backend failed, the
+        lease is not acquired.
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :param ttl: Duration of the lease in seconds
+        :return: True if the instance holds the lease
+        """
+        return await self.call("acquire_lease", job, owner, ttl, fallback=False)
+
+    async def release_lease(self, job: str, owner: str) -> None:
+        """
+        Release the lease of a singleton job, if the instance holds it. If the
+        backend failed, the lease expires with its duration.
+        :param job: Name of the job
+        :param owner: Id of the instance
+        :return: None
+        """
+        await self.call("release_lease", job, owner)
+
+    async def load_session(self, session_id: str) -> dict:
+        """
+        Load a single session, which may be created or changed by another instance
+        :param session_id: Id of the session
+        :return: State of the session, None if it is unknown, expired or the backend
+            failed
+        """
+        return await self.call("load_session", session_id)
+
+    async def load_sessions(self) -> list:
+        """
+        Load all sessions which are not expired
+        :return: List of session states, empty if the backend failed
+        """
+        return await self.call("load_sessions", fallback=[])
+
+    def save_session(self, session_id: str, session: dict) -> None:
+        """
+        Queue the write of the state of a session
+        :param session_id: Id of the session
+        :param session: Serializable state of the session
+        :return: None
+        """
+        self.queue_write(session_id, session)
+
+    def delete_session(self, session_id: str) -> None:
+        """
+        Queue the removal of a finished or expired session
+        :param session_id: Id of the session
+        :return: None
+        """
+        self.queue_write(session_id, None)
+
+    def queue_write(self, session_id: str, session: dict) -> None:
+        """
+        Queue a session write and start the writer
+        :param session_id: Id of the session
+        :param session: State of the session, None to remove it
+        :return: None
+        """
+        self.pending[session_id] = session
+        self.wakeup.set()
+        if self.writer_task is None:
+            self.writer_task = asyncio.get_running_loop().create_task(self.run_writer())
+
+    async def write_sessions(self) -> bool:
+        """
+        Write the queued sessions. A failed write is queued again, if the session
+        was not changed in the meantime.
+        :return: True if all writes succeeded
+        """
+        writes, self.pending = self.pending, {}
+        successful = True
+        for session_id, session in writes.items():
+            try:
+                if session is None:
+                    await self.run("delete_session", session_id)
+                else:
+                    await self.run("save_session", session_id, session)
+            except STATE_ERRORS as error:
+                successful = False
+                self.counters["failed"] += 1
+                self.pending.setdefault(session_id, session)
+                log_event(
+                    "state_session_write_failed",
+                    logging.WARNING,
+                    session_id=session_id,
+                    error=repr(error),
+                )
+        return successful
+
+    async def run_writer(self) -> None:
+        """
+        Write the queued sessions in the background, failed writes are retried
+        after a delay. The writer ends after the current writes, when the backend
+        is closed.
+        :return: None
+        """
+        while not self.stopping.is_set():
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if await self.write_sessions() or self.stopping.is_set():
+                continue
+            self.counters["retried"] += 1
+            try:
+                await asyncio.wait_for(self.stopping.wait(), STATE_RETRY_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.set()
+
+    async def close(self) -> None:
+        """
+        Stop the writer after its current writes and write the queued sessions a
+        last time
+        :return: None
+        """
+        self.stopping.set()
+        self.wakeup.set()
+        if self.writer_task is not None:
+            await self.writer_task
+            self.writer_task = None
+        if self.pending:
+            await self.write_sessions()
+
+    def statistics(self) -> dict:
+        """
+        Counters of the backend for monitoring
+        :return: Queued session writes, failed calls and retries
+        """
+        return {"queued": len(self.pending), **self.counters}
+
+
+state_backend = AsyncStateBackend(create_state_backend())
+
+
+def main() -> None:
+    """
+    Run the state server as stand-in for the remote backend
+    :return: None
+    """
+    asyncio.run(StateServer().serve())
+
+
+if __name__ == "__main__":
+    main()
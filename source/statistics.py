@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Statistics of the selected and generated challenge elements. All counters are
+updated with every challenge, so requests are answered from the aggregates without
+scanning the history.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from source.profiling import run_in_worker
+from source.event_log import log_event
+from source.constants import (
+    STATISTICS_FILE,
+    STATISTICS_BUCKET_SECONDS,
+    STATISTICS_FLUSH_INTERVAL,
+)
+
+STATISTICS_PERIODS = {"day": 24, "week": 7 * 24, "month": 30 * 24}
+
+
+def write_statistics(state: str) -> None:
+    """
+    Write the statistics atomically to the statistics file, runs in a worker thread
+    :param state: Statistics as JSON document
+    :return: None
+    """
+    os.makedirs(os.path.dirname(STATISTICS_FILE), exist_ok=True)
+    temp_path = STATISTICS_FILE + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(state)
+    os.replace(temp_path, STATISTICS_FILE)
+
+
+class ChallengeStatistics:
+    """
+    Counters of challenge elements for all time and for rolling periods. The
+    periods are built from hourly buckets, every period total is updated when a
+    bucket is added or leaves the period.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.buckets = {}
+        self.period_totals = {period: {} for period in STATISTICS_PERIODS}
+        self.period_start = {period: None for period in STATISTICS_PERIODS}
+        self.changes = 0
+        self.flushed_changes = 0
+
+    @staticmethod
+    def current_bucket() -> int:
+        """
+        Get the number of the current time bucket
+        :return: Bucket number
+        """
+        return int(time.time() // STATISTICS_BUCKET_SECONDS)
+
+    def advance(self, bucket: int) -> None:
+        """
+        Remove the counts of buckets which left a period from the period totals and
+        drop buckets which are older than the longest period
+        :param bucket: Current bucket number
+        :return: None
+        """
+        for period, length in STATISTICS_PERIODS.items():
+            start = bucket - length + 1
+            old_start = self.period_start[period]
+            if old_start is not None:
+                for old_bucket in range(old_start, min(start, old_start + length)):
+                    for key, counts in self.buckets.get(old_bucket, {}).items():
+                        self.period_totals[period][key].subtract(counts)
+                        self.period_totals[period][key] += Counter()
+            self.period_start[period] = start
+        oldest_bucket = bucket - max(STATISTICS_PERIODS.values()) + 1
+        for old_bucket in [
+            element for element in self.buckets if element < oldest_bucket
+        ]:
+            del self.buckets[old_bucket]
+
+    def add(self, key: str, elements: list, bucket: int) -> None:
+        """
+        Count the elements in all time, the bucket and the period totals
+        :param key: Source and category, e.g. stream:traits
+        :param elements: Selected or generated elements
+        :param bucket: Bucket number
+        :return: None
+        """
+        counts = Counter(elements)
+        self.totals.setdefault(key, Counter()).update(counts)
+        self.buckets.setdefault(bucket, {}).setdefault(key, Counter()).update(counts)
+        for period_total in self.period_totals.values():
+            period_total.setdefault(key, Counter()).update(counts)
+
+    def record(self, source: str, location: str, traits: list, mission: str) -> None:
+        """
+        Record the elements of a generated or approved challenge
+        :param source: custom or stream
+        :param location: Start location
+        :param traits: All traits of the challenge
+        :param mission: Mission of the challenge
+        :return: None
+        """
+        bucket = self.current_bucket()
+        if self.period_start["day"] != bucket - STATISTICS_PERIODS["day"] + 1:
+            self.advance(bucket)
+        self.add(f"{source}:locations", [location], bucket)
+        self.add(f"{source}:traits", traits, bucket)
+        self.add(f"{source}:missions", [mission], bucket)
+        self.changes += 1
+
+    def top(self, source: str, category: str, period: str, count: int) -> list:
+        """
+        Get the most used elements of a category
+        :param source: custom or stream
+        :param category: locations, traits or missions
+        :param period: day, week, month or all
+        :param count: Number of elements
+        :return: List of elements with their counts
+        """
+        key = f"{source}:{category}"
+        if period == "all":
+            return self.totals.get(key, Counter()).most_common(count)
+        bucket = self.current_bucket()
+        if self.period_start["day"] != bucket - STATISTICS_PERIODS["day"] + 1:
+            self.advance(bucket)
+        return self.period_totals[period].get(key, Counter()).most_common(count)
+
+    def to_dict(self) -> dict:
+        """
+        Create the serializable state of the statistics
+        :return: All time totals and the buckets
+        """
+        return {
+            "totals": self.totals,
+            "buckets": {str(bucket): keys for bucket, keys in self.buckets.items()},
+        }
+
+    def load(self) -> None:
+        """
+        Restore the statistics from the statistics file and rebuild the period totals
+        :return: None
+        """
+        if not os.path.isfile(STATISTICS_FILE):
+            return
+        with open(STATISTICS_FILE, encoding="utf-8") as file:
+            state = json.load(file)
+        self.totals = {key: Counter(counts) for key, counts in state["totals"].items()}
+        bucket = self.current_bucket()
+        for bucket_number, keys in state["buckets"].items():
+            self.buckets[int(bucket_number)] = {
+                key: Counter(counts) for key, counts in keys.items()
+            }
+        for period, length in STATISTICS_PERIODS.items():
+            self.period_start[period] = bucket - length + 1
+            for bucket_number, keys in self.buckets.items():
+                if bucket_number < self.period_start[period]:
+                    continue
+                for key, counts in keys.items():
+                    self.period_totals[period].setdefault(key, Counter()).update(counts)
+        self.advance(bucket)
+
+    async def flush(self) -> None:
+        """
+        Write changed statistics to the statistics file. The JSON document is
+        created on the event loop, so the counters are not changed while they are
+        serialized, and only the file is written in a worker thread. The statistics
+        stay changed until the write succeeded.
+        :return: None
+        """
+        changes = self.changes
+        if changes == self.flushed_changes:
+            return
+        state = json.dumps(self.to_dict(), ensure_ascii=False)
+        await run_in_worker(write_statistics, state)
+        self.flushed_changes = changes
+
+    async def run_flush(self) -> None:
+        """
+        Write changed statistics periodically, a failed write is tried again with
+        the next flush
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(STATISTICS_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                log_event("statistics_flush_failed", logging.ERROR, error=repr(error))
+
+    async def close(self) -> None:
+        """
+        Write the changed statistics a last time on shutdown
+        :return: None
+        """
+        try:
+            await self.flush()
+        except OSError as error:
+            log_event("statistics_flush_failed", logging.ERROR, error=repr(error))
+
+
+challenge_statistics = ChallengeStatistics()
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ Package provide all the function and settings to create stream challenges
 """
 import discord
 from source.game_settings import config, custom_config, stream_challenge_config
+from source.session_registry import StreamChallengeSession
 from source.constants import DEFAULT_SKIP_SELECTION, DEFAULT_SKIP_SELECTION_DESCRIPTION
 
 
@@ -34,13 +35,13 @@ def mission_value(selected_mission: list) -> int:
     return trait_sum
 
 
-def mission(game_settings: dict) -> list:
+def mission(game_settings: StreamChallengeSession) -> list:
     """
     Create a list for missions in selection
     :param game_settings: current game settings
     :return: Sorted list of missions in options
     """
-    challenge_points = game_settings["challenge_points"]
+    challenge_points = game_settings.challenge_points
     all_missions = stream_challenge_config["Mission"]
     all_possible_missions = []
     for key in all_missions:
@@ -59,14 +60,14 @@ def mission(game_settings: dict) -> list:
     return [element[1] for element in sorted_missions]
 
 
-def negative_trait_three(game_settings: dict) -> list:
+def negative_trait_three(game_settings: StreamChallengeSession) -> list:
     """
     Create a list for traits in selection three
     :param game_settings: current game settings
     :return: Sorted list of traits in options
     """
     selected_neg_traits_one_two = (
-        game_settings["negative_trait_1"] + game_settings["negative_trait_2"]
+        game_settings.negative_trait_1 + game_settings.negative_trait_2
     )
     all_neg_traits_three = stream_challenge_config["NegativePropertiesValueOptionThree"]
     trait_options_three = [[0, get_option_wildcard_for_selection()]]
@@ -88,7 +89,7 @@ def negative_trait_three(game_settings: dict) -> list:
             trait_description = custom_config["NegativePropertiesDescription"][key][:90]
         else:
             trait_description = "No description available"
-        if value <= game_settings["challenge_points"] and not temp_abort:
+        if value <= game_settings.challenge_points and not temp_abort:
             trait_options_three.append(
                 [
                     value,
@@ -101,13 +102,13 @@ def negative_trait_three(game_settings: dict) -> list:
     return [element[1] for element in sorted_traits_option_three]
 
 
-def negative_trait_two(game_settings: dict) -> list:
+def negative_trait_two(game_settings: StreamChallengeSession) -> list:
     """
     Create a list for traits in selection two
     :param game_settings: current game settings
     :return: Sorted list of traits in options
     """
-    selected_neg_traits_one = game_settings["negative_trait_1"]
+    selected_neg_traits_one = game_settings.negative_trait_1
     all_neg_traits_two = stream_challenge_config["NegativePropertiesValueOptionTwo"]
     trait_options_two = [[0, get_option_wildcard_for_selection()]]
 
@@ -128,7 +129,7 @@ def negative_trait_two(game_settings: dict) -> list:
             trait_description = custom_config["NegativePropertiesDescription"][key][:90]
         else:
             trait_description = "No description available"
-        if value <= game_settings["challenge_points"] and not temp_abort:
+        if value <= game_settings.challenge_points and not temp_abort:
             trait_options_two.append(
                 [
                     value,
@@ -141,7 +142,7 @@ def negative_trait_two(game_settings: dict) -> list:
     return [element[1] for element in sorted_traits_option_two]
 
 
-def negative_trait_one(game_settings: dict) -> list:
+def negative_trait_one(game_settings: StreamChallengeSession) -> list:
     """
     Create a list for trait in selection one
     :param game_settings: current game settings
@@ -161,7 +162,7 @@ def negative_trait_one(game_settings: dict) -> list:
             trait_description = custom_config["NegativePropertiesDescription"][key][:90]
         else:
             trait_description = "No description available"
-        if value <= game_settings["challenge_points"]:
+        if value <= game_settings.challenge_points:
             traits_option_one.append(
                 [
                     value,
@@ -189,6 +190,82 @@ def get_option_wildcard_for_selection() -> discord.SelectOption:
     return discord.SelectOption(label=selection, description=description)
 
 
+class MissionOption(discord.ui.Select):
+    """
+    Class to create a selection for the mission options
+    """
+
+    def __init__(self, session: StreamChallengeSession, custom_id: str):
+        mission_options = mission(session)
+        super().__init__(
+            options=mission_options,
+            placeholder="Select the mission for the challenge",
+            min_values=1,
+            max_values=1,
+            custom_id=custom_id,
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        await self.view.respond_to_mission_option(interaction, self.values)
+
+
+class NegativeTraitThree(discord.ui.Select):
+    """
+    Class to create a selection for the third negative traits
+    """
+
+    def __init__(self, session: StreamChallengeSession, custom_id: str):
+        trait_options = negative_trait_three(session)
+        super().__init__(
+            options=trait_options,
+            placeholder="Select the 3rd negative traits",
+            min_values=1,
+            max_values=len(trait_options),
+            custom_id=custom_id,
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        await self.view.respond_to_option_three(interaction, self.values)
+
+
+class NegativeTraitTwo(discord.ui.Select):
+    """
+    Class to create a selection for the second negative traits
+    """
+
+    def __init__(self, session: StreamChallengeSession, custom_id: str):
+        trait_options = negative_trait_two(session)
+        super().__init__(
+            options=trait_options,
+            placeholder="Select the 2nd negative traits",
+            min_values=1,
+            max_values=len(trait_options),
+            custom_id=custom_id,
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        await self.view.respond_to_option_two(interaction, self.values)
+
+
+class NegativeTraitOne(discord.ui.Select):
+    """
+    Class to create a selection for the first negative traits
+    """
+
+    def __init__(self, session: StreamChallengeSession, custom_id: str):
+        trait_options = negative_trait_one(session)
+        super().__init__(
+            options=trait_options,
+            placeholder="Select the 1st negative traits",
+            min_values=1,
+            max_values=len(trait_options),
+            custom_id=custom_id,
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        await self.view.respond_to_option_one(interaction, self.values)
+
+
 def main() -> None:
     """
     Scheduling function for regular call.
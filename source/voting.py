@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Viewer voting mode for stream challenges. The viewers vote on the start location, the
+three negative trait tiers and the mission in timed rounds. Every viewer has one
+ballot per round, a new vote replaces the old ballot. The tally is updated in place
+with each vote and the round message is edited at a fixed rate, not once per vote.
+"""
+import time
+import random
+import asyncio
+from collections import Counter
+import discord
+from source.game_settings import User, stream_challenge_config, total_sum_of_neg_traits
+from source.session_registry import StreamChallengeSession
+from source.session_store import new_session_id
+from source.stream_challenge import (
+    stream_challenge_location,
+    negative_trait_one,
+    negative_trait_two,
+    negative_trait_three,
+    mission,
+    mission_value,
+    get_option_wildcard_for_selection,
+)
+from source.random_fill import excluded
+from source.event_log import log_event
+from source.constants import VOTING_UPDATE_INTERVAL, VOTING_TALLY_LINES
+
+
+class VoteRound:
+    """
+    Ballots and tally of one voting round
+    """
+
+    def __init__(self, title: str, options: list, multiple: bool, end: float):
+        self.title = title
+        self.labels = [option.label for option in options]
+        self.multiple = multiple
+        self.end = end
+        self.ballots = {}
+        self.tally = Counter()
+        self.version = 0
+
+    def vote(self, user_id: int, choices: list) -> None:
+        """
+        Count the ballot of a viewer, an earlier ballot of the viewer is replaced
+        :param user_id: Id of the viewer
+        :param choices: Selected options
+        :return: None
+        """
+        ballot = tuple(choices)
+        previous = self.ballots.get(user_id)
+        if previous == ballot:
+            return
+        if previous is not None:
+            self.tally.subtract(previous)
+        self.tally.update(ballot)
+        self.ballots[user_id] = ballot
+        self.version += 1
+
+    def ranking(self) -> list:
+        """
+        Options with votes, the most voted first and ties in the order of the options
+        :return: List of label and number of votes
+        """
+        return sorted(
+            ((label, self.tally[label]) for label in self.labels if self.tally[label]),
+            key=lambda element: -element[1],
+        )
+
+    def message(self, closed: bool = False) -> str:
+        """
+        Create the message with the current tally of the round
+        :param closed: The round is over
+        :return: Message text
+        """
+        state = "beendet" if closed else f"endet <t:{int(self.end)}:R>"
+        lines = [f"**{self.title}** (Abstimmung {state}, {len(self.ballots)} Stimmen)"]
+        for label, votes in self.ranking()[:VOTING_TALLY_LINES]:
+            lines.append(f"{votes} – {label}")
+        return "\n".join(lines)
+
+
+class VoteSelect(discord.ui.Select):
+    """
+    Selection of the options of a voting round
+    """
+
+    def __init__(self, vote_round: VoteRound, options: list, custom_id: str):
+        super().__init__(
+            options=options,
+            placeholder=vote_round.title,
+            min_values=1,
+            max_values=len(options) if vote_round.multiple else 1,
+            custom_id=custom_id,
+        )
+        self.vote_round = vote_round
+
+    async def callback(self, interaction: discord.Interaction):
+        self.vote_round.vote(interaction.user.id, self.values)
+        await interaction.response.defer()
+
+
+def winning_option(vote_round: VoteRound, rng: random.Random) -> str:
+    """
+    Get the most voted option, a random option if nobody voted
+    :param vote_round: Finished voting round
+    :param rng: Random number generator for a round without votes
+    :return: Label of the option
+    """
+    ranking = vote_round.ranking()
+    if ranking:
+        return ranking[0][0]
+    return rng.choice(vote_round.labels)
+
+
+def winning_traits(
+    vote_round: VoteRound, challenge_points: int, chosen: list = ()
+) -> list:
+    """
+    Get the traits voted by at least half of the voters, the most voted first, as long
+    as they fit into the remaining points and are not excluded by another trait
+    :param vote_round: Finished voting round of a trait tier
+    :param challenge_points: Remaining points of the challenge
+    :param chosen: Traits of the earlier tiers
+    :return: List of traits, the wildcard if no trait won
+    """
+    wildcard = get_option_wildcard_for_selection().label
+    traits = []
+    for label, votes in vote_round.ranking():
+        if votes * 2 < len(vote_round.ballots):
+            break
+        if (
+            label != wildcard
+            and total_sum_of_neg_traits(traits + [label]) <= challenge_points
+            and not excluded(set(chosen).union(traits, [label]))
+        ):
+            traits.append(label)
+    return traits or [wildcard]
+
+
+class StreamChallengeVote:
+    """
+    Voting rounds of a stream challenge in a channel
+    """
+
+    def __init__(self, channel, user: User, round_seconds: int):
+        self.channel = channel
+        self.round_seconds = round_seconds
+        self.rng = random.Random()
+        self.session = StreamChallengeSession(
+            new_session_id(),
+            "stream_challenge_vote",
+            user,
+            time.time() + 5 * round_seconds,
+            stream_challenge_config["TotalPoints"],
+        )
+
+    async def run_round(self, title: str, options: list, multiple: bool) -> VoteRound:
+        """
+        Run a voting round. The message is edited with the tally at most once per
+        update interval and only if new votes arrived.
+        :param title: Title of the round
+        :param options: Select options of the round
+        :param multiple: Viewers can vote for several options
+        :return: Finished voting round
+        """
+        vote_round = VoteRound(
+            title, options, multiple, time.time() + self.round_seconds
+        )
+        view = discord.ui.View(timeout=None)
+        view.add_item(
+            VoteSelect(
+                vote_round, options, f"vote:{self.session.session_id}:{title}"[:100]
+            )
+        )
+        message = await self.channel.send(vote_round.message(), view=view)
+        shown_version = vote_round.version
+        while (remaining := vote_round.end - time.time()) > 0:
+            await asyncio.sleep(min(VOTING_UPDATE_INTERVAL, remaining))
+            if vote_round.version != shown_version and vote_round.end > time.time():
+                shown_version = vote_round.version
+                await message.edit(content=vote_round.message())
+        view.stop()
+        view.children[0].disabled = True
+        await message.edit(content=vote_round.message(closed=True), view=view)
+        log_event(
+            "vote_round_finished",
+            session_id=self.session.session_id,
+            round=title,
+            ballots=len(vote_round.ballots),
+        )
+        return vote_round
+
+    async def run(self) -> StreamChallengeSession:
+        """
+        Run all voting rounds and apply the winners to the session
+        :return: Session with the voted game settings
+        """
+        session = self.session
+        vote_round = await self.run_round(
+            "Start-Stadt", stream_challenge_location(), False
+        )
+        session.start_location = winning_option(vote_round, self.rng)
+        session.challenge_points -= stream_challenge_config["StartingArea"][
+            session.start_location
+        ]
+        tiers = [
+            ("negative_trait_1", negative_trait_one),
+            ("negative_trait_2", negative_trait_two),
+            ("negative_trait_3", negative_trait_three),
+        ]
+        chosen = []
+        for tier, (setting, trait_options) in enumerate(tiers, start=1):
+            vote_round = await self.run_round(
+                f"Negative Traits Stufe {tier}", trait_options(session), True
+            )
+            traits = winning_traits(vote_round, session.challenge_points, chosen)
+            chosen.extend(traits)
+            setattr(session, setting, traits)
+            session.challenge_points -= total_sum_of_neg_traits(traits)
+        vote_round = await self.run_round("Auftrag", mission(session), False)
+        session.mission = [winning_option(vote_round, self.rng)]
+        session.challenge_points -= mission_value(session.mission)
+        return session
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watchdog for the event loop. A heartbeat on the loop measures the loop lag and a
+monitor thread captures the stack of the loop thread if the heartbeat stops for
+longer than the threshold. In the strict mode of the tests, every heartbeat later
+than the strict limit is a violation, which fails the test.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from source.event_log import log_event
+from source.constants import (
+    WATCHDOG_INTERVAL,
+    WATCHDOG_THRESHOLD_MS,
+    WATCHDOG_REPORT_INTERVAL,
+)
+
+
+class LoopBlockedError(AssertionError):
+    """
+    Error of the strict mode if a handler blocked the event loop too long
+    """
+
+
+class LoopWatchdog:  # pylint: disable=too-many-instance-attributes
+    """
+    Measure the lag of the event loop and report the stack of blocking code
+    """
+
+    def __init__(
+        self,
+        threshold_ms=WATCHDOG_THRESHOLD_MS,
+        interval=WATCHDOG_INTERVAL,
+        strict_ms=None,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.strict = strict_ms / 1000 if strict_ms is not None else None
+        self.loop = None
+        self.loop_thread_id = None
+        self.heartbeat_task = None
+        self.stopped = threading.Event()
+        self.last_beat = time.monotonic()
+        self.planned_beat = self.last_beat
+        self.blocked_since = None
+        self.last_report = 0.0
+        self.violations = []
+        self.metrics = {
+            "last_lag_ms": 0.0,
+            "max_lag_ms": 0.0,
+            "blocked": 0,
+            "reports": 0,
+            "suppressed_reports": 0,
+        }
+
+    def start(self) -> None:
+        """
+        Start the heartbeat on the running loop and the monitor thread
+        :return: None
+        """
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.stopped.clear()
+        self.heartbeat_task = self.loop.create_task(self.heartbeat())
+        threading.Thread(target=self.monitor, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stop the heartbeat and the monitor thread. The lag of the pending heartbeat
+        is checked, so a block at the end is not missed by the strict mode.
+        :return: None
+        """
+        self.check_lag(max(time.monotonic() - self.planned_beat, 0.0))
+        self.stopped.set()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+    def check_lag(self, lag: float) -> None:
+        """
+        Record the lag of a heartbeat, in strict mode a lag above the limit is a
+        violation
+        :param lag: Lag of the heartbeat in seconds
+        :return: None
+        """
+        self.metrics["last_lag_ms"] = lag * 1000
+        self.metrics["max_lag_ms"] = max(self.metrics["max_lag_ms"], lag * 1000)
+        if self.strict is not None and lag > self.strict:
+            self.violations.append(lag * 1000)
+            log_event("strict_loop_lag_exceeded", logging.ERROR, lag_ms=lag * 1000)
+
+    async def heartbeat(self) -> None:
+        """
+        Measure how much later than planned the loop wakes up the heartbeat
+        :return: None
+        """
+        while True:
+            self.planned_beat = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.last_beat = now
+            self.check_lag(max(now - self.planned_beat, 0.0))
+
+    def monitor(self) -> None:
+        """
+        Thread which checks the heartbeat and reports a blocked loop once per
+        blocking period
+        :return: None
+        """
+        while not self.stopped.wait(self.interval):
+            blocked_for = time.monotonic() - self.last_beat
+            if blocked_for <= self.threshold:
+                self.blocked_since = None
+                continue
+            if self.blocked_since == self.last_beat:
+                continue
+            self.blocked_since = self.last_beat
+            self.metrics["blocked"] += 1
+            self.report(blocked_for)
+
+    def report(self, blocked_for: float) -> None:
+        """
+        Log the stack of the loop thread, limited to one report per report interval
+        :param blocked_for: Time in seconds the loop is blocked
+        :return: None
+        """
+        now = time.monotonic()
+        if now - self.last_report < WATCHDOG_REPORT_INTERVAL:
+            self.metrics["suppressed_reports"] += 1
+            return
+        self.last_report = now
+        self.metrics["reports"] += 1
+        frame = sys._current_frames().get(  # pylint: disable=protected-access
+            self.loop_thread_id
+        )
+        task = asyncio.current_task(self.loop)
+        log_event(
+            "event_loop_blocked",
+            logging.WARNING,
+            blocked_ms=round(blocked_for * 1000),
+            task=task.get_name() if task is not None else None,
+            stack="".join(traceback.format_stack(frame)) if frame else None,
+        )
+
+    def statistics(self) -> dict:
+        """
+        Metrics of the watchdog for monitoring
+        :return: Lag and blocking counters
+        """
+        return dict(self.metrics)
+
+    def assert_no_blocking(self) -> None:
+        """
+        Strict mode: fail if any handler blocked the loop longer than allowed
+        :return: None
+        """
+        if self.violations:
+            raise LoopBlockedError(
+                f"Event loop was blocked {len(self.violations)} times, "
+                f"longest {max(self.violations):.0f} ms"
+            )
+
+
+loop_watchdog = LoopWatchdog(
+    threshold_ms=int(os.getenv("WATCHDOG_THRESHOLD_MS", str(WATCHDOG_THRESHOLD_MS))),
+    strict_ms=(
+        int(os.getenv("WATCHDOG_STRICT_MS"))
+        if os.getenv("WATCHDOG_STRICT_MS")
+        else None
+    ),
+)
+
+
+def main() -> None:
+    """
+    Scheduling function for regular call.
+    :return: None
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Setup of the tests. The bot reads its files relative to the source directory and
+its channels and roles from the environment, so both are prepared before the bot
+modules are imported. The flows run under the watchdog in strict mode, so a test
+fails if a handler blocks the event loop.
+"""
+import os
+import sys
+import asyncio
+import pytest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+os.chdir(os.path.join(ROOT_PATH, "source"))
+TEST_ENVIRONMENT = {
+    "SERVER_ID": "1",
+    "CHANNEL_CUSTOM_CHALLENGE_ID": "2",
+    "CHANNEL_STREAM_CHALLENGE_ID": "3",
+    "STREAM_CHALLENGE_CREATOR_ROLE_ID": "4",
+}
+for key, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(key, value)
+STRICT_LOOP_LAG_MS = int(os.getenv("WATCHDOG_STRICT_MS", "100"))
+
+from source.watchdog import LoopWatchdog  # pylint: disable=wrong-import-position
+
+
+def run_watched(coroutine, strict_ms: int = STRICT_LOOP_LAG_MS):
+    """
+    Run a coroutine in a new event loop under a strict watchdog
+    :param coroutine: Coroutine to run
+    :param strict_ms: Longest allowed lag of the event loop in milliseconds
+    :return: Result of the coroutine
+    """
+    watchdog = LoopWatchdog(strict_ms=strict_ms, interval=0.01)
+
+    async def watched():
+        watchdog.start()
+        try:
+            return await coroutine
+        finally:
+            watchdog.stop()
+
+    result = asyncio.run(watched())
+    watchdog.assert_no_blocking()
+    return result
+
+
+@pytest.fixture(name="run_flow")
+def fixture_run_flow():
+    """
+    Runner of the flows, which fails if the event loop was blocked
+    :return: Function to run a coroutine under the strict watchdog
+    """
+    return run_watched
@@ -0,0 +1,154 @@
+"""
+Stand-ins for the Discord objects of an interaction, which record every API call
+with its name and keyword arguments
+"""
+
+
+class StubMessage:  # pylint: disable=too-few-public-methods
+    """
+    Sent message, records its edits
+    """
+
+    def __init__(self, calls: list, kwargs: dict):
+        self.calls = calls
+        self.kwargs = kwargs
+        self.attachments = []
+
+    async def edit(self, **kwargs):
+        """
+        Edit the message
+        :param kwargs: Changed content of the message
+        :return: None
+        """
+        self.calls.append(("message.edit", kwargs))
+
+
+class StubChannel:  # pylint: disable=too-few-public-methods
+    """
+    Channel of the interaction, records the sent messages
+    """
+
+    def __init__(self, calls: list, channel_id: int):
+        self.calls = calls
+        self.id = channel_id
+
+    async def send(self, *args, **kwargs):
+        """
+        Send a message to the channel
+        :param args: Content of the message
+        :param kwargs: Further content of the message
+        :return: Sent message
+        """
+        if args:
+            kwargs["content"] = args[0]
+        self.calls.append(("channel.send", kwargs))
+        return StubMessage(self.calls, kwargs)
+
+
+class StubResponse:
+    """
+    Interaction response, records the answer of the interaction
+    """
+
+    def __init__(self, calls: list):
+        self.calls = calls
+        self.done = False
+
+    def is_done(self) -> bool:
+        """
+        Check if the interaction was answered
+        :return: True if the interaction was answered
+        """
+        return self.done
+
+    async def send_message(self, *args, **kwargs):
+        """
+        Answer the interaction with a message
+        :param args: Content of the message
+        :param kwargs: Further content of the message
+        :return: None
+        """
+        if args:
+            kwargs["content"] = args[0]
+        self.done = True
+        self.calls.append(("response.send_message", kwargs))
+
+    async def edit_message(self, **kwargs):
+        """
+        Answer the interaction with an edit of its message
+        :param kwargs: Changed content of the message
+        :return: None
+        """
+        self.done = True
+        self.calls.append(("response.edit_message", kwargs))
+
+    async def defer(self, **kwargs):
+        """
+        Acknowledge the interaction
+        :param kwargs: Options of the acknowledgement
+        :return: None
+        """
+        self.done = True
+        self.calls.append(("response.defer", kwargs))
+
+
+class StubRole:  # pylint: disable=too-few-public-methods
+    """
+    Role of a member
+    """
+
+    def __init__(self, role_id: int):
+        self.id = role_id
+
+
+class StubMember:  # pylint: disable=too-few-public-methods
+    """
+    Member of the interaction, records removed roles
+    """
+
+    def __init__(self, calls: list, role_ids: list):
+        self.calls = calls
+        self.id = 42
+        self.display_name = "tester"
+        self.global_name = "Tester"
+        self.roles = [StubRole(role_id) for role_id in role_ids]
+
+    async def remove_roles(self, *roles, **kwargs):
+        """
+        Remove roles from the member
+        :param roles: Removed roles
+        :param kwargs: Reason of the removal
+        :return: None
+        """
+        self.calls.append(("user.remove_roles", {"roles": roles, **kwargs}))
+
+
+class StubGuild:  # pylint: disable=too-few-public-methods
+    """
+    Guild of the interaction
+    """
+
+    @staticmethod
+    def get_role(role_id: int) -> StubRole:
+        """
+        Get a role of the guild
+        :param role_id: Id of the role
+        :return: Role
+        """
+        return StubRole(role_id)
+
+
+class StubInteraction:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    Interaction of a flow, all API calls of the flow are recorded in one list
+    """
+
+    def __init__(self, calls: list, channel: StubChannel, role_ids: list):
+        self.id = 1
+        self.calls = calls
+        self.channel = channel
+        self.guild = StubGuild()
+        self.user = StubMember(self.calls, role_ids)
+        self.response = StubResponse(self.calls)
+        self.message = StubMessage(self.calls, {})
+        self.data = {}
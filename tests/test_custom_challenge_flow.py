@@ -0,0 +1,90 @@
+"""
+API calls of the custom challenge flow. The difficulty selection must answer its
+interaction with a single edit of the dropdown message, the challenge must be sent
+once and its picture attached to the same message. No step may block the event
+loop.
+"""
+import pytest
+from stubs import StubChannel, StubInteraction
+from source import main, custom_challenge, challenge_message
+from source.state_backend import AsyncStateBackend, MemoryStateBackend
+
+CHANNEL_ID = int(main.CHANNEL_CUSTOM_CHALLENGE_ID)
+
+
+@pytest.fixture(name="flow")
+def fixture_flow(monkeypatch) -> dict:
+    """
+    Calls and channel of one flow, the sessions are kept in memory and the picture
+    is neither rendered nor archived
+    :param monkeypatch: Pytest monkeypatch fixture
+    :return: Recorded calls and the channel of the flow
+    """
+    monkeypatch.setattr(
+        main.session_registry, "store", AsyncStateBackend(MemoryStateBackend())
+    )
+
+    async def render(_game_settings, _user) -> bytes:
+        return b"picture"
+
+    async def archive(_picture, _game_settings, _user) -> None:
+        pass
+
+    monkeypatch.setattr(custom_challenge, "create_challenge_picture", render)
+    monkeypatch.setattr(main, "archive_challenge_picture", archive)
+    calls = []
+    return {"calls": calls, "channel": StubChannel(calls, CHANNEL_ID)}
+
+
+def test_difficulty_selection_delivers_the_challenge(flow, run_flow):
+    """
+    The command sends the dropdown, the selection edits the dropdown message once,
+    sends the challenge and attaches the picture to it
+    """
+
+    async def run() -> list:
+        await main.custom_challenge.callback(
+            StubInteraction(flow["calls"], flow["channel"], [])
+        )
+        selection = flow["calls"][-1][1]["view"].children[0]
+        selection._values = ["Easy"]  # pylint: disable=protected-access
+        await selection.callback(StubInteraction(flow["calls"], flow["channel"], []))
+        return [name for name, _ in flow["calls"]]
+
+    assert run_flow(run()) == [
+        "response.send_message",
+        "response.edit_message",
+        "channel.send",
+        "message.edit",
+    ]
+
+
+def test_failed_picture_is_reported_in_the_message(flow, run_flow, monkeypatch):
+    """
+    If the picture fails, the failure is reported and the sent challenge is edited to
+    say that the picture is missing
+    """
+    reports = []
+
+    async def render(_game_settings, _user) -> bytes:
+        raise OSError("Background not readable")
+
+    monkeypatch.setattr(custom_challenge, "create_challenge_picture", render)
+    monkeypatch.setattr(
+        challenge_message,
+        "log_failure_report",
+        lambda event, report: reports.append(event),
+    )
+
+    async def run() -> list:
+        await main.custom_challenge.callback(
+            StubInteraction(flow["calls"], flow["channel"], [])
+        )
+        selection = flow["calls"][-1][1]["view"].children[0]
+        selection._values = ["Easy"]  # pylint: disable=protected-access
+        await selection.callback(StubInteraction(flow["calls"], flow["channel"], []))
+        return [name for name, _ in flow["calls"]]
+
+    assert run_flow(run())[-2:] == ["channel.send", "message.edit"]
+    assert challenge_message.CHALLENGE_PICTURE_FAILED in flow["calls"][-1][1]["content"]
+    assert reports == ["challenge_picture_failed"]
@@ -0,0 +1,27 @@
+"""
+Font fallback chain, the cached masks must draw the same picture as ImageDraw.text
+"""
+from PIL import Image, ImageDraw
+from source.benchmark import draw_text_reference
+from source.fonts import FontChain
+from source.constants import FONT_FILE, FONT_FALLBACK_FILE, FONT_SIZE
+
+
+def test_cached_masks_draw_like_image_draw_text():
+    """
+    A text with characters of both fonts is drawn identical by the cached masks and
+    by ImageDraw.text, also at a fractional horizontal position and in both font modes
+    """
+    font_chain = FontChain([FONT_FILE, FONT_FALLBACK_FILE], FONT_SIZE)
+    for fontmode in ["L", "1"]:
+        pictures = []
+        for draw_text in [draw_text_reference, FontChain.draw_text]:
+            picture = Image.new("RGB", (600, 80))
+            draw = ImageDraw.Draw(picture)
+            draw.fontmode = fontmode
+            for position in [(10, 10), (10.4, 40)]:
+                draw_text(
+                    font_chain, draw, position, "Zombies → Übergewichtig ✓", "red"
+                )
+            pictures.append(picture.tobytes())
+        assert pictures[0] == pictures[1]
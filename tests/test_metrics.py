@@ -0,0 +1,229 @@
+"""
+Periodic metrics report, which logs the statistics of all subsystems as one event
+"""
+import io
+import time
+import asyncio
+import discord
+from PIL import Image
+from aiohttp.test_utils import make_mocked_request
+from source import metrics, session_store, gallery
+from source.game_settings import User
+from source.session_registry import ChallengeSession, SessionRegistry
+from source.watchdog import LoopWatchdog
+from source.outbound import OutboundScheduler, PRIORITY_EDIT
+from source.render import RenderBudget
+from source.overlay import ChallengeOverlay
+from source.state_backend import AsyncStateBackend, MemoryStateBackend
+
+USER = User(user_id=42, user_name="tester", user_display_name="Tester")
+
+
+async def report_once() -> None:
+    """
+    Run the periodic report until it reported once
+    :return: None
+    """
+    task = asyncio.create_task(metrics.report_metrics(interval=0.01))
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+
+def record_reports(monkeypatch) -> list:
+    """
+    Record the fields of the logged metrics events
+    :param monkeypatch: Pytest monkeypatch fixture
+    :return: List of the reported metrics, filled by the report
+    """
+    reports = []
+
+    def log_event(event: str, **fields) -> None:
+        assert event == "metrics"
+        reports.append(fields)
+
+    monkeypatch.setattr(metrics, "log_event", log_event)
+    return reports
+
+
+def test_report_counts_live_and_evicted_sessions(monkeypatch, tmp_path):
+    """
+    The report contains the live sessions of the registry and counts the sessions
+    which were evicted because the limit was reached
+    """
+    monkeypatch.setattr(session_store, "SESSION_STORE_PATH", str(tmp_path))
+    registry = SessionRegistry(max_sessions=2)
+    monkeypatch.setattr(metrics, "session_registry", registry)
+    reports = record_reports(monkeypatch)
+
+    async def run() -> None:
+        for index in range(3):
+            registry.add(ChallengeSession(str(index), "custom", USER, time.time() + 60))
+        await report_once()
+        registry.wheel_task.cancel()
+
+    asyncio.run(run())
+    assert reports[0]["sessions"] == {
+        "live": 2,
+        "created": 3,
+        "expired": 0,
+        "evicted": 1,
+    }
+
+
+def test_report_contains_the_loop_lag(monkeypatch):
+    """
+    The report contains the longest lag of the event loop which the watchdog measured
+    """
+    watchdog = LoopWatchdog(interval=0.01)
+    monkeypatch.setattr(metrics, "loop_watchdog", watchdog)
+    reports = record_reports(monkeypatch)
+
+    async def run() -> None:
+        heartbeat = asyncio.create_task(watchdog.heartbeat())
+        await asyncio.sleep(0.02)
+        time.sleep(0.2)
+        await report_once()
+        heartbeat.cancel()
+
+    asyncio.run(run())
+    assert reports[0]["watchdog"]["max_lag_ms"] >= 150
+
+
+def test_report_contains_waiting_requests_and_wait_per_priority(monkeypatch):
+    """
+    The report counts the waiting requests of each priority and the mean wait of the
+    scheduled requests grows with the time they waited for a slot
+    """
+    scheduler = OutboundScheduler(max_concurrency=1)
+    monkeypatch.setattr(metrics, "outbound_scheduler", scheduler)
+    reports = record_reports(monkeypatch)
+    route = discord.http.Route(
+        "PATCH",
+        "/channels/{channel_id}/messages/{message_id}",
+        channel_id=1,
+        message_id=2,
+    )
+
+    async def request(_route, **_kwargs) -> None:
+        pass
+
+    async def run() -> dict:
+        await scheduler.acquire(PRIORITY_EDIT)
+        upload = asyncio.create_task(scheduler.wrap(request)(route, files=[object()]))
+        await report_once()
+        scheduler.release()
+        await upload
+        return scheduler.statistics()
+
+    statistics = asyncio.run(run())
+    assert reports[0]["outbound"]["waiting"] == {
+        "interaction": 0,
+        "edit": 0,
+        "upload": 1,
+    }
+    assert statistics["waiting"]["upload"] == 0
+    assert statistics["mean_wait_ms"]["upload"] >= 40
+
+
+def test_report_contains_the_render_memory(monkeypatch, tmp_path):
+    """
+    The report counts the renders, the renders which waited for the budget and the
+    peak memory of the largest render
+    """
+    budget = RenderBudget(budget_mb=1, initial_peak_mb=1)
+    monkeypatch.setattr(metrics, "render_budget", budget)
+    reports = record_reports(monkeypatch)
+    image_path = str(tmp_path / "background.png")
+    Image.new("RGB", (10, 10)).save(image_path)
+
+    def draw(_image_path: str, size: int) -> bytes:
+        return bytes(size)
+
+    async def run() -> None:
+        await asyncio.gather(
+            budget.render(draw, image_path, 1024),
+            budget.render(draw, image_path, 2 * 1024 * 1024),
+        )
+        await report_once()
+
+    asyncio.run(run())
+    render = reports[0]["render"]
+    assert (render["renders"], render["waited"]) == (2, 1)
+    assert render["max_peak_bytes"] >= 2 * 1024 * 1024
+
+
+def test_report_contains_the_gallery_cache(monkeypatch, tmp_path):
+    """
+    The report counts the thumbnails, the known pictures which got no new thumbnail
+    and the hits of the contact sheet cache
+    """
+    monkeypatch.setattr(gallery, "GALLERY_PATH", str(tmp_path))
+    monkeypatch.setattr(gallery, "GALLERY_INDEX_FILE", str(tmp_path / "index.jsonl"))
+    challenge_gallery = gallery.Gallery()
+    monkeypatch.setattr(metrics, "gallery", challenge_gallery)
+    reports = record_reports(monkeypatch)
+    picture = io.BytesIO()
+    Image.new("RGB", (60, 40)).save(picture, format="PNG")
+
+    async def run() -> None:
+        for _ in range(2):
+            challenge_gallery.add(picture.getvalue(), "challenge")
+        await asyncio.gather(*challenge_gallery.tasks)
+        for _ in range(2):
+            await challenge_gallery.sheet(1)
+        await report_once()
+
+    asyncio.run(run())
+    statistics = reports[0]["gallery"]
+    assert (statistics["thumbnails"], statistics["known_pictures"]) == (1, 1)
+    assert (statistics["sheet_hits"], statistics["sheet_misses"]) == (1, 1)
+    assert statistics["sheet_hit_rate"] == 0.5
+    assert statistics["pending_tasks"] == 0
+
+
+def test_report_contains_the_overlay_hit_rate(monkeypatch):
+    """
+    The report counts the overlay requests and the share of them which already had
+    the current document
+    """
+    overlay = ChallengeOverlay()
+    monkeypatch.setattr(metrics, "challenge_overlay", overlay)
+    reports = record_reports(monkeypatch)
+
+    async def run() -> None:
+        for headers in [{}, {"If-None-Match": overlay.etag}, {"If-None-Match": '"0"'}]:
+            await overlay.handle_document(
+                make_mocked_request("GET", "/challenge.json", headers=headers)
+            )
+        await report_once()
+
+    asyncio.run(run())
+    statistics = reports[0]["overlay"]
+    assert (statistics["requests"], statistics["not_modified"]) == (3, 1)
+    assert statistics["hit_rate"] == 1 / 3
+
+
+class BrokenStateBackend(MemoryStateBackend):
+    """
+    Memory backend which fails every session write
+    """
+
+    def save_session(self, session_id: str, session: dict) -> None:
+        raise OSError(f"Session {session_id} not written")
+
+
+def test_report_contains_the_failed_session_writes(monkeypatch):
+    """
+    The report counts the session writes which failed and still wait for the retry
+    """
+    backend = AsyncStateBackend(BrokenStateBackend())
+    monkeypatch.setattr(metrics, "state_backend", backend)
+    reports = record_reports(monkeypatch)
+
+    async def run() -> None:
+        backend.save_session("session", {"kind": "custom"})
+        await report_once()
+        backend.writer_task.cancel()
+
+    asyncio.run(run())
+    assert reports[0]["state_backend"] == {"queued": 1, "failed": 1, "retried": 1}
@@ -0,0 +1,44 @@
+"""
+Outbound scheduler, a request of an exhausted rate limit bucket must wait for the
+reset of the bucket
+"""
+import time
+import asyncio
+from types import SimpleNamespace
+import discord
+from yarl import URL
+from source.outbound import OutboundScheduler
+
+
+def test_exhausted_bucket_delays_the_next_request():
+    """
+    The first response of a route exhausts its bucket, so the second request of the
+    route waits for the reset
+    """
+    scheduler = OutboundScheduler()
+    route = discord.http.Route("POST", "/channels/{channel_id}/messages", channel_id=1)
+    headers = {
+        "X-RateLimit-Bucket": "bucket",
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset-After": "0.1",
+    }
+
+    async def request(sent_route, **_kwargs) -> float:
+        await scheduler.on_request_end(
+            None,
+            None,
+            SimpleNamespace(
+                method=sent_route.method,
+                url=URL(sent_route.url),
+                response=SimpleNamespace(status=200, headers=headers),
+            ),
+        )
+        return time.monotonic()
+
+    async def run() -> float:
+        scheduled_request = scheduler.wrap(request)
+        first = await scheduled_request(route)
+        return await scheduled_request(route) - first
+
+    assert asyncio.run(run()) >= 0.09
+    assert scheduler.statistics()["bucket_delays"] == 1
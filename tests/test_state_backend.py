@@ -0,0 +1,82 @@
+"""
+Non-blocking state backend, the queued session writes must survive the shutdown
+"""
+import time
+import asyncio
+import pytest
+from source import session_store
+from source.state_backend import (
+    AsyncStateBackend,
+    FileStateBackend,
+    MemoryStateBackend,
+    SQLiteStateBackend,
+)
+
+
+class SlowStateBackend(MemoryStateBackend):
+    """
+    Memory backend with slow writes, which run in a worker thread like a remote store
+    """
+
+    loop_operations = frozenset()
+
+    def save_session(self, session_id: str, session: dict) -> None:
+        time.sleep(0.02)
+        super().save_session(session_id, session)
+
+
+def test_close_writes_all_queued_sessions(run_flow):
+    """
+    Closing the backend while the writer is in the middle of its writes keeps every
+    queued session
+    """
+    store = SlowStateBackend()
+    backend = AsyncStateBackend(store)
+
+    async def run() -> None:
+        for index in range(5):
+            backend.save_session(str(index), {"expires": time.time() + 60})
+        await asyncio.sleep(0.03)
+        await backend.close()
+
+    run_flow(run())
+    assert sorted(store.sessions) == ["0", "1", "2", "3", "4"]
+    assert backend.writer_task is None
+
+
+@pytest.fixture(name="backend", params=["file", "memory", "sqlite"])
+def fixture_backend(request, monkeypatch, tmp_path):
+    """
+    Every backend which stores the sessions itself
+    :param request: Pytest request with the kind of the backend
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param tmp_path: Temporary directory of the sessions
+    :return: Asynchronous state backend
+    """
+    monkeypatch.setattr(session_store, "SESSION_STORE_PATH", str(tmp_path))
+    return AsyncStateBackend(
+        {
+            "file": FileStateBackend,
+            "memory": MemoryStateBackend,
+            "sqlite": lambda: SQLiteStateBackend(str(tmp_path / "state.db")),
+        }[request.param]()
+    )
+
+
+def test_load_session_skips_unknown_and_expired_sessions(backend, run_flow):
+    """
+    A single session is loaded as long as it is not expired
+    """
+
+    async def run() -> list:
+        backend.save_session("open", {"expires": time.time() + 60})
+        backend.save_session("expired", {"expires": time.time() - 1})
+        await backend.close()
+        return [
+            await backend.load_session(session_id)
+            for session_id in ["open", "expired", "unknown"]
+        ]
+
+    open_session, expired_session, unknown_session = run_flow(run())
+    assert open_session["expires"] > time.time()
+    assert expired_session is None and unknown_session is None
@@ -0,0 +1,184 @@
+"""
+API calls of the stream challenge flow. Every step of the stage view must answer
+its interaction with a single edit of the stage message, the approval must send
+the challenge, attach its picture and remove the creator role. No step may block
+the event loop.
+"""
+import asyncio
+import discord
+import pytest
+from stubs import StubChannel, StubInteraction
+from source import main, session_view
+from source.state_backend import AsyncStateBackend, MemoryStateBackend
+
+CHANNEL_ID = int(main.CHANNEL_STREAM_CHALLENGE_ID)
+ROLE_ID = int(main.STREAM_CHALLENGE_CREATOR_ROLE_ID)
+
+
+@pytest.fixture(name="flow")
+def fixture_flow(monkeypatch) -> dict:
+    """
+    Calls and channel of one flow, the sessions are kept in memory and the picture
+    is not rendered
+    :param monkeypatch: Pytest monkeypatch fixture
+    :return: Recorded calls and the channel of the flow
+    """
+    monkeypatch.setattr(
+        main.session_registry, "store", AsyncStateBackend(MemoryStateBackend())
+    )
+
+    async def render(_game_settings, _user) -> bytes:
+        return b"picture"
+
+    monkeypatch.setattr(main, "herr_apfelring", render)
+    calls = []
+    return {"calls": calls, "channel": StubChannel(calls, CHANNEL_ID)}
+
+
+def interaction(flow: dict) -> StubInteraction:
+    """
+    Create the next interaction of a flow
+    :param flow: Calls and channel of the flow
+    :return: Interaction of the creator
+    """
+    return StubInteraction(flow["calls"], flow["channel"], [ROLE_ID])
+
+
+async def run_step(flow: dict, step) -> list:
+    """
+    Run a step of the flow and get the names of its API calls
+    :param flow: Calls and channel of the flow
+    :param step: Coroutine of the step
+    :return: Names of the calls of this step
+    """
+    first = len(flow["calls"])
+    await step
+    return [name for name, _ in flow["calls"][first:]]
+
+
+async def start_stage(flow: dict) -> main.StreamChallengeStage:
+    """
+    Run the stream challenge command and get the stage view
+    :param flow: Calls and channel of the flow
+    :return: View of the stage message
+    """
+    names = await run_step(flow, main.stream_challenge.callback(interaction(flow)))
+    assert names == ["response.send_message"]
+    return flow["calls"][-1][1]["view"]
+
+
+async def select(flow: dict, item, value: str) -> list:
+    """
+    Select a value in a selection of the stage view
+    :param flow: Calls and channel of the flow
+    :param item: Selection of the view
+    :param value: Selected value
+    :return: Names of the calls of this step
+    """
+    item._values = [value]  # pylint: disable=protected-access
+    return await run_step(flow, item.callback(interaction(flow)))
+
+
+async def approval_view(flow: dict) -> main.StreamChallengeApproval:
+    """
+    Run the stage flow up to the approval request
+    :param flow: Calls and channel of the flow
+    :return: View of the approval message
+    """
+    view = await start_stage(flow)
+    steps = [await select(flow, view.children[0], "Rosewood")]
+    for _ in range(4):
+        selection = view.children[-1]
+        steps.append(await select(flow, selection, selection.options[0].label))
+    assert steps == [["response.edit_message"]] * 4 + [
+        ["response.edit_message", "channel.send"]
+    ]
+    return flow["calls"][-1][1]["view"]
+
+
+def test_stage_steps_edit_the_message_once(flow, run_flow):
+    """
+    Every selection of the stage is answered with one edit of the stage message, the
+    last selection also sends the approval request
+    """
+    view = run_flow(approval_view(flow))
+    assert isinstance(view, main.StreamChallengeApproval)
+
+
+def test_random_fill_edits_the_message_once(flow, run_flow):
+    """
+    The random fill is answered with one edit of the stage message and sends the
+    approval request
+    """
+
+    async def run() -> list:
+        view = await start_stage(flow)
+        return await run_step(flow, view.random_fill.callback(interaction(flow)))
+
+    assert run_flow(run()) == ["response.edit_message", "channel.send"]
+
+
+def test_approval_sends_the_challenge_and_removes_the_role(flow, run_flow):
+    """
+    The approval edits the approval message, sends the challenge, attaches the
+    picture to the same message and removes the creator role
+    """
+
+    async def run() -> list:
+        view = await approval_view(flow)
+        return await select(flow, view.children[0], "Yes / Ja")
+
+    assert run_flow(run()) == [
+        "response.edit_message",
+        "channel.send",
+        "message.edit",
+        "user.remove_roles",
+    ]
+    assert "attachments" in flow["calls"][-2][1]
+    role = flow["calls"][-1][1]["roles"][0]
+    assert role.id == ROLE_ID
+
+
+class StubClient:  # pylint: disable=too-few-public-methods
+    """
+    Client of another instance, records the added views
+    """
+
+    def __init__(self):
+        self.views = []
+
+    def add_view(self, view) -> None:
+        """
+        Add a persistent view
+        :param view: View of a session
+        :return: None
+        """
+        self.views.append(view)
+
+
+def test_unknown_session_is_resumed_from_the_backend(flow, run_flow):
+    """
+    A session which is only in the state backend, because another instance created
+    it, is loaded on its first interaction and the interaction reaches its view
+    """
+    client = StubClient()
+
+    async def run() -> list:
+        view = await start_stage(flow)
+        session = main.session_registry.sessions.pop(view.session.session_id)
+        main.session_registry.store.backend.save_session(
+            session.session_id, session.to_dict()
+        )
+        resumed = interaction(flow)
+        resumed.type = discord.InteractionType.component
+        resumed.client = client
+        resumed.data = {"custom_id": view.random_fill.custom_id, "component_type": 2}
+        first = len(flow["calls"])
+        assert await session_view.resume_session(
+            resumed, main.SESSION_VIEWS, main.session_registry.store
+        )
+        await asyncio.sleep(0.01)
+        return [name for name, _ in flow["calls"][first:]]
+
+    assert run_flow(run()) == ["response.edit_message", "channel.send"]
+    assert isinstance(client.views[0], main.StreamChallengeStage)
@@ -0,0 +1,43 @@
+"""
+Viewer voting, the voted traits must respect the points and the exclusions of the
+traits
+"""
+from types import SimpleNamespace
+from source.voting import VoteRound, winning_traits
+from source.stream_challenge import get_option_wildcard_for_selection
+
+
+def trait_round(ballots: list) -> VoteRound:
+    """
+    Create a finished trait round
+    :param ballots: Voted traits of each viewer
+    :return: Voting round with the ballots
+    """
+    labels = sorted({label for ballot in ballots for label in ballot})
+    vote_round = VoteRound(
+        "Traits", [SimpleNamespace(label=label) for label in labels], True, 0
+    )
+    for user_id, ballot in enumerate(ballots):
+        vote_round.vote(user_id, ballot)
+    return vote_round
+
+
+def test_excluded_trait_is_skipped():
+    """
+    A trait which is excluded by a more voted trait does not win
+    """
+    vote_round = trait_round(
+        [["Agoraphobisch", "Klaustrophobisch"], ["Agoraphobisch", "Klaustrophobisch"]]
+        + [["Agoraphobisch"]]
+    )
+    assert winning_traits(vote_round, 1000) == ["Agoraphobisch"]
+
+
+def test_trait_excluded_by_an_earlier_tier_is_skipped():
+    """
+    A trait which is excluded by a trait of an earlier tier does not win, the tier
+    gets the wildcard
+    """
+    vote_round = trait_round([["Klaustrophobisch"], ["Klaustrophobisch"]])
+    wildcard = get_option_wildcard_for_selection().label
+    assert winning_traits(vote_round, 1000, ["Agoraphobisch"]) == [wildcard]
@@ -0,0 +1,39 @@
+"""
+Strict mode of the watchdog, which fails the tests if the event loop is blocked
+"""
+import time
+import asyncio
+import pytest
+from source.watchdog import LoopBlockedError
+
+
+async def blocking_handler() -> None:
+    """
+    Handler which blocks the event loop with a synchronous sleep
+    :return: None
+    """
+    await asyncio.sleep(0.02)
+    time.sleep(0.3)
+
+
+async def awaiting_handler() -> None:
+    """
+    Handler which waits without blocking the event loop
+    :return: None
+    """
+    await asyncio.sleep(0.3)
+
+
+def test_strict_mode_fails_on_blocking_handler(run_flow):
+    """
+    A handler which blocks the loop longer than the limit fails the test
+    """
+    with pytest.raises(LoopBlockedError):
+        run_flow(blocking_handler())
+
+
+def test_strict_mode_passes_awaiting_handler(run_flow):
+    """
+    A handler which only awaits passes the strict mode
+    """
+    run_flow(awaiting_handler())